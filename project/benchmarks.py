@@ -0,0 +1,477 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from scipy.stats import linregress, pearsonr
+
+import memo
+from crosscorr import correlation_matrix, lagged_crosscorr
+from regression import grouped_linregress, grouped_polyfit
+from pipeline import (
+    build_emissions_by_country_figure, build_temperature_by_region_figure, build_temperature_vs_emissions_figure,
+    build_temperature_with_trendlines_figure, calculate_p_values, clean_dataset, combine_region_summaries,
+    filter_data, merge_datasets, summarize_region, summarize_yearly_temperature, transform_temperature_data,
+    transform_temperature_yearly,
+)
+from region_groups import load_region_groups
+from resampling import resampling_tests
+from rolling import rolling_corr, rolling_linregress, rolling_mean
+from schemas import SCHEMAS, read_csv
+from synthetic import BASE_ENTITIES, make_emissions_dataset, make_grouped_series, make_temperature_dataset, make_wide_temperature
+
+# File with the results of previous benchmark runs (one JSON object per line).
+DEFAULT_HISTORY_FILE = os.environ.get(
+    "PIPELINE_BENCHMARK_HISTORY",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "benchmark_history.jsonl")
+)
+
+
+def _best_time(func, repeat):
+    """
+    Returns the best wall-clock time of repeat calls of func in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _peak_memory(func):
+    """
+    Returns the peak memory in bytes allocated by one call of func (measured with tracemalloc).
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_regression(scale=1, repeat=3):
+    """
+    Compares the per-group regression loop (boolean mask + linregress/np.polyfit per group)
+    with the batched regression engine (250 groups of 75 years per unit of scale).
+
+    Returns:
+        dict: The best timings of both approaches in seconds and the speed-ups.
+    """
+    df = make_grouped_series(250 * scale, 75)
+
+    def loop_linregress():
+        for entity in df["Entity"].unique():
+            entity_data = df[df["Entity"] == entity]
+            linregress(entity_data["Year"].values, entity_data["emissions_total"].values)
+
+    def loop_polyfit():
+        for entity in df["Entity"].unique():
+            entity_data = df[df["Entity"] == entity]
+            np.polyval(np.polyfit(entity_data["Year"], entity_data["Temperature"], deg=4), entity_data["Year"])
+
+    results = {
+        "loop_linregress_seconds": _best_time(loop_linregress, repeat),
+        "grouped_linregress_seconds": _best_time(
+            lambda: grouped_linregress(df["Entity"], df["Year"], df["emissions_total"]), repeat),
+        "loop_polyfit_seconds": _best_time(loop_polyfit, repeat),
+        "grouped_polyfit_seconds": _best_time(
+            lambda: grouped_polyfit(df["Entity"], df["Year"], df["Temperature"], deg=4), repeat),
+    }
+    results["linregress_speedup"] = results["loop_linregress_seconds"] / results["grouped_linregress_seconds"]
+    results["polyfit_speedup"] = results["loop_polyfit_seconds"] / results["grouped_polyfit_seconds"]
+    return results
+
+
+def bench_rolling(scale=1, repeat=3, window=10):
+    """
+    Compares rolling statistics computed window by window (boolean mask per entity, then
+    linregress/pearsonr/mean per window) with the prefix-sum rolling engine (100 groups of 75
+    years per unit of scale, 10-year windows).
+
+    Returns:
+        dict: The best timings of both approaches in seconds and the speed-up.
+    """
+    df = make_grouped_series(100 * scale, 75)
+
+    def loop_windows():
+        for entity in df["Entity"].unique():
+            entity_data = df[df["Entity"] == entity]
+            years = entity_data["Year"].values
+            emissions = entity_data["emissions_total"].values
+            temperature = entity_data["Temperature"].values
+            for end in range(window, len(entity_data) + 1):
+                linregress(years[end - window:end], emissions[end - window:end])
+                pearsonr(emissions[end - window:end], temperature[end - window:end])
+                temperature[end - window:end].mean()
+
+    def rolling_engine():
+        rolling_linregress(df["Entity"], df["Year"], df["emissions_total"], window)
+        rolling_corr(df["Entity"], df["Year"], df["emissions_total"], df["Temperature"], window)
+        rolling_mean(df["Entity"], df["Year"], df["Temperature"], window)
+
+    results = {
+        "loop_windows_seconds": _best_time(loop_windows, repeat),
+        "rolling_engine_seconds": _best_time(rolling_engine, repeat),
+    }
+    results["rolling_speedup"] = results["loop_windows_seconds"] / results["rolling_engine_seconds"]
+    return results
+
+
+def bench_crosscorr(scale=1, repeat=3, max_lag=30):
+    """
+    Compares lagged cross-correlations and the entity x entity correlation matrix computed with
+    nested loops (boolean mask per entity, then pearsonr per lag or per pair of entities) with the
+    batched FFT and matrix engine (as many entities as the OWID data per unit of scale, 75 years,
+    lags up to max_lag). The loops take seconds, so they are timed once.
+
+    Returns:
+        dict: The timings of both approaches in seconds (best of repeat for the engine) and the speed-ups.
+    """
+    df = make_grouped_series(BASE_ENTITIES * scale, 75)
+    entities = df["Entity"].unique()
+
+    def loop_lags():
+        for entity in entities:
+            entity_data = df[df["Entity"] == entity]
+            emissions = entity_data["emissions_total"].values
+            temperature = entity_data["Temperature"].values
+            for lag in range(-max_lag, max_lag + 1):
+                if lag >= 0:
+                    pearsonr(emissions[:len(emissions) - lag], temperature[lag:])
+                else:
+                    pearsonr(emissions[-lag:], temperature[:len(temperature) + lag])
+
+    def loop_pairs():
+        series = {entity: df.loc[df["Entity"] == entity, "Temperature"].values for entity in entities}
+        for first in range(len(entities)):
+            for second in range(first + 1, len(entities)):
+                pearsonr(series[entities[first]], series[entities[second]])
+
+    results = {
+        "loop_lags_seconds": _best_time(loop_lags, 1),
+        "fft_lags_seconds": _best_time(lambda: lagged_crosscorr(df, max_lag), repeat),
+        "loop_matrix_seconds": _best_time(loop_pairs, 1),
+        "engine_matrix_seconds": _best_time(lambda: correlation_matrix(df), repeat),
+    }
+    results["lags_speedup"] = results["loop_lags_seconds"] / results["fft_lags_seconds"]
+    results["matrix_speedup"] = results["loop_matrix_seconds"] / results["engine_matrix_seconds"]
+    return results
+
+
+def bench_resampling(scale=1, repeat=3, resamples=2000):
+    """
+    Compares bootstrap and permutation tests run resample by resample (linregress and pearsonr
+    per resample, timed for one group) with the vectorized resampling engine over all groups,
+    serially and across processes (250 groups of 75 years per unit of scale).
+
+    Returns:
+        dict: The best timings in seconds and the speed-up per group.
+    """
+    df = make_grouped_series(250 * scale, 75)
+    groups = df["Entity"].nunique()
+    first = df[df["Entity"] == df["Entity"].iloc[0]]
+
+    def loop_one_group():
+        rng = np.random.default_rng(0)
+        x, y = first["Year"].values, first["emissions_total"].values
+        for _ in range(resamples):
+            index = rng.integers(0, len(x), len(x))
+            linregress(x[index], y[index])
+            pearsonr(x, rng.permutation(y))
+
+    results = {
+        "loop_one_group_seconds": _best_time(loop_one_group, repeat),
+        "engine_serial_seconds": _best_time(
+            lambda: resampling_tests(df["Entity"], df["Year"], df["emissions_total"], resamples, workers=0), repeat),
+        "engine_parallel_seconds": _best_time(
+            lambda: resampling_tests(df["Entity"], df["Year"], df["emissions_total"], resamples), repeat),
+    }
+    results["speedup_per_group"] = results["loop_one_group_seconds"] / (results["engine_serial_seconds"] / groups)
+    return results
+
+
+def bench_parse(scale=1, repeat=3):
+    """
+    Compares pd.read_csv (type inference, all columns) with the schema-driven pyarrow parser
+    (declared dtypes, declared columns only) on synthetic emissions and temperature files
+    (real-sized at scale 1).
+
+    Returns:
+        dict: Best parse times in seconds and the memory of the parsed frames in MB, per source.
+    """
+    megabyte = 1024 * 1024
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, df in [("emissions", make_emissions_dataset(scale)), ("temperature", make_temperature_dataset(scale))]:
+            path = os.path.join(directory, f"{name}.csv")
+            df.to_csv(path, index=False)
+            results[f"{name}_pandas_seconds"] = _best_time(lambda: pd.read_csv(path), repeat)
+            results[f"{name}_schema_seconds"] = _best_time(lambda: read_csv(path, SCHEMAS[name], name), repeat)
+            results[f"{name}_pandas_mb"] = pd.read_csv(path).memory_usage(deep=True).sum() / megabyte
+            results[f"{name}_schema_mb"] = read_csv(path, SCHEMAS[name], name).memory_usage(deep=True).sum() / megabyte
+    return results
+
+
+def bench_startup(scale=1, repeat=3):
+    """
+    Measures the start-up time of every CLI subcommand: a fresh interpreter importing cli.py and
+    the modules of the subcommand (see cli.COMMANDS), against importing everything up front
+    (pipeline, scipy.stats and plotly, like pipeline.py used to). The scale does not apply.
+
+    Returns:
+        dict: The best wall-clock times of the fresh interpreters in seconds.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+
+    def start(code):
+        subprocess.run([sys.executable, "-c", code], cwd=directory, check=True)
+
+    results = {
+        f"{name}_seconds": _best_time(lambda: start(f"import cli; cli.load_command({name!r})"), repeat)
+        for name in ("fetch", "transform", "stats", "plot")
+    }
+    results["eager_seconds"] = _best_time(
+        lambda: start("import pipeline, scipy.stats, plotly.express, plotly.graph_objects, plotly.subplots"), repeat)
+    return results
+
+
+def bench_temperature_transform(scale=1, repeat=3):
+    """
+    Compares melt + groupby (transform_temperature_data() and summarize_yearly_temperature())
+    with the reshape-free yearly transform on a wide temperature dataset (real-sized at scale 1).
+
+    Returns:
+        dict: Best timings in seconds, peak allocations in MB and the memory of the results in MB.
+    """
+    df = make_wide_temperature(250 * scale, 75)
+
+    def melt_and_group():
+        return summarize_yearly_temperature(transform_temperature_data(df.copy()))
+
+    def direct():
+        return transform_temperature_yearly(df.copy())
+
+    megabyte = 1024 * 1024
+    return {
+        "melt_groupby_seconds": _best_time(melt_and_group, repeat),
+        "direct_seconds": _best_time(direct, repeat),
+        "melt_groupby_peak_mb": _peak_memory(melt_and_group) / megabyte,
+        "direct_peak_mb": _peak_memory(direct) / megabyte,
+        "melted_frame_mb": transform_temperature_data(df.copy()).memory_usage(deep=True).sum() / megabyte,
+        "direct_result_mb": direct().memory_usage(deep=True).sum() / megabyte,
+    }
+
+
+def _measure_step(results, name, func, rows, repeat):
+    """
+    Adds the best time, the throughput and the peak allocation of one pipeline step to results.
+    """
+    seconds = _best_time(func, repeat)
+    results[f"{name}_seconds"] = seconds
+    results[f"{name}_rows_per_s"] = rows / seconds if seconds > 0 else float("inf")
+    results[f"{name}_peak_mb"] = _peak_memory(func) / (1024 * 1024)
+
+
+def bench_pipeline(scale=1, repeat=3):
+    """
+    Times every pipeline step (cleaning, melting, filtering, merging, the regression and building
+    each figure) on synthetic OWID-shaped datasets (see synthetic.py) of the given scale.
+
+    Exporting the figures is not measured: it runs in Kaleido's browser process and is reported
+    by the render stage itself (see rendering.export_figures()). The memo cache is disabled, so
+    the memoized steps (calculate_p_values() and the fits behind the figures) are computed on
+    every repetition.
+
+    Returns:
+        dict: Per step the best time in seconds, the throughput in input rows per second and the
+              peak allocation in MB.
+    """
+    # The memoized steps are computed on every repetition instead of timing a pickle load.
+    with memo.disabled():
+        return _bench_pipeline_steps(scale, repeat)
+
+
+def _bench_pipeline_steps(scale, repeat):
+    """
+    Runs the measurements of bench_pipeline().
+    """
+    temperature = make_temperature_dataset(scale)
+    emissions = make_emissions_dataset(scale)
+    config = load_region_groups()
+    first, second = (config["groups"][key] for key in config["comparison"])
+
+    # Inputs of the later steps, computed once outside the measurements.
+    melted = transform_temperature_data(temperature.copy())
+    yearly = summarize_yearly_temperature(melted)
+    filtered = filter_data(yearly, emissions, first["countries"])
+    combined_first = merge_datasets(*filtered)
+    combined_second = merge_datasets(*filter_data(yearly, emissions, second["countries"]))
+    df_combined = combine_region_summaries(
+        first=summarize_region(combined_first, first["label"]),
+        second=summarize_region(combined_second, second["label"]),
+    )
+    p_values = calculate_p_values(df_combined)
+
+    steps = [
+        ("clean_dataset", lambda: clean_dataset(temperature), len(temperature)),
+        ("transform_temperature_data", lambda: transform_temperature_data(temperature.copy()), len(temperature)),
+        ("filter_data", lambda: filter_data(yearly, emissions, first["countries"]), len(yearly) + len(emissions)),
+        ("merge_datasets", lambda: merge_datasets(*filtered), len(filtered[0]) + len(filtered[1])),
+        ("calculate_p_values", lambda: calculate_p_values(df_combined), len(df_combined)),
+        ("figure_temperature_by_region", lambda: build_temperature_by_region_figure(
+            combined_first, first["countries"], first["title"], combined_second, second["countries"], second["title"]),
+         len(combined_first) + len(combined_second)),
+        ("figure_emissions_by_country", lambda: build_emissions_by_country_figure(
+            combined_first, first["countries"], first["title"], combined_second, second["countries"], second["title"]),
+         len(combined_first) + len(combined_second)),
+        ("figure_temperature_vs_emissions", lambda: build_temperature_vs_emissions_figure(df_combined),
+         len(df_combined)),
+        ("figure_temperature_trendlines", lambda: build_temperature_with_trendlines_figure(df_combined, p_values),
+         len(df_combined)),
+    ]
+    results = {}
+    for name, func, rows in steps:
+        _measure_step(results, name, func, rows, repeat)
+    return results
+
+
+def machine_id():
+    """
+    Identifies the machine, so results are only compared with results of the same machine.
+    """
+    return f"{platform.node()}/{platform.machine()}/{platform.python_version()}"
+
+
+def load_history(path=DEFAULT_HISTORY_FILE):
+    """
+    Loads the results of previous benchmark runs.
+
+    Returns:
+        list: One dict per recorded run ("timestamp", "machine", "benchmark", "scale", "results").
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as handle:
+        return [json.loads(line) for line in handle if line.strip()]
+
+
+def record_results(benchmark, scale, results, path=DEFAULT_HISTORY_FILE):
+    """
+    Appends the results of a benchmark run to the history file.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    entry = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": machine_id(),
+        "benchmark": benchmark,
+        "scale": scale,
+        "results": results,
+    }
+    with open(path, "a", encoding="utf-8") as handle:
+        handle.write(json.dumps(entry) + "\n")
+
+
+def find_regressions(history, benchmark, scale, results, time_tolerance=0.25, memory_tolerance=0.10,
+                     window=5, machine=None):
+    """
+    Compares benchmark results with the recorded history of the same benchmark, scale and machine.
+
+    The baseline of every metric is the median of the last window recorded runs. A timing
+    ("*_seconds") regresses if it is more than time_tolerance slower than its baseline, a peak
+    allocation ("*_peak_mb") if it is more than memory_tolerance larger. Differences below
+    1 ms and 0.5 MB are ignored as noise.
+
+    Parameters:
+        history (list): The recorded runs (see load_history()).
+        benchmark (str): Name of the benchmark.
+        scale (int): Scale of the benchmark run.
+        results (dict): The new results.
+        time_tolerance (float): Allowed relative slowdown.
+        memory_tolerance (float): Allowed relative growth of the peak allocations.
+        window (int): Number of recent runs the baseline is computed from.
+        machine (str): Machine identifier (default: this machine).
+
+    Returns:
+        list: A description of every regression (empty if there is none or no history).
+    """
+    machine = machine or machine_id()
+    previous = [
+        entry["results"] for entry in history
+        if entry["benchmark"] == benchmark and entry["scale"] == scale and entry["machine"] == machine
+    ][-window:]
+
+    regressions = []
+    for metric, value in results.items():
+        if metric.endswith("_seconds"):
+            tolerance, noise, unit = time_tolerance, 0.001, "s"
+        elif metric.endswith("_peak_mb"):
+            tolerance, noise, unit = memory_tolerance, 0.5, " MB"
+        else:
+            continue
+        baseline = [entry[metric] for entry in previous if metric in entry]
+        if not baseline:
+            continue
+        median = statistics.median(baseline)
+        if value > median * (1 + tolerance) and value - median > noise:
+            regressions.append(f"{benchmark} (scale {scale}): {metric} {value:.4f}{unit} "
+                               f"vs. baseline {median:.4f}{unit} (+{(value / median - 1) * 100:.0f}%)")
+    return regressions
+
+
+BENCHMARKS = {
+    "regression": bench_regression,
+    "rolling": bench_rolling,
+    "resampling": bench_resampling,
+    "crosscorr": bench_crosscorr,
+    "parse": bench_parse,
+    "temperature_transform": bench_temperature_transform,
+    "pipeline": bench_pipeline,
+    "startup": bench_startup,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the pipeline's hot paths.")
+    parser.add_argument("names", nargs="*", default=list(BENCHMARKS), help="benchmarks to run (default: all)")
+    parser.add_argument("--scale", type=int, nargs="+", default=[1], metavar="N",
+                        help="data scales to run, e.g. 1 10 100 (default: 1)")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions per timing (default: %(default)s)")
+    parser.add_argument("--history", default=DEFAULT_HISTORY_FILE, metavar="FILE",
+                        help="file of recorded results (default: %(default)s)")
+    parser.add_argument("--no-record", action="store_true", help="do not append the results to the history")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with status 1 if a timing or peak allocation regressed against the history")
+    parser.add_argument("--time-tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--memory-tolerance", type=float, default=0.10, help="allowed relative memory growth")
+    args = parser.parse_args()
+
+    history = load_history(args.history)
+    regressions = []
+    for scale in args.scale:
+        for name in args.names:
+            print(f"\n{name} (scale {scale}):")
+            results = BENCHMARKS[name](scale=scale, repeat=args.repeat)
+            for key, value in results.items():
+                print(f"  {key:<48} {value:14.4f}")
+            regressions += find_regressions(history, name, scale, results,
+                                            args.time_tolerance, args.memory_tolerance)
+            if not args.no_record:
+                record_results(name, scale, results, args.history)
+
+    if regressions:
+        print("\nRegressions against the recorded history:")
+        for regression in regressions:
+            print(f"  {regression}")
+        if args.check:
+            sys.exit(1)
@@ -0,0 +1,150 @@
+import argparse
+import importlib
+import os
+import sys
+import time
+
+# Directory for the CSV results and figures (the same as pipeline.py).
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# Per subcommand: the modules it needs (imported only when it runs), the stages it runs together
+# with their dependencies, and the datasets it saves as CSV files ("group_outputs": also the
+# summaries of the region groups with an "output" name). Only "plot" loads plotly.
+COMMANDS = {
+    "fetch": {
+        "help": "download (or revalidate) and parse the sources",
+        "modules": ["pipeline"],
+        "stages": ["fetch"],
+        "save": [],
+    },
+    "transform": {
+        "help": "merge the sources and aggregate the region groups (df_combined.csv, region_summaries.csv)",
+        "modules": ["pipeline"],
+        "stages": ["combine_regions"],
+        "save": ["df_combined", "region_summaries"],
+        "group_outputs": True,
+    },
+    "stats": {
+        "help": "p-values, rolling trends, resampling tests and cross-correlations (CSV, no figures)",
+        "modules": ["pipeline", "scipy.stats", "crosscorr", "resampling"],
+        "stages": ["p_values", "rolling_trends", "resampling_tests", "cross_correlations", "entity_correlations"],
+        "save": ["df_combined", "rolling_trends", "resampling_tests", "cross_correlations", "entity_correlations"],
+    },
+    "plot": {
+        "help": "render the figures (or the interactive dashboard with --dashboard)",
+        "modules": ["pipeline", "plotly.express", "plotly.graph_objects", "plotly.subplots"],
+        "stages": ["render_figures"],
+        "save": [],
+    },
+}
+
+
+def load_command(name):
+    """
+    Imports the modules a subcommand needs.
+
+    Returns:
+        float: The import time in seconds.
+    """
+    start = time.perf_counter()
+    for module in COMMANDS[name]["modules"]:
+        importlib.import_module(module)
+    return time.perf_counter() - start
+
+
+def run_command(name, regions_file=None, from_snapshot=False, backend="pandas", streaming=False, formats=None,
+                dashboard=False, force=(), output_format="csv", compression=None):
+    """
+    Runs the stages of a subcommand (see COMMANDS) and saves its datasets.
+
+    Parameters:
+        name (str): The subcommand.
+        regions_file (str): Region definition file (JSON or YAML, default: project/regions.json).
+        from_snapshot (bool): Reuse the snapshot store of a previous run instead of fetching the sources.
+        backend (str): "pandas" or "lazy" (see pipeline.build_stage_graph()).
+        streaming (bool): Read the sources in chunks, keeping only the rows of the analysed regions.
+        formats (list): Figure formats ("plot" only, default: rendering.DEFAULT_FORMATS).
+        dashboard (bool): Render the interactive dashboard instead of the figures ("plot" only).
+        force (list): Names of stages to re-run even if they are up to date.
+        output_format (str): Format of the saved datasets ("csv" or "parquet").
+        compression (str): Compression of the saved datasets (None, "gzip" or "zstd").
+
+    Returns:
+        StageGraph: The graph the stages ran in (its datasets can be loaded with graph.load()).
+    """
+    seconds = load_command(name)
+    print(f"Loaded the dependencies of '{name}' in {seconds:.2f}s.")
+    from output_writer import output_file
+    from pipeline import build_stage_graph, save_datasets
+    from region_groups import load_region_groups
+
+    options = {"formats": formats} if formats else {}
+    os.makedirs(DATA_DIRECTORY, exist_ok=True)
+    graph = build_stage_graph(DATA_DIRECTORY, from_snapshot=from_snapshot, streaming=streaming,
+                              regions_file=regions_file, backend=backend, dashboard=dashboard, **options)
+    stages = ["render_dashboard"] if name == "plot" and dashboard else list(COMMANDS[name]["stages"])
+    save = list(COMMANDS[name]["save"])
+    if COMMANDS[name].get("group_outputs"):
+        for key, group in load_region_groups(regions_file)["groups"].items():
+            if "output" in group:
+                stages.append(f"summarize_{key}")
+                save.append(group["output"])
+    graph.run(stages, force=force)
+
+    if save:
+        save_datasets(DATA_DIRECTORY, output_format, compression, **{dataset: graph.load(dataset) for dataset in save})
+        print(f"Saved {', '.join(output_file(dataset, output_format, compression) for dataset in save)} "
+              f"to '{DATA_DIRECTORY}'.")
+    if name == "stats":
+        print("\nP-values and regression results:")
+        print(graph.load("p_values"))
+    return graph
+
+
+def build_parser():
+    """
+    Returns the argument parser of the command line interface.
+    """
+    parser = argparse.ArgumentParser(description="CO2 emissions and temperature analysis, one step at a time.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, command in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=command["help"], description=command["help"])
+        subparser.add_argument("--regions", default=None, metavar="FILE",
+                               help="region definition file (JSON or YAML, default: regions.json)")
+        subparser.add_argument("--from-snapshot", action="store_true",
+                               help="reuse the snapshot store of a previous run instead of fetching the sources")
+        subparser.add_argument("--backend", choices=["pandas", "lazy"], default="pandas",
+                               help="eager pandas or lazy Arrow query plans (default: %(default)s)")
+        subparser.add_argument("--streaming", action="store_true",
+                               help="read the sources in chunks and keep only the analysed countries")
+        subparser.add_argument("--invalidate", action="append", default=[], metavar="NAME",
+                               help="force this stage to run even if it is up to date (repeatable)")
+        if command["save"] or command.get("group_outputs"):
+            subparser.add_argument("--output-format", choices=["csv", "parquet"], default="csv",
+                                   help="format of the saved datasets (default: %(default)s)")
+            subparser.add_argument("--compression", choices=["none", "gzip", "zstd"], default="none",
+                                   help="compression of the saved datasets (default: %(default)s)")
+        if name == "plot":
+            subparser.add_argument("--formats", default=None,
+                                   help="comma-separated figure formats, e.g. pdf,png,svg,html (default: pdf)")
+            subparser.add_argument("--dashboard", action="store_true",
+                                   help="render the interactive HTML dashboard instead of the figures")
+    return parser
+
+
+def main(argv=None):
+    """
+    Parses the command line and runs the subcommand.
+    """
+    args = build_parser().parse_args(argv)
+    formats = getattr(args, "formats", None)
+    return run_command(args.command, regions_file=args.regions, from_snapshot=args.from_snapshot,
+                       backend=args.backend, streaming=args.streaming,
+                       formats=formats.split(",") if formats else None,
+                       dashboard=getattr(args, "dashboard", False), force=args.invalidate,
+                       output_format=getattr(args, "output_format", "csv"),
+                       compression=None if getattr(args, "compression", "none") == "none" else args.compression)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
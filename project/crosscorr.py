@@ -0,0 +1,180 @@
+import numpy as np
+import pandas as pd
+
+# Default largest lag in years (temperature following emissions by up to three decades, and vice versa).
+DEFAULT_MAX_LAG = 30
+
+# Default minimum number of paired years behind a correlation.
+DEFAULT_MIN_PERIODS = 10
+
+
+def year_matrix(data, columns, group="Entity"):
+    """
+    Aligns the yearly series of every group on one axis of years.
+
+    Parameters:
+        data (DataFrame): Long data with the columns group, "Year" and columns (one row per
+                          group and year).
+        columns (list): The value columns to align.
+        group (str): The column identifying the series.
+
+    Returns:
+        tuple: (labels, years, matrices): the group labels (in order of first appearance), the
+               sorted years, and one (groups x years) matrix per column with NaN where a group
+               has no value for a year.
+    """
+    codes, labels = pd.factorize(data[group], sort=False)
+    years, positions = np.unique(data["Year"].to_numpy(), return_inverse=True)
+    matrices = []
+    for column in columns:
+        matrix = np.full((len(labels), len(years)), np.nan)
+        matrix[codes, positions] = data[column].to_numpy(dtype=np.float64)
+        matrices.append(matrix)
+    return list(labels), years, matrices
+
+
+def _standardized(values):
+    """
+    Centres and scales every row over its present values, and returns the values with the
+    missing ones set to 0 together with the mask of present values.
+
+    Correlations do not change, but emissions (around 1e9) and temperatures (around 10) end up
+    on the same scale, which keeps the sums of products accurate.
+    """
+    mask = ~np.isnan(values)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        counts = mask.sum(axis=1, keepdims=True)
+        means = np.where(counts > 0, np.nansum(values, axis=1, keepdims=True) / counts, 0.0)
+        centred = np.where(mask, values - means, 0.0)
+        scales = np.sqrt((centred * centred).sum(axis=1, keepdims=True) / np.maximum(counts, 1))
+        centred = centred / np.where(scales > 0, scales, 1.0)
+    return centred, mask.astype(np.float64)
+
+
+def _correlations(n, sum_x, sum_y, sum_xx, sum_yy, sum_xy, min_periods):
+    """
+    Turns sums over the paired values into Pearson correlations (NaN below min_periods pairs or
+    for constant values).
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sxx = sum_xx - sum_x * sum_x / n
+        syy = sum_yy - sum_y * sum_y / n
+        sxy = sum_xy - sum_x * sum_y / n
+        # Relative to the sums of squares, anything below the rounding error is a constant series.
+        constant = (sxx <= 1e-12 * np.maximum(sum_xx, 1e-300)) | (syy <= 1e-12 * np.maximum(sum_yy, 1e-300))
+        r = np.clip(sxy / np.sqrt(sxx * syy), -1.0, 1.0)
+    r[(n < min_periods) | constant] = np.nan
+    return r
+
+
+def _lagged_sums_fft(a, b, lags):
+    """
+    Computes sum over t of a[:, t] * b[:, t + lag] for every row and lag with one batched FFT
+    (the transforms are padded, so no product wraps around).
+    """
+    from scipy import fft
+
+    years = a.shape[1]
+    size = fft.next_fast_len(years + int(np.abs(lags).max()), real=True)
+    product = np.conj(fft.rfft(a, size, axis=1)) * fft.rfft(b, size, axis=1)
+    return fft.irfft(product, size, axis=1)[:, lags % size]
+
+
+def _lagged_sums_direct(a, b, lags):
+    """
+    Computes the same sums as _lagged_sums_fft() with one vectorized product per lag.
+    """
+    years = a.shape[1]
+    sums = np.zeros((a.shape[0], len(lags)))
+    for position, lag in enumerate(lags):
+        if lag >= 0:
+            sums[:, position] = (a[:, :years - lag] * b[:, lag:]).sum(axis=1)
+        else:
+            sums[:, position] = (a[:, -lag:] * b[:, :years + lag]).sum(axis=1)
+    return sums
+
+
+def lagged_crosscorr(data, max_lag=DEFAULT_MAX_LAG, group="Entity", x="emissions_total", y="Temperature",
+                     min_periods=DEFAULT_MIN_PERIODS, method="fft"):
+    """
+    Computes the Pearson correlation of x in year t with y in year t + lag for every group and
+    every lag from -max_lag to max_lag, for all groups at once.
+
+    The series are aligned on one axis of years with the missing years masked, so every
+    correlation uses exactly the years where both values are present (like pearsonr over the
+    paired years). The six sums behind every correlation (count, sums, squares and cross
+    products of the present pairs) are cross-correlations of the masked arrays, computed for all
+    groups and lags by one batched FFT (or one vectorized product per lag with method="direct").
+
+    Parameters:
+        data (DataFrame): Long data with the columns group, "Year", x and y.
+        max_lag (int): Largest lag in years (positive lags: y follows x).
+        group (str): The column identifying the series (e.g., "Entity" or "Region").
+        x (str): The leading series.
+        y (str): The following series.
+        min_periods (int): Minimum number of paired years (fewer give NaN).
+        method (str): "fft" or "direct".
+
+    Returns:
+        DataFrame: The columns group, "Lag", "n" (paired years) and "correlation", sorted by
+                   group (in order of first appearance) and lag.
+    """
+    labels, years, (x_values, y_values) = year_matrix(data, [x, y], group)
+    max_lag = min(max_lag, max(len(years) - 1, 0))
+    lags = np.arange(-max_lag, max_lag + 1)
+    lagged_sums = {"fft": _lagged_sums_fft, "direct": _lagged_sums_direct}[method]
+
+    # The sums are taken over the standardized values, so they stay accurate for any magnitude.
+    a, a_mask = _standardized(x_values)
+    b, b_mask = _standardized(y_values)
+    n = np.rint(lagged_sums(a_mask, b_mask, lags))
+    r = _correlations(n, lagged_sums(a, b_mask, lags), lagged_sums(a_mask, b, lags),
+                      lagged_sums(a * a, b_mask, lags), lagged_sums(a_mask, b * b, lags),
+                      lagged_sums(a, b, lags), min_periods)
+    return pd.DataFrame({
+        group: np.repeat(labels, len(lags)),
+        "Lag": np.tile(lags, len(labels)),
+        "n": n.astype(np.int64).ravel(),
+        "correlation": r.ravel(),
+    })
+
+
+def correlation_matrix(data, column="Temperature", group="Entity", min_periods=DEFAULT_MIN_PERIODS):
+    """
+    Computes the Pearson correlation of the yearly series of every pair of groups over the years
+    both have values for (like DataFrame.corr() of the series side by side), with six matrix
+    products over the masked year matrix instead of one pearsonr per pair.
+
+    Parameters:
+        data (DataFrame): Long data with the columns group, "Year" and column.
+        column (str): The series to correlate.
+        group (str): The column identifying the series.
+        min_periods (int): Minimum number of common years (fewer give NaN).
+
+    Returns:
+        DataFrame: The (groups x groups) correlation matrix, labelled by group on both axes.
+    """
+    labels, _, (values,) = year_matrix(data, [column], group)
+    a, mask = _standardized(values)
+    squares = a * a
+    n = np.rint(mask @ mask.T)
+    r = _correlations(n, a @ mask.T, mask @ a.T, squares @ mask.T, mask @ squares.T, a @ a.T, min_periods)
+    index = pd.Index(labels, name=group)
+    return pd.DataFrame(r, index=index, columns=index.rename(None))
+
+
+def cross_correlations(combined_a, combined_b, df_combined, max_lag=DEFAULT_MAX_LAG, min_periods=DEFAULT_MIN_PERIODS):
+    """
+    Computes the lagged emissions-temperature correlations of the countries of both compared
+    regions and of the regions themselves.
+
+    Returns:
+        DataFrame: The columns "Level" ("Entity" or "Region"), "Name", "Lag", "n" and "correlation".
+    """
+    countries = pd.concat([combined_a, combined_b], ignore_index=True).drop_duplicates(["Entity", "Year"])
+    results = []
+    for level, data in (("Entity", countries), ("Region", df_combined)):
+        result = lagged_crosscorr(data, max_lag, group=level, min_periods=min_periods).rename(columns={level: "Name"})
+        result.insert(0, "Level", level)
+        results.append(result)
+    return pd.concat(results, ignore_index=True)
@@ -0,0 +1,237 @@
+import html
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+# Maximum number of points drawn per line; denser series are downsampled with LTTB.
+DEFAULT_MAX_POINTS = 500
+
+
+def lttb(x, y, threshold):
+    """
+    Selects threshold points of a line with the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and the last point are kept; the points in between are split into threshold - 2
+    buckets, and each bucket keeps the point forming the largest triangle with the point kept
+    from the previous bucket and the average of the next bucket. Peaks and dips survive, unlike
+    with plain decimation.
+
+    Parameters:
+        x (ndarray): The x values, sorted ascending.
+        y (ndarray): The y values (without missing values).
+        threshold (int): Number of points to keep.
+
+    Returns:
+        ndarray: The positions of the kept points (all positions if the line is short enough).
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Bucket boundaries of the inner points; the last "bucket" is the last point alone.
+    edges = np.floor(np.arange(threshold - 1) * (n - 2) / (threshold - 2)).astype(np.int64) + 1
+    edges = np.append(edges, n)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_x = x[end:edges[bucket + 2]].mean()
+        next_y = y[end:edges[bucket + 2]].mean()
+        # Twice the area of the triangles (previous point, candidate, next bucket average).
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def grouped_rows(data, group, order=None):
+    """
+    Splits the rows of data by group in one pass (a stable sort by group code), instead of one
+    boolean mask per group.
+
+    Parameters:
+        data (DataFrame): The data.
+        group (str): The column identifying the series.
+        order (list): Labels in the order to return (default: order of first appearance; labels
+                      without rows are skipped).
+
+    Returns:
+        list: (label, positions) per group, the positions in their original order.
+    """
+    codes, labels = pd.factorize(data[group], sort=False)
+    sorted_positions = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[sorted_positions], np.arange(len(labels) + 1))
+    rows = {label: sorted_positions[bounds[code]:bounds[code + 1]] for code, label in enumerate(labels)}
+    labels = [label for label in (order if order is not None else labels) if label in rows]
+    return [(label, rows[label]) for label in labels]
+
+
+def line_traces(data, group, x, y, names, max_points=DEFAULT_MAX_POINTS, order=None, **trace_options):
+    """
+    Builds one WebGL line trace per group from a single grouped pass, downsampling the series
+    with more than max_points points.
+
+    Parameters:
+        data (DataFrame): The data (sorted by x within every group).
+        group (str): The column identifying the series.
+        x (str): The column of the x values.
+        y (str): The column of the y values (missing values are dropped).
+        names (callable): Maps a group label to the trace name.
+        max_points (int): Maximum number of points per trace.
+        order (list): Order of the groups (see grouped_rows()).
+        trace_options: Further go.Scattergl arguments.
+
+    Returns:
+        tuple: (traces, points in the data, points drawn).
+    """
+    xs = data[x].to_numpy(dtype=np.float64)
+    ys = data[y].to_numpy(dtype=np.float64)
+    traces, points_in, points_out = [], 0, 0
+    for label, rows in grouped_rows(data, group, order):
+        rows = rows[~np.isnan(ys[rows])]
+        kept = rows[lttb(xs[rows], ys[rows], max_points)]
+        points_in += len(rows)
+        points_out += len(kept)
+        traces.append(go.Scattergl(x=xs[kept], y=ys[kept], mode="lines", name=names(label), **trace_options))
+    return traces, points_in, points_out
+
+
+def build_country_panel(data_a, countries_a, title_a, data_b, countries_b, title_b, column, subplot_title, label,
+                        max_points=DEFAULT_MAX_POINTS):
+    """
+    Builds the side-by-side country lines of two regions (like the large emissions and
+    temperature graphs of the pipeline) with WebGL traces.
+
+    Returns:
+        tuple: (figure, points in the data, points drawn).
+    """
+    fig = make_subplots(rows=1, cols=2, subplot_titles=(f"{subplot_title} {title_a}", f"{subplot_title} {title_b}"))
+    points_in = points_out = 0
+    for col, (data, countries, title) in enumerate([(data_a, countries_a, title_a), (data_b, countries_b, title_b)], 1):
+        traces, count_in, count_out = line_traces(data, "Entity", "Year", column, lambda country: f"{country} ({title})",
+                                                  max_points, order=list(countries))
+        for trace in traces:
+            fig.add_trace(trace, row=1, col=col)
+        points_in += count_in
+        points_out += count_out
+    fig.update_layout(showlegend=True, legend_title_text="Countries", xaxis_title="Year", yaxis_title=label, height=600)
+    return fig, points_in, points_out
+
+
+def build_scatter_panel(df_combined, best_fit):
+    """
+    Builds the temperature vs. emissions scatter per region with WebGL markers and the line of
+    best fit (slope, intercept).
+
+    Returns:
+        tuple: (figure, points in the data, points drawn).
+    """
+    fig = go.Figure()
+    for region, rows in grouped_rows(df_combined, "Region"):
+        fig.add_trace(go.Scattergl(
+            x=df_combined["emissions_total"].values[rows], y=df_combined["Temperature"].values[rows],
+            customdata=df_combined["Year"].values[rows], mode="markers", name=region,
+            hovertemplate="Year: %{customdata}<br>Emissions: %{x:.3s}<br>Temperature: %{y:.2f}°C<extra></extra>",
+        ))
+    x = df_combined["emissions_total"].values
+    x_fit = np.linspace(x.min(), x.max(), 100)
+    slope, intercept = best_fit
+    fig.add_trace(go.Scattergl(x=x_fit, y=slope * x_fit + intercept, mode="lines", name="Best Fit Line",
+                               line=dict(color="red", width=2, dash="dash")))
+    fig.update_layout(xaxis_title="CO2 Emissions (Million Tons)", yaxis_title="Temperature (°C)", height=600)
+    return fig, len(df_combined), len(df_combined) + len(x_fit)
+
+
+def build_trendline_panel(df_combined, trendlines, max_points=DEFAULT_MAX_POINTS):
+    """
+    Builds the regional temperature lines with their polynomial trendlines (the values of the
+    trendline at every row of df_combined) as WebGL traces.
+
+    Returns:
+        tuple: (figure, points in the data, points drawn).
+    """
+    data = df_combined[["Region", "Year", "Temperature"]].assign(Trendline=trendlines)
+    fig = go.Figure()
+    temperature, in_a, out_a = line_traces(data, "Region", "Year", "Temperature", lambda region: f"{region} Temperature",
+                                           max_points, line=dict(width=2))
+    trend, in_b, out_b = line_traces(data, "Region", "Year", "Trendline", lambda region: f"{region} Trendline",
+                                     max_points, line=dict(dash="dash"))
+    # Keep every region's trendline next to its temperature line in the legend.
+    for pair in zip(temperature, trend):
+        fig.add_traces(list(pair))
+    fig.update_layout(xaxis_title="Year", yaxis_title="Temperature (°C)", legend_title="Regions",
+                      template="plotly_white", hovermode="x unified", height=600)
+    return fig, in_a + in_b, out_a + out_b
+
+
+def write_dashboard(panels, output_file, title="Emissions and Temperature Dashboard"):
+    """
+    Writes panels into one self-contained HTML file (plotly.js is embedded once).
+
+    Parameters:
+        panels (list): (name, heading, figure) of every panel, in display order.
+        output_file (str): Path of the HTML file.
+        title (str): Title of the page.
+
+    Returns:
+        dict: The size in bytes of every panel's HTML, keyed by name.
+    """
+    sizes = {}
+    sections = []
+    for position, (name, heading, fig) in enumerate(panels):
+        # Only the first panel carries the plotly.js bundle; the others reuse it.
+        div = fig.to_html(full_html=False, include_plotlyjs=position == 0, div_id=name,
+                          default_width="100%", config={"responsive": True})
+        sizes[name] = len(div.encode("utf-8"))
+        sections.append(f"<section><h2>{html.escape(heading)}</h2>\n{div}\n</section>")
+
+    page = (
+        "<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n"
+        f"<title>{html.escape(title)}</title>\n"
+        "<style>body { font-family: sans-serif; margin: 2em; } section { margin-bottom: 3em; }</style>\n"
+        f"</head>\n<body>\n<h1>{html.escape(title)}</h1>\n" + "\n".join(sections) + "\n</body>\n</html>\n"
+    )
+    tmp_path = output_file + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        handle.write(page)
+    os.replace(tmp_path, output_file)
+    return sizes
+
+
+def build_dashboard(builders, output_file, title="Emissions and Temperature Dashboard"):
+    """
+    Builds the panels, writes the dashboard and reports the construction time, the number of
+    points and the output size of every panel.
+
+    Parameters:
+        builders (list): (name, heading, build) per panel, where build() returns
+                         (figure, points in the data, points drawn).
+        output_file (str): Path of the HTML file.
+        title (str): Title of the page.
+
+    Returns:
+        list: The report of every panel ("name", "build_seconds", "points", "drawn_points", "bytes").
+    """
+    panels, report = [], []
+    for name, heading, build in builders:
+        start = time.perf_counter()
+        fig, points, drawn = build()
+        report.append({"name": name, "build_seconds": time.perf_counter() - start, "points": points,
+                       "drawn_points": drawn})
+        panels.append((name, heading, fig))
+
+    sizes = write_dashboard(panels, output_file, title)
+    for entry in report:
+        entry["bytes"] = sizes[entry["name"]]
+        print(f"Built '{entry['name']}' in {entry['build_seconds']:.3f}s "
+              f"({entry['points']} points, {entry['drawn_points']} drawn, {entry['bytes'] / 1024:.0f} KB).")
+    print(f"Dashboard written to '{output_file}' ({os.path.getsize(output_file) / 1024 / 1024:.1f} MB).")
+    return report
@@ -0,0 +1,370 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry, make_headers
+
+# Default location of the on-disk download cache (next to the pipeline script).
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "downloads")
+
+# Default eviction policy: keep at most 512 MB of downloads and drop entries unused for 30 days.
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60
+
+# User-agent sent with every request (Our World In Data asks clients to identify themselves).
+DEFAULT_USER_AGENT = "Our World In Data data fetch/1.0"
+
+# Compressed transfer encodings the HTTP client can decode (gzip and deflate, plus brotli
+# and zstd when the optional brotli/zstandard packages are installed).
+ACCEPT_ENCODING = make_headers(accept_encoding=True)["accept-encoding"]
+
+# Responses worth retrying: rate limiting and transient server errors.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class OfflineCacheMiss(RuntimeError):
+    """
+    Raised when offline mode is enabled and the requested URL is not in the cache.
+    """
+
+
+def _url_key(url):
+    """
+    Returns the cache key used for the index entry of a URL.
+
+    Parameters:
+        url (str): The URL of the download.
+
+    Returns:
+        str: The hex SHA-256 digest of the URL.
+    """
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def _env_flag(name):
+    """
+    Returns True if the environment variable is set to a truthy value ("1", "true", "yes", "on").
+    """
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def make_session(pool_size=10, retries=3, backoff=0.5, user_agent=DEFAULT_USER_AGENT):
+    """
+    Creates a pooled HTTP session that keeps connections alive between requests and retries
+    failed requests with exponential backoff.
+
+    Parameters:
+        pool_size (int): Maximum number of pooled connections per host (the number of
+                         downloads that can run concurrently without opening new connections).
+        retries (int): Maximum number of retries of a failed request.
+        backoff (float): Backoff factor; retry n waits about backoff * 2 ** (n - 1) seconds.
+        user_agent (str): User-agent header sent with every request.
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    retry = Retry(
+        total=retries, backoff_factor=backoff, status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}), raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"User-Agent": user_agent, "Accept-Encoding": ACCEPT_ENCODING})
+    return session
+
+
+class DownloadCache:
+    """
+    Content-addressed on-disk cache for HTTP downloads.
+
+    Downloaded bodies are stored once under "objects/<sha256 of content>" and every URL
+    gets a small JSON index entry under "index/<sha256 of url>.json" that records the
+    ETag/Last-Modified validators, the object it points to and when it was last used.
+    Cached entries are revalidated with conditional requests, so an unchanged remote file
+    costs a single "304 Not Modified" round-trip instead of a full download. Requests go
+    through a pooled session with retries (see make_session()); the cache is safe to use
+    from several threads at once (see fetcher.py).
+
+    Parameters:
+        directory (str): Root directory of the cache (default: project/.cache/downloads,
+                         overridable via the PIPELINE_CACHE_DIR environment variable).
+        max_bytes (int): Maximum total size of the cached objects before eviction.
+        max_age (float): Entries not used for this many seconds are evicted.
+        offline (bool): Serve only from the cache and never touch the network
+                        (default: the PIPELINE_OFFLINE environment variable).
+        timeout (float): Timeout in seconds for each HTTP request.
+        user_agent (str): User-agent header sent with every request.
+        session (requests.Session): HTTP session to use (default: make_session(user_agent=user_agent)).
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE,
+                 offline=None, timeout=60, user_agent=DEFAULT_USER_AGENT, session=None):
+        self.directory = directory or os.environ.get("PIPELINE_CACHE_DIR", DEFAULT_CACHE_DIRECTORY)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.offline = _env_flag("PIPELINE_OFFLINE") if offline is None else offline
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.session = session or make_session(user_agent=user_agent)
+        # Serializes the updates of the index and the eviction between concurrent downloads.
+        self.lock = threading.Lock()
+        # URLs that must not be evicted while a batch of concurrent downloads is still being used,
+        # counted per batch (batches running at the same time may share URLs).
+        self.pinned = Counter()
+
+        self.objects_directory = os.path.join(self.directory, "objects")
+        self.index_directory = os.path.join(self.directory, "index")
+        os.makedirs(self.objects_directory, exist_ok=True)
+        os.makedirs(self.index_directory, exist_ok=True)
+
+    def _index_path(self, url):
+        return os.path.join(self.index_directory, _url_key(url) + ".json")
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_directory, digest)
+
+    def _read_entry(self, url):
+        """
+        Returns the index entry of a URL, or None if the URL is not cached
+        (or its object has disappeared from disk).
+        """
+        try:
+            with open(self._index_path(url), "r", encoding="utf-8") as handle:
+                entry = json.load(handle)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if not os.path.exists(self._object_path(entry["object"])):
+            return None
+        return entry
+
+    def _write_entry(self, entry):
+        """
+        Atomically writes the index entry of a URL.
+        """
+        path = self._index_path(entry["url"])
+        fd, tmp_path = tempfile.mkstemp(dir=self.index_directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump(entry, handle, indent=2)
+        os.replace(tmp_path, path)
+
+    def _store_object(self, response):
+        """
+        Streams a response body (decoding any compressed transfer encoding) into a temporary
+        file in the object store and returns its path, digest and size. The caller renames it
+        into place once the download is complete, so a crashed download never leaves a
+        truncated object behind.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.objects_directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    digest.update(chunk)
+                    handle.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return tmp_path, digest.hexdigest(), size
+
+    def _request(self, url, entry):
+        """
+        Performs a (conditional) streamed GET request for a URL.
+
+        Returns:
+            tuple: (status, response). The status is 304 if the cached entry is still valid,
+                   in which case response is None.
+        """
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout, stream=True)
+        if response.status_code == 304 and entry is not None:
+            response.close()
+            return 304, None
+        try:
+            response.raise_for_status()
+        except requests.HTTPError:
+            response.close()
+            raise
+        return response.status_code, response
+
+    def fetch(self, url):
+        """
+        Returns the local path of the cached body of a URL, downloading or revalidating it first.
+
+        Parameters:
+            url (str): The URL to fetch.
+
+        Returns:
+            str: Path of the cached file containing the response body.
+        """
+        return self.fetch_with_info(url)[0]
+
+    def fetch_with_info(self, url):
+        """
+        Like fetch(), but also reports how the request was served.
+
+        Parameters:
+            url (str): The URL to fetch.
+
+        Returns:
+            tuple: (path, info) where info holds the "url", the "status" ("downloaded",
+                   "not_modified", "offline" or "stale"), the "bytes" of the body and the
+                   request time in "seconds".
+        """
+        start = time.perf_counter()
+        entry = self._read_entry(url)
+        now = time.time()
+        tmp_path = None
+
+        if self.offline:
+            # Offline mode: never touch the network, serve whatever is cached.
+            if entry is None:
+                raise OfflineCacheMiss(f"'{url}' is not in the download cache and offline mode is enabled.")
+            status = "offline"
+        else:
+            try:
+                code, response = self._request(url, entry)
+            except (requests.RequestException, OSError) as error:
+                # Fall back to a stale copy if the source is unreachable.
+                if entry is None:
+                    raise
+                print(f"Could not revalidate '{url}' ({error}); using the cached copy.")
+                status = "stale"
+            else:
+                if code == 304:
+                    entry["validated_at"] = now
+                    status = "not_modified"
+                else:
+                    with response:
+                        tmp_path, digest, size = self._store_object(response)
+                        entry = {
+                            "url": url,
+                            "object": digest,
+                            "size": size,
+                            "etag": response.headers.get("ETag"),
+                            "last_modified": response.headers.get("Last-Modified"),
+                            "fetched_at": now,
+                            "validated_at": now,
+                        }
+                    status = "downloaded"
+
+        with self.lock:
+            # Rename the object into place, record the entry and evict as one step, so a
+            # concurrent eviction never deletes an object whose entry is not written yet.
+            if tmp_path is not None:
+                os.replace(tmp_path, self._object_path(entry["object"]))
+            entry["used_at"] = now
+            self._write_entry(entry)
+            self.evict(keep={url} | set(self.pinned))
+
+        info = {"url": url, "status": status, "bytes": entry.get("size", 0),
+                "seconds": time.perf_counter() - start}
+        return self._object_path(entry["object"]), info
+
+    def pin(self, urls):
+        """
+        Protects the entries of urls from eviction until they are unpinned as often as pinned.
+        """
+        with self.lock:
+            self.pinned.update(set(urls))
+
+    def unpin(self, urls):
+        """
+        Releases one pin of each of urls (an entry stays protected while other batches pin it).
+        """
+        with self.lock:
+            self.pinned -= Counter(set(urls))
+
+    def entries(self):
+        """
+        Returns all index entries currently in the cache.
+
+        Returns:
+            list: A list of index entry dictionaries.
+        """
+        entries = []
+        for name in os.listdir(self.index_directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.index_directory, name), "r", encoding="utf-8") as handle:
+                    entries.append(json.load(handle))
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+        return entries
+
+    def evict(self, keep=None):
+        """
+        Applies the eviction policy: drops entries unused for longer than max_age, then drops
+        the least recently used entries until the cached objects fit into max_bytes.
+        Objects that are no longer referenced by any entry are deleted.
+
+        Parameters:
+            keep (str or set): Optional URL(s) whose entries are never evicted (e.g., the one just fetched).
+        """
+        now = time.time()
+        keep = {keep} if isinstance(keep, str) else set(keep or ())
+        entries = sorted(
+            (entry for entry in self.entries() if entry["url"] not in keep),
+            key=lambda item: item.get("used_at", 0)
+        )
+        protected = [entry for entry in self.entries() if entry["url"] in keep]
+
+        # Drop entries that have not been used within the maximum age.
+        kept = []
+        for entry in entries:
+            if now - entry.get("used_at", 0) > self.max_age:
+                self._remove_entry(entry)
+            else:
+                kept.append(entry)
+
+        # Drop the least recently used entries until the referenced objects fit into the budget
+        # (objects shared by several URLs are only counted once).
+        sizes = {entry["object"]: entry.get("size", 0) for entry in kept + protected}
+        total = sum(sizes.values())
+        while kept and total > self.max_bytes:
+            entry = kept.pop(0)
+            self._remove_entry(entry)
+            if all(other["object"] != entry["object"] for other in kept + protected):
+                total -= sizes.pop(entry["object"], 0)
+
+        # Delete objects that are no longer referenced (downloads still in progress are skipped).
+        referenced = {entry["object"] for entry in kept + protected}
+        for name in os.listdir(self.objects_directory):
+            if name not in referenced and not name.endswith(".tmp"):
+                try:
+                    os.remove(os.path.join(self.objects_directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def _remove_entry(self, entry):
+        try:
+            os.remove(self._index_path(entry["url"]))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        """
+        Removes every entry and object from the cache.
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.objects_directory, exist_ok=True)
+        os.makedirs(self.index_directory, exist_ok=True)
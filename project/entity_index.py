@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+
+
+class EntityYearIndex:
+    """
+    A prebuilt (Entity, Year) index over a dataset.
+
+    The rows are sorted once by entity and year; every entity then owns one contiguous block
+    of rows, located through an offsets array. Selecting k entities costs O(rows returned)
+    instead of a full-column isin() scan, and two indexes can be joined with a sorted merge
+    join on their (Entity, Year) keys. Rows without an entity are not indexed, so they never
+    match (a missing entity would otherwise become the key "nan").
+
+    Parameters:
+        df (DataFrame): A dataset with the columns "Entity" and "Year".
+    """
+
+    def __init__(self, df):
+        df = df[df["Entity"].notna()]
+        entity = df["Entity"].astype(str).to_numpy()
+        self.entities, codes = np.unique(entity, return_inverse=True)
+
+        # Sort the rows by (entity, year); the sort is stable, so ties keep their original order.
+        order = np.lexsort((df["Year"].to_numpy(), codes))
+        self.frame = df.iloc[order].reset_index(drop=True)
+        self.codes = codes[order]
+        self.years = self.frame["Year"].to_numpy()
+
+        # offsets[i]:offsets[i + 1] is the block of rows of entity i.
+        self.offsets = np.searchsorted(self.codes, np.arange(len(self.entities) + 1))
+        self.positions = {name: position for position, name in enumerate(self.entities)}
+
+    def __len__(self):
+        return len(self.frame)
+
+    def block(self, entity):
+        """
+        Returns the (start, stop) row range of an entity ((0, 0) if it is not indexed).
+        """
+        position = self.positions.get(entity)
+        if position is None:
+            return 0, 0
+        return self.offsets[position], self.offsets[position + 1]
+
+    def rows(self, entities):
+        """
+        Returns the row positions of the given entities, in index (entity, year) order.
+
+        Parameters:
+            entities (list): The entities to select.
+
+        Returns:
+            ndarray: The sorted row positions.
+        """
+        positions = sorted({self.positions[name] for name in entities if name in self.positions})
+        if not positions:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(self.offsets[p], self.offsets[p + 1]) for p in positions])
+
+    def select(self, entities, years=None):
+        """
+        Returns the rows of the given entities, optionally restricted to a set of years.
+
+        Parameters:
+            entities (list): The entities to select.
+            years (array-like): Optional years to keep.
+
+        Returns:
+            DataFrame: The selected rows, sorted by entity and year.
+        """
+        rows = self.rows(entities)
+        if years is not None:
+            rows = rows[np.isin(self.years[rows], np.asarray(years))]
+        return self.frame.iloc[rows]
+
+    def entity(self, name):
+        """
+        Returns the rows of a single entity as a slice of the indexed dataset (no copy of the index).
+        """
+        start, stop = self.block(name)
+        return self.frame.iloc[start:stop]
+
+    def entity_years(self, entities):
+        """
+        Returns the sorted distinct years present for the given entities.
+        """
+        return np.unique(self.years[self.rows(entities)])
+
+    def keys(self, vocabulary):
+        """
+        Returns the (Entity, Year) keys of all rows as sortable int64 values, with the entity
+        encoded by its position in a shared, sorted vocabulary.
+        """
+        codes = np.searchsorted(vocabulary, self.entities)[self.codes].astype(np.int64)
+        return (codes << 32) | (self.years.astype(np.int64) + (1 << 31))
+
+
+def filter_indexed(temperature_index, emissions_index, regions):
+    """
+    Filters two indexed datasets to the given regions and their shared years
+    (the same selection as filter_data(), via O(k) block slicing instead of full scans).
+
+    Parameters:
+        temperature_index (EntityYearIndex): The indexed temperature data.
+        emissions_index (EntityYearIndex): The indexed emissions data.
+        regions (list): A list of region or country names to filter the data by.
+
+    Returns:
+        tuple: The filtered temperature and emissions data (sorted by entity and year).
+    """
+    common_years = np.intersect1d(temperature_index.entity_years(regions), emissions_index.entity_years(regions))
+    return (
+        temperature_index.select(regions, common_years),
+        emissions_index.select(regions, common_years),
+    )
+
+
+def merge_indexed(temperature_index, emissions_index, entities=None):
+    """
+    Inner-joins two indexed datasets on ("Entity", "Year") with a sorted merge join.
+
+    The result has the same columns as pd.merge(temperature, emissions, on=["Entity", "Year"])
+    (overlapping columns get the suffixes "_x" and "_y") and is sorted by entity and year. Like
+    pd.merge(), a key repeated on the right side pairs the left row with every repetition.
+
+    Parameters:
+        temperature_index (EntityYearIndex): The indexed temperature data (left side).
+        emissions_index (EntityYearIndex): The indexed emissions data (right side).
+        entities (list): Optional entities to restrict the join to.
+
+    Returns:
+        DataFrame: The joined dataset.
+    """
+    vocabulary = np.union1d(temperature_index.entities, emissions_index.entities)
+    left_keys = temperature_index.keys(vocabulary)
+    right_keys = emissions_index.keys(vocabulary)
+    # Both key arrays are sorted, so the run of right rows of every left key is found by binary search.
+    left_rows = np.arange(len(left_keys)) if entities is None else temperature_index.rows(entities)
+    first = np.searchsorted(right_keys, left_keys[left_rows], side="left")
+    counts = np.searchsorted(right_keys, left_keys[left_rows], side="right") - first
+    # Repeat every left row once per matching right row and enumerate the rows of each run.
+    left_rows = np.repeat(left_rows, counts)
+    starts = np.cumsum(counts) - counts
+    right_rows = np.repeat(first, counts) + np.arange(len(left_rows)) - np.repeat(starts, counts)
+
+    left = temperature_index.frame.iloc[left_rows].reset_index(drop=True)
+    right = emissions_index.frame.iloc[right_rows].reset_index(drop=True)
+    right = right.drop(columns=["Entity", "Year"])
+
+    # Suffix the overlapping columns like pd.merge() does.
+    overlap = [column for column in right.columns if column in left.columns]
+    left = left.rename(columns={column: f"{column}_x" for column in overlap})
+    right = right.rename(columns={column: f"{column}_y" for column in overlap})
+    return pd.concat([left, right], axis=1)
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pyarrow as pa
+
+# The shared base frames of the current worker process, keyed by name (see _init_worker()).
+_FRAMES = {}
+
+
+def write_shared_frames(directory, frames):
+    """
+    Writes DataFrames as uncompressed Arrow IPC files, which worker processes can memory-map
+    instead of receiving pickled copies.
+
+    Parameters:
+        directory (str): Directory for the Arrow files.
+        frames (dict): The DataFrames to share, keyed by name.
+
+    Returns:
+        dict: The paths of the Arrow files, keyed by name.
+    """
+    paths = {}
+    for name, frame in frames.items():
+        path = os.path.join(directory, f"{name}.arrow")
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        paths[name] = path
+    return paths
+
+
+def open_shared_frame(path):
+    """
+    Opens an Arrow IPC file written by write_shared_frames() through a memory map. The Arrow
+    buffers are backed by the page cache shared by all processes, not by a private copy.
+
+    Returns:
+        DataFrame: The frame (numeric columns are converted without copying where possible).
+    """
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _init_worker(paths):
+    """
+    Maps the shared base frames once per worker process.
+    """
+    _FRAMES.clear()
+    _FRAMES.update({name: open_shared_frame(path) for name, path in paths.items()})
+
+
+def _run_task(func, task):
+    return func(_FRAMES, task)
+
+
+def fan_out(func, tasks, frames, workers=None):
+    """
+    Runs func(frames, task) for every task across a pool of worker processes.
+
+    The base frames are written once to memory-mapped Arrow files and mapped by every worker,
+    so only the (small) tasks and results are pickled. The results are returned in task order,
+    independent of the order in which the workers finish.
+
+    Parameters:
+        func (callable): A module-level function taking the dict of base frames and one task.
+        tasks (list): The tasks (e.g., region group definitions).
+        frames (dict): The base DataFrames shared by all tasks, keyed by name.
+        workers (int): Number of worker processes (default: one per task, at most one per CPU;
+                       0 runs the tasks serially in this process).
+
+    Returns:
+        list: The results of func, in the order of tasks.
+    """
+    tasks = list(tasks)
+    if workers is None:
+        workers = min(len(tasks), os.cpu_count() or 1)
+    if workers <= 0 or len(tasks) <= 1:
+        return [func(frames, task) for task in tasks]
+
+    directory = tempfile.mkdtemp(prefix="fanout-")
+    try:
+        paths = write_shared_frames(directory, frames)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(paths,)) as executor:
+            # map() yields the results in submission order, which keeps the gather deterministic.
+            return list(executor.map(_run_task, [func] * len(tasks), tasks))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+
+import pandas as pd
+
+from download_cache import DownloadCache
+
+# Maximum number of downloads in flight at the same time.
+DEFAULT_CONCURRENCY = 8
+
+
+async def fetch_source(cache, name, url, parse, semaphore):
+    """
+    Downloads (or revalidates) one source through the cache and then parses it. The source is
+    parsed once its whole body is downloaded; only the downloads and parses of different
+    sources overlap.
+
+    Returns:
+        tuple: (parsed value, timing) where the timing holds the source name, the URL, how the
+               request was served, the body size and the request and parse times in seconds.
+    """
+    async with semaphore:
+        path, info = await asyncio.to_thread(cache.fetch_with_info, url)
+    start = time.perf_counter()
+    value = await asyncio.to_thread(parse, path) if parse is not None else path
+    return value, dict(info, name=name, parse_seconds=time.perf_counter() - start)
+
+
+async def fetch_sources_async(sources, cache=None, parse=pd.read_csv, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Downloads and parses all sources concurrently.
+
+    The blocking HTTP requests run in worker threads and share the pooled, retrying session of
+    the download cache, so adding sources adds no serial round-trips.
+
+    Parameters:
+        sources (dict): Source URLs keyed by name.
+        cache (DownloadCache): The download cache to use (default: a cache in project/.cache).
+        parse (callable): Parses the downloaded file (default: pd.read_csv; None returns the path);
+                          a dict gives the parse function of every source by name.
+        concurrency (int): Maximum number of downloads in flight at the same time.
+
+    Returns:
+        tuple: (values, timings): the parsed sources keyed by name (in the order of sources)
+               and the per-request timings.
+    """
+    cache = cache or DownloadCache()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # Keep the entries of this batch from being evicted by each other until all are parsed.
+    urls = set(sources.values())
+    cache.pin(urls)
+    try:
+        results = await asyncio.gather(*(
+            fetch_source(cache, name, url, parse.get(name) if isinstance(parse, dict) else parse, semaphore)
+            for name, url in sources.items()
+        ))
+    finally:
+        cache.unpin(urls)
+
+    values = {name: value for name, (value, _) in zip(sources, results)}
+    return values, [timing for _, timing in results]
+
+
+def run_coroutine(coroutine):
+    """
+    Runs a coroutine to completion from synchronous code, also when an event loop is already
+    running in this thread (e.g., inside a Jupyter notebook).
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    result = {}
+
+    def target():
+        try:
+            result["value"] = asyncio.run(coroutine)
+        except BaseException as error:
+            result["error"] = error
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+
+def fetch_sources(sources, cache=None, parse=pd.read_csv, concurrency=DEFAULT_CONCURRENCY, report=True):
+    """
+    Synchronous wrapper of fetch_sources_async() that optionally prints the request timings.
+
+    Returns:
+        tuple: (values, timings) as returned by fetch_sources_async().
+    """
+    start = time.perf_counter()
+    values, timings = run_coroutine(fetch_sources_async(sources, cache, parse, concurrency))
+    if report:
+        for timing in timings:
+            print(f"Fetched '{timing['name']}' ({timing['status']}, {timing['bytes'] / 1024:.0f} KB) "
+                  f"in {timing['seconds']:.2f}s, parsed in {timing['parse_seconds']:.2f}s.")
+        print(f"Fetched {len(timings)} source(s) in {time.perf_counter() - start:.2f}s.")
+    return values, timings
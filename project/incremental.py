@@ -0,0 +1,261 @@
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from memo import fingerprint
+from output_writer import append_dataset, appendable, output_file, update_manifest, write_artifacts
+from regression import linregress_from_sums
+from region_groups import aggregate_region_groups, select_region
+from snapshot_store import SnapshotStore
+
+# Default location of the incremental state (the stored member data, summaries and regression sums).
+DEFAULT_INCREMENTAL_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "incremental")
+
+# Key and value columns of the merged per-country data.
+KEY_COLUMNS = ["Entity", "Year"]
+VALUE_COLUMNS = ["Temperature", "emissions_total"]
+
+# The sufficient statistics of the regression of the yearly emissions on the year.
+SUM_COLUMNS = ["n", "sum_x", "sum_y", "sum_xy", "sum_xx", "sum_yy"]
+
+
+def changed_keys(previous, current):
+    """
+    Compares two versions of the merged per-country data by (Entity, Year).
+
+    Parameters:
+        previous (DataFrame): The stored version ("Entity", "Year", "Temperature", "emissions_total").
+        current (DataFrame): The fresh version with the same columns.
+
+    Returns:
+        DataFrame: The keys ("Entity", "Year") that were added, changed or removed, with the
+                   kind of change in the column "change".
+    """
+    def hashed(data):
+        # One hash of the values per key (missing values hash alike, so they compare equal).
+        return pd.DataFrame({
+            "Entity": data["Entity"].astype(str).values,
+            "Year": data["Year"].astype(np.int64).values,
+            "hash": pd.util.hash_pandas_object(data[VALUE_COLUMNS], index=False).values,
+        })
+
+    merged = hashed(previous).merge(hashed(current), on=KEY_COLUMNS, how="outer",
+                                    suffixes=("_previous", "_current"), indicator=True)
+    change = np.select(
+        [merged["_merge"] == "right_only", merged["_merge"] == "left_only",
+         merged["hash_previous"] != merged["hash_current"]],
+        ["added", "removed", "changed"], default="",
+    )
+    merged["change"] = change
+    return merged.loc[change != "", KEY_COLUMNS + ["change"]].reset_index(drop=True)
+
+
+def regression_sums(summaries, origin):
+    """
+    Computes the sufficient statistics of the regression of "emissions_total" on "Year" per region.
+
+    Parameters:
+        summaries (DataFrame): Yearly summaries ("Region", "Year", "emissions_total").
+        origin (int): Year subtracted from x, which keeps the sums of squares well conditioned.
+
+    Returns:
+        DataFrame: The columns "n", "sum_x", "sum_y", "sum_xy", "sum_xx" and "sum_yy", indexed by region.
+    """
+    x = summaries["Year"].astype(np.float64) - origin
+    y = summaries["emissions_total"].astype(np.float64)
+    terms = pd.DataFrame({"n": 1.0, "sum_x": x, "sum_y": y, "sum_xy": x * y, "sum_xx": x * x, "sum_yy": y * y})
+    return terms.groupby(summaries["Region"].values, sort=False).sum()
+
+
+def p_values_from_sums(sums, origin):
+    """
+    Computes the regression results of pipeline.calculate_p_values() from maintained sums.
+
+    Parameters:
+        sums (DataFrame): The sums per region (see regression_sums()).
+        origin (int): The origin year of the sums.
+
+    Returns:
+        DataFrame: The columns "Region", "Slope", "Intercept", "R-squared" and "P-value".
+    """
+    results = linregress_from_sums(*(sums[column].values for column in SUM_COLUMNS), index=sums.index)
+    return pd.DataFrame({
+        "Region": results.index,
+        "Slope": results["slope"].values,
+        # The sums are relative to the origin year; the intercept is reported at Year=0.
+        "Intercept": (results["intercept"] - results["slope"] * origin).values,
+        "R-squared": results["r_squared"].values,
+        "P-value": results["pvalue"].values,
+    })
+
+
+class IncrementalUpdater:
+    """
+    Maintains the yearly region summaries and the regression statistics across source updates.
+
+    The merged per-country data of the previous update is kept in a snapshot store. A new
+    version is compared with it by (Entity, Year), and only the years with new, changed or
+    removed keys are aggregated again. The regression of every region is kept as sufficient
+    statistics (n, sum(x), sum(y), sum(x*y), sum(x^2) and sum(y^2)): the replaced yearly
+    rows are subtracted and the new ones added, without another pass over the history.
+
+    Parameters:
+        directory (str): Directory of the state (default: project/data/incremental).
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or DEFAULT_INCREMENTAL_DIRECTORY
+        self.store = SnapshotStore(self.directory)
+
+    def _state_path(self):
+        return os.path.join(self.directory, "state.json")
+
+    def load_state(self):
+        """
+        Returns the stored state (groups fingerprint, origin year and regression sums) or None.
+        """
+        try:
+            with open(self._state_path(), "r", encoding="utf-8") as handle:
+                state = json.load(handle)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if not self.store.exists("members", "summaries"):
+            return None
+        state["sums"] = pd.DataFrame(state["sums"], columns=SUM_COLUMNS, index=state["regions"])
+        return state
+
+    def _save(self, members, summaries, groups_key, origin, sums):
+        self.store.save("members", members, sort_by=KEY_COLUMNS)
+        self.store.save("summaries", summaries)
+        state = {
+            "groups": groups_key,
+            "origin": origin,
+            "regions": list(sums.index),
+            # repr() of floats round-trips exactly through JSON.
+            "sums": sums[SUM_COLUMNS].values.tolist(),
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump(state, handle, indent=2)
+        os.replace(tmp_path, self._state_path())
+
+    def update(self, combined_data, groups):
+        """
+        Brings the summaries and regression statistics up to date with new merged country data.
+
+        Parameters:
+            combined_data (DataFrame): The merged data of all member countries ("Entity",
+                                       "Year", "Temperature", "emissions_total").
+            groups (dict): The region groups (see region_groups.load_region_groups()).
+
+        Returns:
+            dict: The update with the keys
+                - "full": True if everything was rebuilt (no state, or other region groups).
+                - "changes": The added, changed and removed (Entity, Year) keys.
+                - "removed": The yearly summary rows that were replaced or dropped.
+                - "added": The yearly summary rows that were (re)computed.
+                - "summaries": All yearly summaries, ordered by group and year.
+                - "p_values": The regression results per region.
+        """
+        members = combined_data[KEY_COLUMNS + VALUE_COLUMNS].copy()
+        members["Entity"] = members["Entity"].astype(str)
+        members["Year"] = members["Year"].astype(np.int64)
+        labels = [group["label"] for group in groups.values()]
+        groups_key = fingerprint(groups)
+        state = self.load_state()
+
+        if state is None or state["groups"] != groups_key:
+            # Nothing to update from: aggregate the full history once.
+            summaries = aggregate_region_groups(members, groups)
+            origin = int(members["Year"].min()) if len(members) else 0
+            sums = regression_sums(summaries, origin).reindex(labels, fill_value=0.0)
+            self._save(members, summaries, groups_key, origin, sums)
+            return {
+                "full": True, "changes": changed_keys(members.iloc[:0], members),
+                "removed": summaries.iloc[:0], "added": summaries, "summaries": summaries,
+                "p_values": p_values_from_sums(sums[sums["n"] > 0], origin),
+            }
+
+        previous = self.store.load("members")
+        changes = changed_keys(previous, members)
+        years = changes["Year"].unique()
+
+        # Re-aggregate only the affected years (a year's aggregate depends on that year's rows only).
+        stored = self.store.load("summaries")
+        affected = stored["Year"].isin(years)
+        removed = stored[affected].reset_index(drop=True)
+        added = aggregate_region_groups(members[members["Year"].isin(years)], groups)
+
+        # Update the regression sums: subtract the replaced yearly rows, add the recomputed ones.
+        origin = state["origin"]
+        sums = state["sums"].reindex(labels, fill_value=0.0)
+        sums = sums.sub(regression_sums(removed, origin), fill_value=0.0) \
+                   .add(regression_sums(added, origin), fill_value=0.0).reindex(labels)
+
+        summaries = pd.concat([stored[~affected], added], ignore_index=True)
+        order = {label: position for position, label in enumerate(labels)}
+        summaries = summaries.sort_values(by=["Region", "Year"], key=lambda column: column.map(order)
+                                          if column.name == "Region" else column, kind="stable")
+        summaries = summaries.reset_index(drop=True)
+
+        self._save(members, summaries, groups_key, origin, sums)
+        return {
+            "full": False, "changes": changes, "removed": removed, "added": added, "summaries": summaries,
+            "p_values": p_values_from_sums(sums[sums["n"] > 0], origin),
+        }
+
+
+def write_outputs(save_directory, update, groups, comparison, output_format="csv", compression=None):
+    """
+    Writes the outputs of an update: "region_summaries", the files of the groups with an
+    "output" and "df_combined" (the compared groups), in the given format.
+
+    When the update only adds years after the stored ones, the new rows are appended to the
+    plain CSV files (so the files are ordered by update, then by group and year). Otherwise, or
+    for compressed and Parquet files, or if a file is missing or no longer matches the manifest,
+    the file is rewritten from the full summaries. Both are atomic (see output_writer.py) and
+    recorded with their new checksums in the manifest.
+
+    Parameters:
+        save_directory (str): Directory of the results.
+        update (dict): The result of IncrementalUpdater.update().
+        groups (dict): The region groups.
+        comparison (list): Keys of the compared groups.
+        output_format (str): "csv" or "parquet".
+        compression (str): None, "gzip" or "zstd".
+
+    Returns:
+        dict: Per dataset name, "appended", "rewritten" or "unchanged".
+    """
+    files = {"region_summaries": [group["label"] for group in groups.values()]}
+    for group in groups.values():
+        if "output" in group:
+            files[group["output"]] = [group["label"]]
+    files["df_combined"] = [groups[key]["label"] for key in comparison]
+
+    stored_years = update["summaries"]["Year"][~update["summaries"]["Year"].isin(update["added"]["Year"])]
+    append_only = (not update["full"] and update["removed"].empty
+                   and (stored_years.empty or update["added"]["Year"].min() > stored_years.max()))
+    plain_csv = output_format == "csv" and compression is None
+
+    results, datasets, appended = {}, {}, []
+    for name, labels in files.items():
+        exists = os.path.exists(os.path.join(save_directory, output_file(name, output_format, compression)))
+        added = pd.concat([select_region(update["added"], label) for label in labels], ignore_index=True)
+        if exists and (update["changes"].empty or (append_only and added.empty)):
+            results[name] = "unchanged"
+        elif append_only and plain_csv and appendable(save_directory, name):
+            appended.append(append_dataset(save_directory, name, added))
+            results[name] = "appended"
+        else:
+            datasets[name] = pd.concat([select_region(update["summaries"], label) for label in labels],
+                                       ignore_index=True)
+            results[name] = "rewritten"
+
+    if appended:
+        update_manifest(save_directory, appended)
+    write_artifacts(save_directory, datasets, output_format, compression)
+    return results
@@ -0,0 +1,277 @@
+import functools
+import re
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.acero as acero
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+
+from region_groups import aggregate_region_groups, member_countries
+from schemas import ARROW_TYPES, SCHEMAS, read_header, resolve_columns
+
+# Key columns of a temperature row (the entity and the month); duplicate rows share them.
+TEMPERATURE_KEYS = ["Entity", "Code", "Year"]
+
+
+def _arrow_types(path, name):
+    """
+    Checks the header of a source against its schema and returns the declared Arrow types of
+    its columns (categories are scanned as plain strings, which the plans filter and join on).
+    """
+    columns, _ = resolve_columns(SCHEMAS[name], read_header(path), name)
+    return {column: pa.string() if dtype == "category" else ARROW_TYPES[dtype] for column, dtype in columns.items()}
+
+
+def _to_frame(table):
+    # Years are stored as int16 like in the eager chain (see compact_temperature_dtypes()).
+    frame = table.to_pandas()
+    frame["Year"] = frame["Year"].astype("int16")
+    return frame
+
+
+def _year_columns(columns, year_range=None):
+    """
+    Returns the columns of the wide temperature layout whose names are years (within year_range).
+    """
+    selected = []
+    for column in columns:
+        if re.fullmatch(r"\d+", column):
+            year = int(column)
+            if year_range is None or ((year_range[0] is None or year >= year_range[0])
+                                      and (year_range[1] is None or year <= year_range[1])):
+                selected.append(column)
+    return selected
+
+
+class LazyTransformChain:
+    """
+    Lazy, multi-threaded execution of the transform chain
+    clean_dataset() -> transform_temperature_data() -> groupby -> filter_data() -> merge_datasets() -> groupby
+    as pyarrow Acero query plans over the CSV sources.
+
+    Nothing is read until a plan is executed. The region (and optional year) filters are pushed
+    down into the CSV scans, so only the rows of the requested countries are parsed into memory;
+    only the needed columns are projected; and the per-entity yearly means are computed directly
+    from the wide layout by one aggregate, without materializing the melted dataset. The whole
+    chain (scans, aggregate, join and the final reduction) is one Acero declaration executed
+    once on Arrow's thread pool.
+
+    The results equal the eager pandas chain: duplicates are dropped over complete rows, and
+    missing temperatures are imputed with the column means of the whole de-duplicated source
+    (computed once by a separate plan, since they cannot be pushed below the region filter).
+
+    Parameters:
+        temperature_path (str): Path of the wide temperature CSV file.
+        emissions_path (str): Path of the emissions CSV file.
+    """
+
+    def __init__(self, temperature_path, emissions_path):
+        # The scans use the declared types of the schemas (see schemas.SCHEMAS), never inferred
+        # ones; only the declared columns are read.
+        temperature_types = _arrow_types(temperature_path, "temperature")
+        self.temperature_columns = list(temperature_types)
+        self.year_columns = _year_columns(self.temperature_columns)
+        self.numeric_columns = ["Year"] + self.year_columns
+        self.temperature = ds.dataset(temperature_path, format=ds.CsvFileFormat(
+            convert_options=pacsv.ConvertOptions(column_types=temperature_types, strings_can_be_null=True)))
+
+        emissions_types = _arrow_types(emissions_path, "emissions")
+        self.emissions = ds.dataset(emissions_path, format=ds.CsvFileFormat(
+            convert_options=pacsv.ConvertOptions(column_types=emissions_types, strings_can_be_null=True)))
+        self._means = None
+
+    def _scan(self, dataset, columns, predicate=None):
+        """
+        A scan node reading only the given columns and only the batches' rows matching the predicate.
+        """
+        options = acero.ScanNodeOptions(dataset, columns=columns, filter=predicate)
+        scan = acero.Declaration("scan", options)
+        nodes = [scan]
+        if predicate is not None:
+            nodes.append(acero.Declaration("filter", acero.FilterNodeOptions(predicate)))
+        nodes.append(acero.Declaration("project", acero.ProjectNodeOptions(
+            [pc.field(column) for column in columns], columns)))
+        return acero.Declaration.from_sequence(nodes)
+
+    def _distinct(self, columns):
+        # A group-by over all columns without aggregates keeps every distinct row once.
+        return acero.Declaration("aggregate", acero.AggregateNodeOptions([], keys=columns))
+
+    def _distinct_means(self):
+        """
+        The column means over the distinct rows, de-duplicating over all columns (the fallback
+        of fill_values()).
+        """
+        columns = self.temperature_columns
+        return acero.Declaration.from_sequence([
+            self._scan(self.temperature, columns),
+            self._distinct(columns),
+            acero.Declaration("aggregate", acero.AggregateNodeOptions(
+                [(column, "mean", None, column) for column in self.numeric_columns])),
+        ]).to_table(use_threads=True)
+
+    def fill_values(self):
+        """
+        Returns the column means of the whole de-duplicated temperature source, used to impute
+        missing values like clean_dataset() (computed once).
+
+        Duplicate rows share their keys (entity, code and month), so the rows are grouped by the
+        keys only instead of by all columns: a group whose rows agree in every column counts
+        once, with its value. Only if a group holds rows that differ (which pandas keeps apart)
+        are the means computed over a full de-duplication.
+        """
+        if self._means is None:
+            years = self.year_columns
+            distinct = pc.CountOptions(mode="all")
+            conflicts = [pc.field(f"{column}_distinct") > 1 for column in years]
+            plan = acero.Declaration.from_sequence([
+                self._scan(self.temperature, self.temperature_columns),
+                acero.Declaration("aggregate", acero.AggregateNodeOptions(
+                    [(column, "hash_mean", None, column) for column in years]
+                    + [(column, "hash_count_distinct", distinct, f"{column}_distinct") for column in years],
+                    keys=TEMPERATURE_KEYS)),
+                acero.Declaration("project", acero.ProjectNodeOptions(
+                    [pc.field(column) for column in self.numeric_columns]
+                    + [functools.reduce(lambda a, b: a | b, conflicts) if conflicts else pc.scalar(False)],
+                    self.numeric_columns + ["conflict"])),
+                acero.Declaration("aggregate", acero.AggregateNodeOptions(
+                    [(column, "mean", None, column) for column in self.numeric_columns]
+                    + [("conflict", "any", None, "conflict")])),
+            ])
+            means = plan.to_table(use_threads=True)
+            if means["conflict"][0].as_py():
+                means = self._distinct_means()
+            self._means = {column: means[column][0].as_py() for column in self.numeric_columns}
+        return self._means
+
+    def yearly_temperature_plan(self, countries, year_range=None):
+        """
+        The plan of the yearly mean temperature per country (one column per year, wide).
+        """
+        columns = self.temperature_columns
+        years = _year_columns(columns, year_range)
+        means = self.fill_values()
+        predicate = pc.field("Entity").isin(list(countries))
+
+        # Missing values are filled with the source means (all-missing columns stay missing).
+        filled = [
+            pc.coalesce(pc.field(column), pa.scalar(means[column], pa.float64()))
+            if means[column] is not None else pc.field(column)
+            for column in years
+        ]
+        return acero.Declaration.from_sequence([
+            self._scan(self.temperature, columns, predicate),
+            self._distinct(columns),
+            acero.Declaration("project", acero.ProjectNodeOptions([pc.field("Entity")] + filled, ["Entity"] + years)),
+            acero.Declaration("aggregate", acero.AggregateNodeOptions(
+                [(column, "hash_mean", None, column) for column in years], keys=["Entity"])),
+        ])
+
+    def emissions_plan(self, countries, year_range=None):
+        """
+        The plan of the emissions of the given countries (only "Entity", "Code", "Year", "emissions_total").
+        """
+        predicate = pc.field("Entity").isin(list(countries))
+        if year_range is not None:
+            if year_range[0] is not None:
+                predicate = predicate & (pc.field("Year") >= year_range[0])
+            if year_range[1] is not None:
+                predicate = predicate & (pc.field("Year") <= year_range[1])
+        return self._scan(self.emissions, ["Entity", "Code", "Year", "emissions_total"], predicate)
+
+    def combined_plan(self, countries, year_range=None):
+        """
+        The plan of the merged temperature and emissions of the given countries (like
+        filter_data() followed by merge_datasets()).
+
+        The wide yearly means are joined to the emissions rows by entity, and every row then
+        picks the mean of its year, so the melted temperatures are never built; rows of years
+        without a temperature column are dropped, like by the inner join on ("Entity", "Year").
+        """
+        years = _year_columns(self.temperature_columns, year_range)
+        if not years:
+            # Without temperature years nothing joins; keep the plan's shape with an empty result.
+            years_filter = pc.scalar(False)
+            temperature = pc.scalar(None).cast(pa.float64())
+        else:
+            years_filter = pc.field("Year").isin([int(year) for year in years])
+            temperature = pc.case_when(
+                pc.make_struct(*[pc.field("Year") == int(year) for year in years],
+                               field_names=[f"is_{year}" for year in years]),
+                *[pc.field(year) for year in years])
+        return acero.Declaration.from_sequence([
+            acero.Declaration("hashjoin", acero.HashJoinNodeOptions(
+                "inner", left_keys=["Entity"], right_keys=["Entity"],
+                left_output=["Entity"] + years, right_output=["Code", "Year", "emissions_total"],
+                output_suffix_for_right="_emissions",
+            ), inputs=[self.yearly_temperature_plan(countries, year_range), self.emissions_plan(countries, year_range)]),
+            acero.Declaration("filter", acero.FilterNodeOptions(years_filter)),
+            acero.Declaration("project", acero.ProjectNodeOptions(
+                [pc.field("Entity"), pc.field("Year"), temperature, pc.field("Code"), pc.field("emissions_total")],
+                ["Entity", "Year", "Temperature", "Code", "emissions_total"])),
+        ])
+
+    def combined(self, countries, year_range=None):
+        """
+        Returns the merged temperature and emissions per country and year, sorted by entity and year.
+        """
+        plan = acero.Declaration.from_sequence([
+            self.combined_plan(countries, year_range),
+            acero.Declaration("order_by", acero.OrderByNodeOptions([("Entity", "ascending"), ("Year", "ascending")])),
+        ])
+        return _to_frame(plan.to_table(use_threads=True))
+
+    def region_summary(self, countries, label, year_range=None):
+        """
+        Returns the yearly mean temperature and total emissions of a region, like
+        summarize_region() applied to the eager chain.
+
+        Parameters:
+            countries (list): The countries of the region.
+            label (str): The label stored in the "Region" column.
+            year_range (tuple): Optional (first year, last year), pushed down into both scans.
+
+        Returns:
+            DataFrame: The columns "Year", "Temperature", "emissions_total" and "Region".
+        """
+        plan = acero.Declaration.from_sequence([
+            self.combined_plan(countries, year_range),
+            acero.Declaration("aggregate", acero.AggregateNodeOptions([
+                ("Temperature", "hash_mean", None, "Temperature"),
+                # Like pandas, the sum of only missing values is 0.
+                ("emissions_total", "hash_sum", pc.ScalarAggregateOptions(min_count=0), "emissions_total"),
+            ], keys=["Year"])),
+            acero.Declaration("order_by", acero.OrderByNodeOptions([("Year", "ascending")])),
+        ])
+        summary = _to_frame(plan.to_table(use_threads=True))
+        summary = summary[["Year", "Temperature", "emissions_total"]]
+        summary["Region"] = label
+        return summary
+
+
+def lazy_region_frames(source_files, groups, comparison):
+    """
+    Runs the lazy chain for the region groups of the pipeline (the lazy counterpart of the
+    yearly temperature, index, combine and region aggregation stages).
+
+    One plan merges the data of all member countries; the groups are then aggregated in the
+    single grouped reduction of region_groups.aggregate_region_groups().
+
+    Parameters:
+        source_files (dict): The local "temperature" and "emissions" files, each with its "path"
+                             (see pipeline.fetch_source_files()).
+        groups (dict): The region groups (see region_groups.load_region_groups()).
+        comparison (list): Keys of the compared groups, whose per-country data is returned too.
+
+    Returns:
+        tuple: The yearly summaries of all groups, followed by the merged per-country data of
+               every compared group.
+    """
+    chain = LazyTransformChain(source_files["temperature"]["path"], source_files["emissions"]["path"])
+    combined = chain.combined(member_countries(groups))
+    summaries = aggregate_region_groups(combined, groups)
+    compared = tuple(combined[combined["Entity"].isin(groups[key]["countries"])].reset_index(drop=True)
+                     for key in comparison)
+    return (summaries,) + compared
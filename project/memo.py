@@ -0,0 +1,299 @@
+import contextlib
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Default location of the memo cache and its size budget.
+DEFAULT_MEMO_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "memo")
+DEFAULT_MEMO_MAX_BYTES = 256 * 1024 * 1024
+
+# The process-wide memo cache (see default_cache()).
+_DEFAULT_CACHE = None
+
+
+def fingerprint(*values, columns=None):
+    """
+    Computes a content fingerprint of values.
+
+    DataFrames and Series are hashed with pandas' vectorized row hashing (restricted to the given
+    columns, together with the column names and dtypes), arrays through their raw bytes, and any
+    other value through its pickled representation.
+
+    Parameters:
+        values: The values to fingerprint.
+        columns (list): Only hash these columns of DataFrames (default: all columns).
+
+    Returns:
+        str: The hex SHA-256 fingerprint.
+    """
+    digest = hashlib.sha256()
+    for value in values:
+        if isinstance(value, pd.DataFrame):
+            if columns is not None:
+                value = value[[column for column in columns if column in value.columns]]
+            digest.update(repr([(str(name), str(dtype)) for name, dtype in value.dtypes.items()]).encode("utf-8"))
+            digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+        elif isinstance(value, pd.Series):
+            digest.update(f"{value.name}:{value.dtype}".encode("utf-8"))
+            digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+        elif isinstance(value, np.ndarray):
+            digest.update(f"{value.dtype}:{value.shape}".encode("utf-8"))
+            digest.update(np.ascontiguousarray(value).tobytes())
+        else:
+            digest.update(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    return digest.hexdigest()
+
+
+class MemoCache:
+    """
+    On-disk cache of function results and rendered files, keyed by input fingerprints.
+
+    Results are pickled to "<key>.pkl" and files are copied to "<key>.<extension>". Every hit
+    touches the entry, so eviction drops the least recently used entries once the cache grows
+    beyond max_bytes. Hits and misses are counted per cache instance.
+
+    Parameters:
+        directory (str): Directory of the cache (default: project/.cache/memo, overridable via
+                         the PIPELINE_MEMO_DIR environment variable).
+        max_bytes (int): Maximum total size of the cached entries.
+        enabled (bool): Disable to always recompute (default: unless PIPELINE_MEMO=0).
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MEMO_MAX_BYTES, enabled=None):
+        self.directory = directory or os.environ.get("PIPELINE_MEMO_DIR", DEFAULT_MEMO_DIRECTORY)
+        self.max_bytes = max_bytes
+        self.enabled = os.environ.get("PIPELINE_MEMO", "1") != "0" if enabled is None else enabled
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _count(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def _write_atomic(self, path, write):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                write(handle)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def get(self, key):
+        """
+        Returns (True, result) for a cached result or (False, None) on a miss.
+        """
+        path = os.path.join(self.directory, f"{key}.pkl")
+        if self.enabled:
+            try:
+                with open(path, "rb") as handle:
+                    result = pickle.load(handle)
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                pass
+            else:
+                self._touch(path)
+                self._count(True)
+                return True, result
+        self._count(False)
+        return False, None
+
+    def put(self, key, result):
+        """
+        Stores a result.
+        """
+        if self.enabled:
+            self._write_atomic(os.path.join(self.directory, f"{key}.pkl"),
+                               lambda handle: pickle.dump(result, handle, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def restore_file(self, key, path):
+        """
+        Copies a cached file to path.
+
+        Returns:
+            bool: True on a hit, False if the file has to be produced.
+        """
+        cached = os.path.join(self.directory, key + os.path.splitext(path)[1])
+        if self.enabled and os.path.exists(cached):
+            # Copied next to the target and renamed, so path is never left half-written.
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                shutil.copyfile(cached, tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            self._touch(cached)
+            self._count(True)
+            return True
+        self._count(False)
+        return False
+
+    def store_file(self, key, path):
+        """
+        Stores a copy of a produced file.
+        """
+        if self.enabled:
+            cached = os.path.join(self.directory, key + os.path.splitext(path)[1])
+            with open(path, "rb") as source:
+                self._write_atomic(cached, lambda handle: shutil.copyfileobj(source, handle))
+
+    def entries(self):
+        """
+        Returns (path, size, last use) of every cached entry, least recently used first.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self):
+        """
+        Drops the least recently used entries until the cache fits into max_bytes.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """
+        Removes every cached entry.
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def stats(self):
+        """
+        Returns the hit/miss counters and the size of the cache.
+        """
+        entries = self.entries()
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else None,
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+            }
+
+
+def default_cache():
+    """
+    Returns the process-wide memo cache (created on first use).
+    """
+    global _DEFAULT_CACHE
+    if _DEFAULT_CACHE is None:
+        _DEFAULT_CACHE = MemoCache()
+    return _DEFAULT_CACHE
+
+
+def set_default_cache(cache):
+    """
+    Replaces the process-wide memo cache (None: create a new one on next use).
+
+    Returns:
+        MemoCache: The previous process-wide cache.
+    """
+    global _DEFAULT_CACHE
+    previous, _DEFAULT_CACHE = _DEFAULT_CACHE, cache
+    return previous
+
+
+@contextlib.contextmanager
+def disabled():
+    """
+    Runs the block with a disabled process-wide memo cache: memoized functions are computed on
+    every call and nothing is read from or written to the cache directory.
+    """
+    previous = set_default_cache(MemoCache(enabled=False))
+    try:
+        yield
+    finally:
+        set_default_cache(previous)
+
+
+def source_code(*objects):
+    """
+    Returns the source code of functions or modules (their repr if it is not available).
+    """
+    sources = []
+    for obj in objects:
+        try:
+            sources.append(inspect.getsource(obj))
+        except (OSError, TypeError):
+            sources.append(repr(obj))
+    return "\n".join(sources)
+
+
+def memoized(columns=None, cache=None, uses=()):
+    """
+    Decorator that caches a function's results on disk, keyed by the source code of the
+    function and the functions it uses, and the fingerprints of its arguments.
+
+    Parameters:
+        columns (dict): Per argument name, the DataFrame columns that determine the result
+                        (other columns are not hashed).
+        cache (MemoCache): The cache to use (default: default_cache()).
+        uses (list): Further functions or modules whose source code is part of the key (like
+                     stages.Stage), so a change in a callee invalidates the cached results.
+    """
+    columns = columns or {}
+
+    def decorator(func):
+        signature = inspect.signature(func)
+        code = source_code(func, *uses)
+        # Identify the function by its file rather than __module__, which is "__main__" when
+        # the module runs as a script.
+        module = os.path.splitext(os.path.basename(inspect.getsourcefile(func)))[0]
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            memo = cache or default_cache()
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = fingerprint(module, func.__qualname__, code, *[
+                fingerprint(value, columns=columns.get(name)) for name, value in bound.arguments.items()
+            ])
+            hit, result = memo.get(key)
+            if not hit:
+                result = func(*args, **kwargs)
+                memo.put(key, result)
+            return result
+        return wrapper
+    return decorator
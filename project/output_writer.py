@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# File name of the manifest in the output directory.
+MANIFEST_NAME = "manifest.json"
+
+# Output formats and the compressions they support (None writes uncompressed CSV / snappy Parquet).
+FORMATS = {"csv": [None, "gzip", "zstd"], "parquet": [None, "gzip", "zstd"]}
+
+# File suffix of every (format, compression).
+SUFFIXES = {("csv", None): ".csv", ("csv", "gzip"): ".csv.gz", ("csv", "zstd"): ".csv.zst"}
+
+# Serializes the updates of the manifest of a directory within this process.
+_MANIFEST_LOCK = threading.Lock()
+
+
+def output_file(name, output_format="csv", compression=None):
+    """
+    Returns the file name of a dataset in the given format, e.g. "df_combined.csv.gz".
+    """
+    if output_format not in FORMATS or compression not in FORMATS[output_format]:
+        raise ValueError(f"Unsupported output '{output_format}' with compression '{compression}'.")
+    return name + SUFFIXES.get((output_format, compression), ".parquet")
+
+
+def file_checksum(path):
+    """
+    Returns the SHA-256 of a file (read in blocks).
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def atomic_write(path, write):
+    """
+    Writes a file through write(handle) into a temporary file next to it, which replaces path
+    only once it is complete: readers see the old file or the new one, never a partial one.
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            write(handle)
+        # Reopened for the fsync, since compressed streams close the handle they wrap.
+        with open(tmp_path, "rb+") as handle:
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_frame(handle, frame, output_format, compression):
+    """
+    Writes a DataFrame to an open binary file in the given format.
+    """
+    if output_format == "parquet":
+        pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), handle, compression=compression or "snappy")
+    elif compression is None:
+        frame.to_csv(handle, index=False)
+    else:
+        with pa.CompressedOutputStream(handle, compression) as stream:
+            frame.to_csv(stream, index=False)
+
+
+def write_dataset(directory, name, frame, output_format="csv", compression=None):
+    """
+    Writes one dataset atomically and describes the written file.
+
+    Returns:
+        dict: The manifest record: "name", "file", "format", "compression", "rows", "columns",
+              "bytes", "sha256" and "seconds" (the write time).
+    """
+    file_name = output_file(name, output_format, compression)
+    path = os.path.join(directory, file_name)
+    start = time.perf_counter()
+    atomic_write(path, lambda handle: _write_frame(handle, frame, output_format, compression))
+    return {
+        "name": name,
+        "file": file_name,
+        "format": output_format,
+        "compression": compression,
+        "rows": len(frame),
+        "columns": len(frame.columns),
+        "bytes": os.path.getsize(path),
+        "sha256": file_checksum(path),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def appendable(directory, name):
+    """
+    Returns True if rows can be appended to the plain CSV file of a dataset: the file is recorded
+    in the manifest with its row count and still matches its checksum.
+    """
+    file_name = output_file(name)
+    path = os.path.join(directory, file_name)
+    record = load_manifest(directory)["artifacts"].get(file_name)
+    return (record is not None and record.get("rows") is not None and os.path.exists(path)
+            and file_checksum(path) == record["sha256"])
+
+
+def append_dataset(directory, name, frame):
+    """
+    Appends rows to the plain CSV file of a dataset atomically: the existing bytes are copied
+    into a temporary file next to it, only the new rows are serialized after them, and the copy
+    replaces the file. Check appendable() first.
+
+    Returns:
+        dict: The manifest record of the file (see write_dataset()), counting all its rows.
+    """
+    file_name = output_file(name)
+    path = os.path.join(directory, file_name)
+    previous = load_manifest(directory)["artifacts"][file_name]
+    start = time.perf_counter()
+
+    def write(handle):
+        with open(path, "rb") as source:
+            shutil.copyfileobj(source, handle)
+        frame.to_csv(handle, header=False, index=False)
+
+    atomic_write(path, write)
+    return {
+        "name": name,
+        "file": file_name,
+        "format": "csv",
+        "compression": None,
+        "rows": previous["rows"] + len(frame),
+        "columns": len(frame.columns),
+        "bytes": os.path.getsize(path),
+        "sha256": file_checksum(path),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def describe_file(path, seconds=None):
+    """
+    Describes a file written elsewhere (e.g., a rendered figure) for the manifest.
+    """
+    file_name = os.path.basename(path)
+    return {
+        "name": file_name.split(".")[0],
+        "file": file_name,
+        "format": file_name.rsplit(".", 1)[-1],
+        "compression": None,
+        "rows": None,
+        "columns": None,
+        "bytes": os.path.getsize(path),
+        "sha256": file_checksum(path),
+        "seconds": seconds,
+    }
+
+
+def load_manifest(directory):
+    """
+    Returns the manifest of an output directory (an empty one if there is none yet).
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), "r", encoding="utf-8") as handle:
+            return json.load(handle)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"updated_at": None, "artifacts": {}}
+
+
+def update_manifest(directory, records):
+    """
+    Adds the records of freshly written files to the manifest (replacing the records of the same
+    files), marking every record as "changed" if its checksum differs from the previous one.
+
+    Returns:
+        dict: The new manifest.
+    """
+    with _MANIFEST_LOCK:
+        manifest = load_manifest(directory)
+        for record in records:
+            previous = manifest["artifacts"].get(record["file"])
+            record["changed"] = previous is None or previous["sha256"] != record["sha256"]
+            manifest["artifacts"][record["file"]] = record
+        manifest["updated_at"] = datetime.now(timezone.utc).isoformat()
+        content = json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8")
+        atomic_write(os.path.join(directory, MANIFEST_NAME), lambda handle: handle.write(content))
+    return manifest
+
+
+def verify_manifest(directory):
+    """
+    Checks the files of an output directory against its manifest.
+
+    Returns:
+        list: One message per missing file or checksum mismatch (empty if all files match).
+    """
+    problems = []
+    for file_name, record in sorted(load_manifest(directory)["artifacts"].items()):
+        path = os.path.join(directory, file_name)
+        if not os.path.exists(path):
+            problems.append(f"'{file_name}' is missing.")
+        elif file_checksum(path) != record["sha256"]:
+            problems.append(f"'{file_name}' does not match its checksum.")
+    return problems
+
+
+def write_artifacts(directory, datasets, output_format="csv", compression=None, files=None, workers=None):
+    """
+    Writes datasets concurrently from a thread pool, each atomically (temporary file and
+    rename), and records them with the given files in the manifest of the directory.
+
+    The manifest is updated only after every file is in place, so it never lists a file of an
+    unfinished write; consumers can compare the checksums to skip unchanged artifacts.
+
+    Parameters:
+        directory (str): The output directory.
+        datasets (dict): The DataFrames to write, keyed by name.
+        output_format (str): "csv" or "parquet".
+        compression (str): None, "gzip" or "zstd".
+        files (dict): Files written elsewhere to record as well, with their write time in seconds
+                      (or None), keyed by path.
+        workers (int): Number of writer threads (default: one per artifact, at most 8).
+
+    Returns:
+        list: The manifest records of the written datasets and files, in the given order.
+    """
+    files = files or {}
+    jobs = [(write_dataset, (directory, name, frame, output_format, compression)) for name, frame in datasets.items()]
+    jobs += [(describe_file, (path, seconds)) for path, seconds in files.items()]
+    if not jobs:
+        return []
+    if workers is None:
+        workers = min(len(jobs), 8)
+
+    start = time.perf_counter()
+    if workers <= 1:
+        records = [func(*args) for func, args in jobs]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            records = [future.result() for future in [executor.submit(func, *args) for func, args in jobs]]
+    update_manifest(directory, records)
+
+    changed = sum(record["changed"] for record in records)
+    print(f"Wrote {len(datasets)} dataset(s) and recorded {len(files)} file(s) in {time.perf_counter() - start:.2f}s "
+          f"({changed} changed, manifest: '{os.path.join(directory, MANIFEST_NAME)}').")
+    return records
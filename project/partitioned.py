@@ -0,0 +1,295 @@
+import math
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from fanout import fan_out
+from region_groups import member_countries, membership_table
+from schemas import SCHEMAS, read_csv_chunks, read_header, resolve_columns
+from streaming import RunningDeduplicator, RunningMeans
+
+# Default memory budget of a partitioned run in bytes (shared by all workers).
+DEFAULT_MEMORY_BUDGET = 1024 * 1024 * 1024
+
+# Estimated bytes in memory per long (monthly) row while a partition is merged and reduced:
+# the temperature row, its share of the emissions and the merged row with the group membership.
+ROW_BYTES = 256
+
+# Column types of the partition files (the same in every file, so a partition reads as one table).
+TEMPERATURE_SCHEMA = pa.schema([("Entity", pa.string()), ("Code", pa.string()), ("Month", pa.int8()),
+                                ("Year", pa.int16()), ("Temperature", pa.float64())])
+EMISSIONS_SCHEMA = pa.schema([("Entity", pa.string()), ("Year", pa.int16()), ("emissions_total", pa.float64())])
+
+
+def plan_partitions(rows, memory_budget=DEFAULT_MEMORY_BUDGET, workers=1):
+    """
+    Returns the number of partitions that keeps every worker within its share of the memory
+    budget (each worker holds one partition at a time), and at least one partition per worker.
+
+    Parameters:
+        rows (int): Estimated number of long (monthly) temperature rows.
+        memory_budget (int): Memory budget of the run in bytes.
+        workers (int): Number of partitions processed at the same time.
+    """
+    per_worker = memory_budget / max(workers, 1)
+    return max(workers, 1, math.ceil(rows * ROW_BYTES / per_worker))
+
+
+def partition_ids(data, by, partitions, ranges=None):
+    """
+    Assigns the rows of a chunk to partitions.
+
+    Parameters:
+        data (DataFrame): Rows with the columns "Entity" and "Year".
+        by (str): "entity" (a stable hash of the entity, so all years of an entity share a
+                  partition) or "year" (contiguous year ranges).
+        partitions (int): Number of partitions.
+        ranges (tuple): The first year and the last year of every range (by="year", see year_ranges()).
+
+    Returns:
+        ndarray: The partition of every row (-1 for years outside all ranges).
+    """
+    if by == "entity":
+        hashes = pd.util.hash_array(data["Entity"].astype(str).to_numpy(dtype=object))
+        return (hashes % np.uint64(partitions)).astype(np.int64)
+    first, bounds = ranges
+    years = data["Year"].to_numpy()
+    ids = np.searchsorted(bounds, years, side="left")
+    ids[(ids >= len(bounds)) | (years < first)] = -1
+    return ids
+
+
+def year_ranges(years, partitions):
+    """
+    Splits the sorted years into at most partitions contiguous ranges of similar size.
+
+    Returns:
+        tuple: (first year, the last year of every range).
+    """
+    years = np.sort(years)
+    return years[0], np.array([chunk[-1] for chunk in np.array_split(years, partitions) if len(chunk)])
+
+
+def _write_pieces(data, ids, directory, name, chunk, schema):
+    """
+    Writes the rows of every partition of a chunk as one Parquet file of that partition.
+    """
+    for partition in np.unique(ids[ids >= 0]):
+        rows = data[ids == partition]
+        path = os.path.join(directory, f"part-{partition:05d}", name)
+        os.makedirs(path, exist_ok=True)
+        table = pa.Table.from_pandas(rows, schema=schema, preserve_index=False)
+        pq.write_table(table, os.path.join(path, f"chunk-{chunk:05d}.parquet"))
+
+
+def melt_temperature_chunk(chunk, year_columns):
+    """
+    Turns a chunk of the wide temperature data into long rows ("Entity", "Code", "Month",
+    "Year", "Temperature"), like transform_temperature_data() without the cleaning.
+    """
+    count = len(chunk)
+    values = chunk[year_columns].to_numpy(dtype=np.float64)
+    return pd.DataFrame({
+        "Entity": np.tile(chunk["Entity"].astype(str).to_numpy(dtype=object), len(year_columns)),
+        # "Code" is optional in the schema.
+        "Code": np.tile(chunk["Code"].to_numpy(dtype=object) if "Code" in chunk else np.full(count, None, dtype=object),
+                        len(year_columns)),
+        "Month": np.tile(chunk["Year"].to_numpy(), len(year_columns)),
+        "Year": np.repeat([int(column) for column in year_columns], count),
+        "Temperature": values.T.ravel(),
+    })
+
+
+def partition_sources(temperature_path, emissions_path, directory, partitions, by="entity", clean=True,
+                      chunk_rows=None, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """
+    Splits the temperature data (melted to monthly rows) and the emissions data into partitions
+    of Parquet files on disk, reading both CSV files in chunks that fit the memory budget.
+
+    Both files are read with the dtypes of their schemas (see schemas.read_csv_chunks()), so a renamed,
+    dropped or mistyped column fails before anything is written. Duplicate temperature rows
+    are dropped across chunks and the means used to fill missing
+    temperatures are accumulated while reading (like clean_dataset() over the whole source);
+    the missing values are filled when a partition is processed.
+
+    Parameters:
+        temperature_path (str): Path of the wide temperature CSV file.
+        emissions_path (str): Path of the emissions CSV file.
+        directory (str): Directory for the partitions ("part-<n>/temperature" and "part-<n>/emissions").
+        partitions (int): Number of partitions.
+        by (str): "entity" (hash of the entity) or "year" (year ranges of the temperature data).
+        clean (bool): De-duplicate the temperature rows and fill missing values like clean_dataset().
+        chunk_rows (int): Number of CSV rows per chunk (default: derived from the memory budget).
+        memory_budget (int): Memory budget in bytes (bounds the chunks when chunk_rows is None).
+
+    Returns:
+        dict: The "directory", the number of "partitions", "by", the "means" used to fill missing
+              temperatures (per year) and the number of long "temperature_rows" and "emissions_rows".
+
+    Raises:
+        SchemaError: If a source does not match its schema.
+    """
+    if by not in ("entity", "year"):
+        raise ValueError(f"Unknown partitioning '{by}' (expected 'entity' or 'year').")
+    header, _ = resolve_columns(SCHEMAS["temperature"], read_header(temperature_path), "temperature")
+    year_columns = [column for column in header if column not in SCHEMAS["temperature"]["columns"]]
+    ranges = year_ranges(np.array([int(column) for column in year_columns]), partitions) if by == "year" else None
+    if chunk_rows is None:
+        # A melted chunk takes at most a quarter of the budget.
+        chunk_rows = max(1, int(memory_budget / 4 / (ROW_BYTES * max(len(year_columns), 1))))
+    # Check both headers before the first partition file is written.
+    _, temperature_chunks = read_csv_chunks(temperature_path, SCHEMAS["temperature"], "temperature", chunk_rows)
+    # The emissions rows are narrow, so their chunks hold as many long rows as a temperature chunk.
+    _, emissions_chunks = read_csv_chunks(emissions_path, SCHEMAS["emissions"], "emissions",
+                                          chunk_rows * max(len(year_columns), 1),
+                                          columns=["Entity", "Year", "emissions_total"])
+
+    deduplicator = RunningDeduplicator()
+    means = RunningMeans()
+    temperature_rows = 0
+    for position, chunk in enumerate(temperature_chunks):
+        if clean:
+            chunk = deduplicator.filter(chunk)
+            means.update(chunk)
+        long = melt_temperature_chunk(chunk, year_columns)
+        temperature_rows += len(long)
+        _write_pieces(long, partition_ids(long, by, partitions, ranges), directory, "temperature", position,
+                      TEMPERATURE_SCHEMA)
+
+    emissions_rows = 0
+    for position, chunk in enumerate(emissions_chunks):
+        emissions_rows += len(chunk)
+        _write_pieces(chunk, partition_ids(chunk, by, partitions, ranges), directory, "emissions", position,
+                      EMISSIONS_SCHEMA)
+
+    year_means = {int(column): value for column, value in means.means().items() if column in year_columns}
+    return {"directory": directory, "partitions": partitions, "by": by, "means": year_means,
+            "temperature_rows": temperature_rows, "emissions_rows": emissions_rows}
+
+
+def read_partition(directory, partition, name, schema):
+    """
+    Reads the files of one dataset of a partition as one DataFrame (empty if it has none).
+    """
+    path = os.path.join(directory, f"part-{partition:05d}", name)
+    if not os.path.isdir(path):
+        return schema.empty_table().to_pandas()
+    return pq.read_table(path, schema=schema).to_pandas()
+
+
+def _process_partition(frames, task):
+    """
+    Filters, merges and reduces one partition to partial aggregates (a fan-out task, see fanout.py).
+
+    Returns:
+        dict: The "partial" sums and counts per (group, year, month), the number of merged
+              "rows" and the "bytes" of the partition's frames in memory.
+    """
+    from pipeline import filter_data, merge_datasets
+
+    temperature = read_partition(task["directory"], task["partition"], "temperature", TEMPERATURE_SCHEMA)
+    emissions = read_partition(task["directory"], task["partition"], "emissions", EMISSIONS_SCHEMA)
+    if task["means"]:
+        # Fill missing temperatures with the mean of their year over the whole source.
+        missing = temperature["Temperature"].isnull()
+        temperature.loc[missing, "Temperature"] = temperature.loc[missing, "Year"].map(task["means"])
+    size = sum(int(frame.memory_usage(deep=True).sum()) for frame in (temperature, emissions))
+
+    temperature, emissions = filter_data(temperature, emissions, task["regions"])
+    merged = merge_datasets(temperature, emissions)
+    expanded = merged.merge(task["membership"], on="Entity", how="inner")
+    partial = expanded.groupby(["Group", "Year", "Month"]).agg(
+        temperature_sum=("Temperature", "sum"),
+        temperature_count=("Temperature", "count"),
+        emissions_total=("emissions_total", "sum"),
+    ).reset_index()
+    size += sum(int(frame.memory_usage(deep=True).sum()) for frame in (merged, expanded))
+    return {"partial": partial, "rows": len(merged), "bytes": size}
+
+
+def merge_partials(partials, groups):
+    """
+    Combines the partial aggregates of all partitions into the monthly summaries of the groups.
+
+    Returns:
+        DataFrame: The columns "Year", "Month", "Temperature" (mean over the group's countries),
+                   "emissions_total" (sum over the group's countries) and "Region", ordered by
+                   the group order of the definitions, year and month.
+    """
+    totals = pd.concat(partials, ignore_index=True).groupby(["Group", "Year", "Month"]).sum().reset_index()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        temperature = totals["temperature_sum"] / totals["temperature_count"].where(totals["temperature_count"] > 0)
+    labels = [group["label"] for group in groups.values()]
+    return pd.DataFrame({
+        "Year": totals["Year"].astype(np.int64),
+        "Month": totals["Month"].astype(np.int64),
+        "Temperature": temperature,
+        "emissions_total": totals["emissions_total"],
+        "Region": [labels[position] for position in totals["Group"]],
+    })
+
+
+def partitioned_monthly_summaries(temperature_path, emissions_path, groups, by="entity", partitions=None,
+                                  memory_budget=DEFAULT_MEMORY_BUDGET, workers=None, directory=None, clean=True):
+    """
+    Computes the monthly mean temperature and total emissions of every region group, joining
+    the monthly temperatures with the yearly emissions out of core: both sources are split into
+    partitions on disk, every partition is filtered, merged and reduced on its own (the
+    partitions in parallel, each worker holding one at a time) and the partial sums are merged.
+
+    Parameters:
+        temperature_path (str): Path of the wide temperature CSV file.
+        emissions_path (str): Path of the emissions CSV file.
+        groups (dict): The region groups (see load_region_groups()).
+        by (str): "entity" (hash partitions) or "year" (year-range partitions).
+        partitions (int): Number of partitions (default: planned from the memory budget).
+        memory_budget (int): Memory budget in bytes, shared by the workers.
+        workers (int): Number of worker processes (default: one per CPU; 0 runs serially).
+        directory (str): Directory for the partition files (default: a temporary directory,
+                         removed afterwards).
+        clean (bool): Clean the temperature data like clean_dataset().
+
+    Returns:
+        tuple: (summaries, report): the monthly summaries (see merge_partials()) and a dict with
+               the number of "partitions", the source and merged row counts and the largest
+               partition in memory ("max_partition_bytes") against the budget of a worker.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if partitions is None:
+        # The long row count is estimated from the size of the wide file: every value takes
+        # about 20 characters in the CSV file.
+        partitions = plan_partitions(os.path.getsize(temperature_path) / 20, memory_budget, workers)
+
+    owned = directory is None
+    directory = tempfile.mkdtemp(prefix="partitions-") if owned else directory
+    try:
+        layout = partition_sources(temperature_path, emissions_path, directory, partitions, by, clean,
+                                   memory_budget=memory_budget)
+        membership = membership_table(groups)[["Entity", "Group"]]
+        tasks = [
+            {"directory": directory, "partition": partition, "means": layout["means"],
+             "regions": member_countries(groups), "membership": membership}
+            for partition in range(partitions)
+        ]
+        results = fan_out(_process_partition, tasks, {}, workers)
+    finally:
+        if owned:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    summaries = merge_partials([result["partial"] for result in results], groups)
+    report = {
+        "partitions": partitions,
+        "by": by,
+        "temperature_rows": layout["temperature_rows"],
+        "emissions_rows": layout["emissions_rows"],
+        "merged_rows": sum(result["rows"] for result in results),
+        "max_partition_bytes": max(result["bytes"] for result in results),
+        "worker_budget_bytes": memory_budget // max(workers, 1),
+    }
+    return summaries, report
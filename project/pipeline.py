@@ -1,17 +1,31 @@
+import argparse
 import pandas as pd
-import ssl
 import numpy as np
 import os
-import plotly.express as px
-from scipy.stats import linregress
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from scipy.stats import pearsonr
-from scipy.stats import linregress
-
-# Disable SSL certificate verification (useful if there are SSL issues when fetching data from URLs).
-ssl._create_default_https_context = ssl._create_unverified_context
-
+from download_cache import DownloadCache
+from fetcher import fetch_sources
+from stages import Stage, StageGraph
+from rendering import DEFAULT_FORMATS, FigureSpec, export_figures
+import regression
+from regression import grouped_linregress, grouped_polyfit
+from streaming import DEFAULT_CHUNKSIZE, stream_csv
+from entity_index import EntityYearIndex, merge_indexed
+from incremental import IncrementalUpdater, write_outputs
+from output_writer import output_file, write_artifacts
+from profiling import Profiler, profile_paths, profiled
+from memo import default_cache, memoized
+from rolling import DEFAULT_WINDOW, rolling_trends
+from schemas import SCHEMAS, read_csv, read_csv_chunks, source_parser
+from region_groups import aggregate_region_groups, load_region_groups, member_countries, select_region
+
+# Source URLs of the Our World In Data datasets.
+EMISSIONS_URL = "https://ourworldindata.org/grapher/annual-co-emissions-by-region.csv?v=1&csvType=full&useColumnShortNames=true"
+TEMPERATURE_URL = "https://ourworldindata.org/grapher/monthly-average-surface-temperatures-by-year.csv?v=1&csvType=full&useColumnShortNames=false"
+
+# All sources fetched by the pipeline (downloaded concurrently, see fetcher.py).
+SOURCES = {"emissions": EMISSIONS_URL, "temperature": TEMPERATURE_URL}
+
+@profiled
 def clean_dataset(df):
     """
     Cleans the dataset by removing duplicates, handling missing values, sorting the data,
@@ -42,45 +56,107 @@ def clean_dataset(df):
     # Return the cleaned dataset.
     return df_cleaned
 
-def fetch_data():
+@profiled
+def fetch_data(cache=None):
     """
     Fetches datasets for emissions and temperature from the specified URLs.
 
+    Both datasets are downloaded and parsed concurrently (see fetcher.py) through the local
+    download cache (see download_cache.py): unchanged files are revalidated with a conditional
+    request instead of being downloaded again, and offline mode (PIPELINE_OFFLINE=1) serves the
+    datasets from the cache only. Each file is parsed with its declared schema (see schemas.py),
+    so a changed layout of a source fails here with a SchemaError.
+
+    Parameters:
+        cache (DownloadCache): The download cache to use (default: a cache in project/.cache).
+
     Returns:
         tuple: A tuple containing two DataFrames:
             - emissions_data: The dataset for annual CO2 emissions by region.
             - temperature_data: The dataset for monthly average surface temperatures by year.
     """
-    # Fetch the emissions dataset from the specified URL.
-    # The URL points to a CSV file containing annual CO2 emissions data by region.
-    emissions_data = pd.read_csv(
-        "https://ourworldindata.org/grapher/annual-co-emissions-by-region.csv?v=1&csvType=full&useColumnShortNames=true",
-        storage_options={'User-Agent': 'Our World In Data data fetch/1.0'}  # Specify a custom user-agent for the request.
-    )
-
-    # Fetch the temperature dataset from the specified URL.
-    # The URL points to a CSV file containing monthly average surface temperature data by year.
-    temperature_data = pd.read_csv(
-        "https://ourworldindata.org/grapher/monthly-average-surface-temperatures-by-year.csv?v=1&csvType=full&useColumnShortNames=false",
-        storage_options={'User-Agent': 'Our World In Data data fetch/1.0'}  # Specify a custom user-agent for the request.
-    )
+    # Fetch the annual CO2 emissions by region and the monthly average surface temperatures
+    # by year at the same time.
+    datasets, _ = fetch_sources(SOURCES, cache, parse={name: source_parser(name) for name in SOURCES})
 
     # Return the two datasets as a tuple.
+    return datasets["emissions"], datasets["temperature"]
+
+
+@profiled
+def fetch_data_streaming(regions, year_range=None, chunksize=DEFAULT_CHUNKSIZE, cache=None):
+    """
+    Fetches the emissions and temperature datasets in chunks, keeping only the rows of the given
+    regions, the years within year_range and the columns used by the later stages.
+
+    Both sources are parsed with the dtypes of their schemas (see schemas.SCHEMAS). The
+    temperature dataset is cleaned while it is streamed (see streaming.stream_csv()), so the
+    result equals clean_dataset() applied to the full source and then filtered, while the peak
+    memory stays bounded by the chunk size and the size of the filtered data.
+
+    Parameters:
+        regions (list): The countries/regions to keep.
+        year_range (tuple): Optional (first year, last year) to keep.
+        chunksize (int): Number of CSV rows parsed per chunk.
+        cache (DownloadCache): The download cache to use (default: a cache in project/.cache).
+
+    Returns:
+        tuple: A tuple containing two DataFrames:
+            - emissions_data: The filtered emissions data ("Entity", "Code", "Year", "emissions_total").
+            - temperature_data: The filtered and cleaned temperature data (still in the wide format).
+    """
+    # Download both sources concurrently, then stream them through the filters.
+    paths, _ = fetch_sources(SOURCES, cache, parse=None)
+    emissions_data = stream_csv(
+        paths["emissions"], entities=regions, year_range=year_range,
+        columns=["Entity", "Code", "Year", "emissions_total"], chunksize=chunksize,
+        schema=SCHEMAS["emissions"], name="emissions"
+    )
+    temperature_data = stream_csv(
+        paths["temperature"], entities=regions, year_range=year_range,
+        wide=True, clean=True, chunksize=chunksize, schema=SCHEMAS["temperature"], name="temperature"
+    )
     return emissions_data, temperature_data
 
 
-def transform_temperature_data(temperature_data):
+@profiled
+def fetch_source_files(cache=None):
+    """
+    Downloads (or revalidates) the sources without parsing them, for the lazy backend which
+    scans the CSV files itself (see lazy_backend.py).
+
+    Parameters:
+        cache (DownloadCache): The download cache to use (default: a cache in project/.cache).
+
+    Returns:
+        dict: Per source, the local "path" together with its "size" and "modified" time, so the
+              fingerprint of this output changes whenever a file does.
+    """
+    paths, _ = fetch_sources(SOURCES, cache, parse=None)
+    files = {}
+    for name, path in paths.items():
+        stat = os.stat(path)
+        files[name] = {"path": path, "size": stat.st_size, "modified": stat.st_mtime_ns}
+    return files
+
+
+@profiled
+def transform_temperature_data(temperature_data, clean=True):
     """
     Transforms the temperature dataset into a format suitable for analysis.
 
     Parameters:
         temperature_data (DataFrame): The original temperature dataset with columns for "Entity", "Code", "Year", and other data.
+        clean (bool): Clean the dataset first (False if it was already cleaned while streaming).
 
     Returns:
         DataFrame: A transformed temperature dataset where data is unpivoted and formatted for further analysis.
     """
     # Clean the dataset using a helper function (e.g., for missing values or invalid data).
-    temperature_data = clean_dataset(temperature_data)
+    if clean:
+        temperature_data = clean_dataset(temperature_data)
+    else:
+        temperature_data = temperature_data.copy()
 
     # Ensure that column names representing years are converted to numeric types if possible.
     temperature_data.columns = [
@@ -106,9 +182,79 @@ def transform_temperature_data(temperature_data):
         "Year": "Month"         # Rename the original "Year" column to "Month" (if this was intended).
     }, inplace=True)
 
-    # Return the transformed dataset.
-    return temperature_melted
+    # Return the transformed dataset with compact dtypes.
+    return compact_temperature_dtypes(temperature_melted)
 
+def compact_temperature_dtypes(temperature_data):
+    """
+    Stores "Entity"/"Code" as categoricals and "Year"/"Month" as small integers, which shrinks
+    the long temperature data to a fraction of its object/int64 size.
+
+    Parameters:
+        temperature_data (DataFrame): A temperature dataset with some of the columns above.
+
+    Returns:
+        DataFrame: The same dataset with compact dtypes (integer columns containing missing
+                   values are left unchanged).
+    """
+    compact = {"Entity": "category", "Code": "category", "Year": "int16", "Month": "int8"}
+    for column, dtype in compact.items():
+        if column not in temperature_data.columns:
+            continue
+        if dtype != "category" and temperature_data[column].isnull().any():
+            continue
+        temperature_data[column] = temperature_data[column].astype(dtype)
+    return temperature_data
+
+@profiled
+def transform_temperature_yearly(temperature_data, clean=True):
+    """
+    Computes the yearly mean temperature per entity directly from the wide temperature dataset.
+
+    This is equivalent to transform_temperature_data() followed by summarize_yearly_temperature(),
+    but never materializes the long (melted) dataset: the monthly rows of every entity are
+    summed per year column with one vectorized reduction over the numeric year columns.
+
+    Parameters:
+        temperature_data (DataFrame): The original wide temperature dataset ("Entity", "Code",
+                                      "Year" (the month) and one column per year).
+        clean (bool): Clean the dataset first (False if it was already cleaned while streaming).
+
+    Returns:
+        DataFrame: A dataset with the columns "Entity" (categorical), "Year" (int16) and
+                   "Temperature" (yearly mean), sorted by "Entity" and "Year".
+    """
+    # Clean the dataset using a helper function (e.g., for missing values or invalid data).
+    if clean:
+        temperature_data = clean_dataset(temperature_data)
+
+    # The columns whose names are years hold the monthly temperatures of that year.
+    year_columns = sorted((col for col in temperature_data.columns if str(col).isdigit()), key=int)
+    years = np.array([int(col) for col in year_columns], dtype=np.int16)
+    values = temperature_data[year_columns].to_numpy(dtype=np.float64)
+
+    # Sort the rows by entity and sum the months of every entity per year in one reduction.
+    codes, entities = pd.factorize(temperature_data["Entity"], sort=True)
+    if len(temperature_data) == 0:
+        # reduceat() needs at least one row; without rows there are no entities to average.
+        means = np.empty((0, len(years)))
+    else:
+        order = np.argsort(codes, kind="stable")
+        starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+        valid = ~np.isnan(values[order])
+        sums = np.add.reduceat(np.where(valid, values[order], 0.0), starts, axis=0)
+        counts = np.add.reduceat(valid.astype(np.int64), starts, axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+
+    # Lay the (entity x year) means out as a long dataset.
+    return pd.DataFrame({
+        "Entity": pd.Categorical.from_codes(np.repeat(np.arange(len(entities)), len(years)), categories=entities),
+        "Year": np.tile(years, len(entities)),
+        "Temperature": means.ravel(),
+    })
+
+@profiled
 def filter_data(temperature_data, emissions_data, regions):
     """
     Filters the temperature and emissions datasets for the specified regions and shared years.
@@ -141,6 +287,7 @@ def filter_data(temperature_data, emissions_data, regions):
     # Return the filtered datasets as a tuple.
     return temperature_filtered, emissions_filtered
 
+@profiled
 def merge_datasets(temperature_data, emissions_data):
     """
     Merges the temperature and emissions datasets into a single dataset.
@@ -168,11 +315,10 @@ def merge_datasets(temperature_data, emissions_data):
     return combined_data
 
 
-def plot_emissions_by_country_large_graph(emissions_data_na, countries_na, region_na, 
-                                          emissions_data_sa, countries_sa, region_sa, output_file):
+def build_emissions_by_country_figure(emissions_data_na, countries_na, region_na,
+                                      emissions_data_sa, countries_sa, region_sa):
     """
-    Creates a large side-by-side graph for CO2 emissions by countries in two regions 
-    and saves it as an image.
+    Builds a large side-by-side graph for CO2 emissions by countries in two regions.
 
     Parameters:
         emissions_data_na (DataFrame): CO2 emissions data for the first region (e.g., North America).
@@ -181,11 +327,15 @@ def plot_emissions_by_country_large_graph(emissions_data_na, countries_na, regio
         emissions_data_sa (DataFrame): CO2 emissions data for the second region (e.g., South America).
         countries_sa (list): List of country names for the second region.
         region_sa (str): Name of the second region.
-        output_file (str): File path to save the output image.
+
+    Returns:
+        Figure: The Plotly figure.
     """
-    # Filter data for the specified countries in each region
-    region_data_na = emissions_data_na[emissions_data_na["Entity"].isin(countries_na)]
-    region_data_sa = emissions_data_sa[emissions_data_sa["Entity"].isin(countries_sa)]
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    # Index the data of each region once, so every country is a slice instead of a boolean mask
+    region_index_na = EntityYearIndex(emissions_data_na)
+    region_index_sa = EntityYearIndex(emissions_data_sa)
 
     # Create subplots for side-by-side visualization
     fig = make_subplots(
@@ -195,7 +345,7 @@ def plot_emissions_by_country_large_graph(emissions_data_na, countries_na, regio
 
     # Add North America data to the first subplot
     for country in countries_na:
-        country_data = region_data_na[region_data_na["Entity"] == country]
+        country_data = region_index_na.entity(country)
         fig.add_trace(
             go.Scatter(
                 x=country_data["Year"], 
@@ -208,7 +358,7 @@ def plot_emissions_by_country_large_graph(emissions_data_na, countries_na, regio
 
     # Add South America data to the second subplot
     for country in countries_sa:
-        country_data = region_data_sa[region_data_sa["Entity"] == country]
+        country_data = region_index_sa.entity(country)
         fig.add_trace(
             go.Scatter(
                 x=country_data["Year"], 
@@ -231,16 +381,30 @@ def plot_emissions_by_country_large_graph(emissions_data_na, countries_na, regio
         width=1000   # Width of the graph in pixels
     )
 
+    return fig
+
+def plot_emissions_by_country_large_graph(emissions_data_na, countries_na, region_na, 
+                                          emissions_data_sa, countries_sa, region_sa, output_file):
+    """
+    Creates a large side-by-side graph for CO2 emissions by countries in two regions 
+    and saves it as an image (see build_emissions_by_country_figure()).
+
+    Parameters:
+        output_file (str): File path to save the output image.
+    """
+    fig = build_emissions_by_country_figure(emissions_data_na, countries_na, region_na,
+                                            emissions_data_sa, countries_sa, region_sa)
+
     # Save the graph as an image
-    fig.write_image(output_file)
+    export_figures([FigureSpec("co2_emissions_large_graph", fig, output_file)], workers=0)
     print(f"The graph has been successfully saved as '{output_file}'.")
 
 
 
-def plot_temperature_by_region_large_graph(temp_data_na, countries_na, region_na, 
-                                           temp_data_sa, countries_sa, region_sa, output_file):
+def build_temperature_by_region_figure(temp_data_na, countries_na, region_na,
+                                       temp_data_sa, countries_sa, region_sa):
     """
-    Creates a large side-by-side graph comparing temperatures for two regions and saves it as an image file.
+    Builds a large side-by-side graph comparing temperatures for two regions.
 
     Parameters:
         temp_data_na (DataFrame): Temperature data for North America.
@@ -249,11 +413,15 @@ def plot_temperature_by_region_large_graph(temp_data_na, countries_na, region_na
         temp_data_sa (DataFrame): Temperature data for South America.
         countries_sa (list): List of countries in South America.
         region_sa (str): Name of the South American region.
-        output_file (str): File path to save the output image.
+
+    Returns:
+        Figure: The Plotly figure.
     """
-    # Filter data for the specified countries
-    region_data_na = temp_data_na[temp_data_na["Entity"].isin(countries_na)]
-    region_data_sa = temp_data_sa[temp_data_sa["Entity"].isin(countries_sa)]
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    # Index the data of each region once, so every country is a slice instead of a boolean mask
+    region_index_na = EntityYearIndex(temp_data_na)
+    region_index_sa = EntityYearIndex(temp_data_sa)
 
     # Create subplots
     fig = make_subplots(
@@ -263,7 +431,7 @@ def plot_temperature_by_region_large_graph(temp_data_na, countries_na, region_na
 
     # Add data for North America
     for country in countries_na:
-        country_data = region_data_na[region_data_na["Entity"] == country]
+        country_data = region_index_na.entity(country)
         fig.add_trace(
             go.Scatter(
                 x=country_data["Year"], 
@@ -276,7 +444,7 @@ def plot_temperature_by_region_large_graph(temp_data_na, countries_na, region_na
 
     # Add data for South America
     for country in countries_sa:
-        country_data = region_data_sa[region_data_sa["Entity"] == country]
+        country_data = region_index_sa.entity(country)
         fig.add_trace(
             go.Scatter(
                 x=country_data["Year"], 
@@ -299,29 +467,58 @@ def plot_temperature_by_region_large_graph(temp_data_na, countries_na, region_na
         width=1000   # Set the width of the graph
     )
 
+    return fig
+
+def plot_temperature_by_region_large_graph(temp_data_na, countries_na, region_na, 
+                                           temp_data_sa, countries_sa, region_sa, output_file):
+    """
+    Creates a large side-by-side graph comparing temperatures for two regions and saves it
+    as an image file (see build_temperature_by_region_figure()).
+
+    Parameters:
+        output_file (str): File path to save the output image.
+    """
+    fig = build_temperature_by_region_figure(temp_data_na, countries_na, region_na,
+                                             temp_data_sa, countries_sa, region_sa)
+
     # Save the graph as an image
-    fig.write_image(output_file)
+    export_figures([FigureSpec("temperature_large_graph", fig, output_file)], workers=0)
     print(f"The graph has been successfully saved as '{output_file}'.")
 
-def plot_temperature_vs_emissions(df_combined, output_file, width=1000, height=600):
+@memoized(columns={"df_combined": ["emissions_total", "Temperature"]})
+def fit_best_line(df_combined):
+    """
+    Fits the line of best fit of temperature on total emissions.
+
+    Returns:
+        tuple: The slope and the intercept of the line.
+    """
+    from scipy.stats import linregress
+
+    slope, intercept, r_value, p_value, std_err = linregress(df_combined["emissions_total"].values,
+                                                             df_combined["Temperature"].values)
+    return slope, intercept
+
+def build_temperature_vs_emissions_figure(df_combined):
     """
-    Creates a scatter plot showing temperature as a function of total emissions,
+    Builds a scatter plot showing temperature as a function of total emissions,
     including the Pearson correlation line.
 
     Parameters:
         df_combined (DataFrame): A DataFrame containing columns "emissions_total", 
                                  "Temperature", "Region", and "Year".
-        output_file (str): File path to save the image.
-        width (int): Width of the saved image in pixels (default is 1920).
-        height (int): Height of the saved image in pixels (default is 1080).
+
+    Returns:
+        Figure: The Plotly figure.
     """
+    import plotly.express as px
+    import plotly.graph_objects as go
 
-    # Extract x (emissions) and y (temperature) data
+    # Extract x (emissions) data
     x = df_combined["emissions_total"].values
-    y = df_combined["Temperature"].values
 
-    # Perform linear regression for the line of best fit
-    slope, intercept, r_value, p_value, std_err = linregress(x, y)
+    # Perform linear regression for the line of best fit (cached for unchanged data)
+    slope, intercept = fit_best_line(df_combined)
 
     # Calculate the line of best fit
     x_fit = np.linspace(x.min(), x.max(), 100)  # Generate x values for the line
@@ -352,29 +549,58 @@ def plot_temperature_vs_emissions(df_combined, output_file, width=1000, height=6
         )
     )
 
+    return fig
+
+def plot_temperature_vs_emissions(df_combined, output_file, width=1000, height=600):
+    """
+    Creates a scatter plot showing temperature as a function of total emissions and saves it
+    as an image (see build_temperature_vs_emissions_figure()).
+
+    Parameters:
+        df_combined (DataFrame): A DataFrame containing columns "emissions_total", 
+                                 "Temperature", "Region", and "Year".
+        output_file (str): File path to save the image.
+        width (int): Width of the saved image in pixels (default is 1000).
+        height (int): Height of the saved image in pixels (default is 600).
+    """
+    fig = build_temperature_vs_emissions_figure(df_combined)
+
     # Save the graph as an image with specified dimensions
-    fig.write_image(output_file, width=width, height=height)
+    export_figures([FigureSpec("temperature_vs_emissions", fig, output_file, width, height)], workers=0)
 
-def plot_temperature_with_trendlines(df_combined, p_values_df, output_file, width=1600, height=800):
+@memoized(columns={"df_combined": ["Region", "Year", "Temperature"]}, uses=[regression])
+def fit_trendlines(df_combined, deg=4):
+    """
+    Fits a polynomial trendline of the temperature per region (see regression.grouped_polyfit()).
+
+    Returns:
+        ndarray: The value of each region's polynomial at every row of df_combined.
+    """
+    _, trendlines = grouped_polyfit(df_combined["Region"], df_combined["Year"], df_combined["Temperature"], deg=deg)
+    return trendlines
+
+def build_temperature_with_trendlines_figure(df_combined, p_values_df):
     """
-    Creates an interactive Plotly chart displaying temperature data with trendlines and p-values.
+    Builds an interactive Plotly chart displaying temperature data with trendlines and p-values.
 
     Parameters:
         df_combined (DataFrame): A DataFrame containing columns "Region", "Year", and "Temperature".
         p_values_df (DataFrame): A DataFrame with p-values and regression details for each region.
-        output_file (str): The file path to save the output image.
-        width (int): The width of the saved image in pixels.
-        height (int): The height of the saved image in pixels.
+
+    Returns:
+        Figure: The Plotly figure.
     """
+    import plotly.graph_objects as go
     # Initialize a Plotly figure
     fig = go.Figure()
 
-    # Iterate through each unique region to plot temperature data and trendlines
-    for region in df_combined["Region"].unique():
-        # Filter data for the current region
-        region_data = df_combined[df_combined["Region"] == region]
-        x = region_data["Year"]
-        y = region_data["Temperature"]
+    # Fit a polynomial trendline (degree 4 for better fit) for all regions in a single pass.
+    trendlines = fit_trendlines(df_combined)
+
+    # Iterate through each region (in order of appearance) to plot temperature data and trendlines
+    for region, rows in df_combined.groupby("Region", sort=False).indices.items():
+        x = df_combined["Year"].values[rows]
+        y = df_combined["Temperature"].values[rows]
 
         # Plot temperature data as a line
         fig.add_trace(go.Scatter(
@@ -386,9 +612,7 @@ def plot_temperature_with_trendlines(df_combined, p_values_df, output_file, widt
             hovertemplate="Year: %{x}<br>Temperature: %{y:.2f}°C<extra></extra>"  # Hover information
         ))
 
-        # Fit a polynomial trendline (degree 4 for better fit)
-        coeffs = np.polyfit(x, y, deg=4)  # Compute the coefficients of a 4th-degree polynomial
-        trendline = np.polyval(coeffs, x)  # Evaluate the polynomial on x-values
+        trendline = trendlines[rows]  # The values of the region's polynomial at its x-values
 
         # Add the trendline to the chart
         fig.add_trace(go.Scatter(
@@ -410,12 +634,31 @@ def plot_temperature_with_trendlines(df_combined, p_values_df, output_file, widt
         hovermode="x unified"  # Combine hover information for all traces
     )
 
+    return fig
+
+def plot_temperature_with_trendlines(df_combined, p_values_df, output_file, width=1600, height=800):
+    """
+    Creates an interactive Plotly chart displaying temperature data with trendlines and p-values
+    and saves it as an image (see build_temperature_with_trendlines_figure()).
+
+    Parameters:
+        df_combined (DataFrame): A DataFrame containing columns "Region", "Year", and "Temperature".
+        p_values_df (DataFrame): A DataFrame with p-values and regression details for each region.
+        output_file (str): The file path to save the output image.
+        width (int): The width of the saved image in pixels.
+        height (int): The height of the saved image in pixels.
+    """
+    fig = build_temperature_with_trendlines_figure(df_combined, p_values_df)
+
     # Save the chart as an image with specified dimensions
-    fig.write_image(output_file, width=width, height=height)  # Export the chart to the specified file
+    export_figures([FigureSpec("temperature_trendlines", fig, output_file, width, height)], workers=0)
 
+@profiled
+@memoized(columns={"df_combined": ["Region", "Year", "emissions_total"]}, uses=[regression])
 def calculate_p_values(df_combined):
     """
-    Calculates linear regression and p-values for each region in the dataset.
+    Calculates linear regression and p-values for each region in the dataset
+    (all regions at once, see regression.grouped_linregress()).
 
     Parameters:
         df_combined (DataFrame): A DataFrame containing columns "Region", "Year", and "emissions_total".
@@ -424,153 +667,644 @@ def calculate_p_values(df_combined):
         DataFrame: A new DataFrame with linear regression results, including slope, intercept, R-squared, and p-value for each region.
     """
 
-    # Initialize a list to store the regression results for each region
-    results = []
+    # Perform the linear regression of emissions on the year for all regions in a single pass
+    results = grouped_linregress(df_combined["Region"], df_combined["Year"], df_combined["emissions_total"])
 
-    # Iterate over each unique region in the DataFrame
-    for region in df_combined["Region"].unique():
-        # Filter the data for the current region
-        region_data = df_combined[df_combined["Region"] == region]
-        x = region_data["Year"].values  # Independent variable
-        y = region_data["emissions_total"].values  # Dependent variable
+    # Collect the regression results per region (in order of appearance)
+    return pd.DataFrame({
+        "Region": results.index,
+        "Slope": results["slope"].values,  # The rate of change in emissions over time
+        "Intercept": results["intercept"].values,  # The estimated emissions at Year=0
+        "R-squared": results["r_squared"].values,  # Coefficient of determination, indicates goodness of fit
+        "P-value": results["pvalue"].values  # Statistical significance of the slope
+    })
 
-        # Perform linear regression
-        slope, intercept, r_value, p_value, std_err = linregress(x, y)
+def summarize_yearly_temperature(temperature_melted):
+    """
+    Averages the monthly temperatures of the melted temperature dataset per entity and year.
 
-        # Append the regression results for the region to the results list
-        results.append({
-            "Region": region,
-            "Slope": slope,  # The rate of change in emissions over time
-            "Intercept": intercept,  # The estimated emissions at Year=0
-            "R-squared": r_value**2,  # Coefficient of determination, indicates goodness of fit
-            "P-value": p_value  # Statistical significance of the slope
-        })
+    Parameters:
+        temperature_melted (DataFrame): The long temperature dataset returned by transform_temperature_data().
 
-    # Convert the results list into a DataFrame for easier analysis and visualization
-    return pd.DataFrame(results)
+    Returns:
+        DataFrame: A dataset with the columns "Entity", "Year" and "Temperature" (yearly mean).
+    """
+    # Group the melted temperature dataset by "Entity" (country/region) and "Year",
+    # and calculate the average temperature for each combination of entity and year.
+    return temperature_melted.groupby(["Entity", "Year"]).agg({
+        "Temperature": "mean",  # Calculate the mean temperature for each group.
+    }).reset_index()  # Reset the index to turn the grouped data into a standard dataframe.
 
-def main():
-    # Fetch the emissions and temperature datasets from the source.
-    # The function fetch_data() retrieves and returns these datasets as emissions_data and temperature_data.
-    emissions_data, temperature_data = fetch_data()
+def index_datasets(yearly_temperature, emissions_data):
+    """
+    Builds the (Entity, Year) indexes of the yearly temperatures and the emissions once, so
+    every region can be selected and joined without scanning the full datasets again.
 
-    # Transform the temperature data into a format suitable for analysis.
-    # The function transform_temperature_data() processes the raw temperature_data, 
-    # such as reshaping or cleaning it, and returns the transformed dataset as temperature_melted.
-    temperature_melted = transform_temperature_data(temperature_data)
+    Returns:
+        tuple: The EntityYearIndex of the yearly temperatures and of the emissions.
+    """
+    return EntityYearIndex(yearly_temperature), EntityYearIndex(emissions_data)
 
-    save_directory = os.path.join(os.path.dirname(__file__), "data")
+def combine_region_indexed(temperature_index, emissions_index, countries):
+    """
+    Selects the countries of a region from the indexed datasets and joins them on ("Entity", "Year").
 
-    # Sicherstellen, dass das Speicherverzeichnis existiert
-    os.makedirs(save_directory, exist_ok=True)
+    This gives the same rows as combine_region() (the inner join only keeps the years present in
+    both datasets), sorted by entity and year, using block slicing and a sorted merge join.
 
-    # Define a list of countries that are part of the North American region.
-    north_america_countries = [
-        "Antigua and Barbuda", "Bahamas", "Belize", "Costa Rica",
-        "Dominican Republic", "El Salvador", "Haiti", "Honduras", 
-        "Jamaica", "Canada", "Cuba", "Mexico", "Nicaragua", 
-        "Panama", "Trinidad and Tobago", "United States"
-    ]
+    Parameters:
+        temperature_index (EntityYearIndex): The indexed yearly temperatures.
+        emissions_index (EntityYearIndex): The indexed emissions.
+        countries (list): The countries of the region.
 
-    # Define a list of countries that are part of the South American region.
-    south_america_countries = [
-        "Argentina", "Bolivia", "Brazil", "Chile", "Ecuador",
-        "Guyana", "Colombia", "Paraguay", "Peru", "Suriname",
-        "Uruguay", "Venezuela", "Guatemala"
-    ]
+    Returns:
+        DataFrame: The merged temperature and emissions data of the region's countries.
+    """
+    return merge_indexed(temperature_index, emissions_index, countries)
 
-    # Combine the lists for North America and South America into a single list of countries 
-    # representing all of the Americas.
-    all_americas = north_america_countries + south_america_countries
+def combine_region(yearly_temperature, emissions_data, countries):
+    """
+    Filters the yearly temperatures and the emissions to the countries of a region and merges them.
 
-    # Group the melted temperature dataset (temperature_melted) by "Entity" (country/region) and "Year",
-    # and calculate the average temperature for each combination of entity and year.
-    yearly_summary_n = temperature_melted.groupby(["Entity", "Year"]).agg({
-        "Temperature": "mean",  # Calculate the mean temperature for each group.
-    }).reset_index()  # Reset the index to turn the grouped data into a standard dataframe.
+    Parameters:
+        yearly_temperature (DataFrame): Yearly temperatures per entity (see summarize_yearly_temperature()).
+        emissions_data (DataFrame): The emissions dataset.
+        countries (list): The countries of the region.
 
-    # Rename the columns for better clarity and formatting (though in this case, the column names are unchanged).
-    yearly_summary_n.rename(columns={
-        "Entity": "Entity",  # Rename "Entity" to "Entity" (redundant here but could be adjusted for consistency).
-        "Year": "Year",      # Rename "Year" to "Year".
-        "Temperature": "Temperature"  # Rename "Temperature" to "Temperature".
-    }, inplace=True)
+    Returns:
+        DataFrame: The merged temperature and emissions data of the region's countries.
+    """
+    temperature_filtered, emissions_filtered = filter_data(yearly_temperature, emissions_data, countries)
+    return merge_datasets(temperature_filtered, emissions_filtered)
+
+def summarize_region(combined_data, region):
+    """
+    Aggregates the merged data of a region per year.
+
+    Parameters:
+        combined_data (DataFrame): The merged data of the region (see combine_region()).
+        region (str): The label stored in the "Region" column.
 
-    # Filter the yearly summary dataset (yearly_summary_n) and the emissions dataset (emissions_data) 
-    # to include only data for countries in North America (north_america_countries). 
-    # This results in two filtered datasets: 
-    # - yearly_summary_na_filtered: Filtered yearly summary data for North America.
-    # - emissions_filtered_na: Filtered emissions data for North America.
-    yearly_summary_na_filtered, emissions_filtered_na = filter_data(yearly_summary_n, emissions_data, north_america_countries)
-
-    # Merge the filtered yearly summary for North America (yearly_summary_na_filtered) 
-    # with the filtered emissions data for North America (emissions_filtered_na) 
-    # into a single dataset named "combined_filtered_data_na".
-    combined_filtered_data_na = merge_datasets(yearly_summary_na_filtered, emissions_filtered_na)
-
-    # Group the filtered dataset for North America (combined_filtered_data_na) by "Year" 
-    # and calculate the yearly values for each group.
-    yearly_summarynorden = combined_filtered_data_na.groupby("Year").agg({
-        "Temperature": "mean",  # Calculate the average temperature for all months within each year.
-        "emissions_total": "sum"  # Calculate the total emissions for all months within each year.
+    Returns:
+        DataFrame: A dataset with the yearly mean temperature and the yearly total emissions of the region.
+    """
+    # Group the merged dataset by "Year" and calculate the yearly values for each group.
+    yearly_summary = combined_data.groupby("Year").agg({
+        "Temperature": "mean",  # Calculate the average temperature of all countries within each year.
+        "emissions_total": "sum"  # Calculate the total emissions of all countries within each year.
     }).reset_index()  # Reset the index to convert the grouped data back into a standard dataframe.
 
-    # Filter and merge datasets for North America
-    yearly_summary_sa_filtered, emissions_filtered_na = filter_data(yearly_summary_n, emissions_data, south_america_countries)
+    # Add a new column "Region" with the label of the region.
+    yearly_summary["Region"] = region
+    return yearly_summary
 
-    # Merge the filtered yearly summary for South America (yearly_summary_sa_filtered) 
-    # with the filtered emissions data for North America (emissions_filtered_na) into a new dataset called "sueden".
-    sueden = merge_datasets(yearly_summary_sa_filtered, emissions_filtered_na)
+def summarize_region_group(frames, group):
+    """
+    Filters, merges and aggregates the data of one region group (a fan-out task, see fanout.py).
 
-    # Grouping data by 'Year' and calculating annual statistics
-    yearly_summarysouth = sueden.groupby("Year").agg({
-        "Temperature": "mean",  # Calculate the average temperature across all months for each year
-        "emissions_total": "sum"  # Sum the total emissions across all months for each year
-    }).reset_index()
+    Parameters:
+        frames (dict): The yearly temperatures ("temperature") and the emissions ("emissions").
+        group (dict): The region group with its "countries" and "label".
+
+    Returns:
+        DataFrame: The yearly summary of the group (see summarize_region()).
+    """
+    temperature_filtered, emissions_filtered = filter_data(frames["temperature"], frames["emissions"], group["countries"])
+    return summarize_region(merge_datasets(temperature_filtered, emissions_filtered), group["label"])
 
-    # Add a new column "Region" to the yearly summary for North America and set its value to "Nordamerika".
-    yearly_summarynorden["Region"] = "North amerika"
+def aggregate_region_groups_parallel(yearly_temperature, emissions_data, groups, workers=None):
+    """
+    Computes the yearly summaries of all region groups, one group per task across a pool of
+    worker processes that share the base datasets through memory-mapped Arrow files.
 
-    # Add a new column "Region" to the yearly summary for South America and set its value to "Südamerika".
-    yearly_summarysouth["Region"] = "South amerika"
+    Gives the same result as region_groups.aggregate_region_groups() (the summaries are gathered
+    in the order of the region definitions).
 
-    # Combine the dataframes for North America and South America into one, 
-    # ignoring the original index values to create a new continuous index.
-    df_combined = pd.concat([yearly_summarynorden, yearly_summarysouth], ignore_index=True)
+    Parameters:
+        yearly_temperature (DataFrame): Yearly temperatures per entity.
+        emissions_data (DataFrame): The emissions dataset.
+        groups (dict): The region groups (see region_groups.load_region_groups()).
+        workers (int): Number of worker processes (0 runs the groups serially).
 
-    # Generate plots and save them in the relative directory
-    plot_temperature_by_region_large_graph(
-        combined_filtered_data_na, north_america_countries, "Nordamerika",
-        sueden, south_america_countries, "Südamerika",
-        os.path.join(save_directory, "temperature_large_graph.pdf")
-    )
+    Returns:
+        DataFrame: The yearly summaries of all groups.
+    """
+    from fanout import fan_out
+    frames = {"temperature": yearly_temperature, "emissions": emissions_data[["Entity", "Year", "emissions_total"]]}
+    summaries = fan_out(summarize_region_group, groups.values(), frames, workers)
+    return pd.concat(summaries, ignore_index=True)
 
-    plot_emissions_by_country_large_graph(
-        combined_filtered_data_na, north_america_countries, "Nordamerika",
-        sueden, south_america_countries, "Südamerika",
-        os.path.join(save_directory, "co2_emissions_large_graph.pdf")
-    )
+def combine_region_summaries(**summaries):
+    """
+    Combines the yearly summaries of several regions into one dataset (in argument order),
+    ignoring the original index values to create a new continuous index.
+    """
+    return pd.concat(list(summaries.values()), ignore_index=True)
 
-    plot_temperature_vs_emissions(
-        df_combined, os.path.join(save_directory, "temperature_vs_emissions.pdf")
-    ) 
+@profiled
+def render_figures(outputs, formats=DEFAULT_FORMATS, workers=None, **figures):
+    """
+    Exports the built figures concurrently (see rendering.export_figures()).
 
-    # Calculate p-values for statistical significance testing
-    p_values_df = calculate_p_values(df_combined)
+    Parameters:
+        outputs (dict): (output file, width, height) of every figure, keyed by figure name.
+        formats (list): Formats in which every figure is exported.
+        workers (int): Number of renderer processes (default: one per figure, at most one per CPU).
+        figures (Figure): The figures to export, keyed by figure name.
 
-    # Display the resulting p-values and regression results
+    Returns:
+        list: The per-file render timings.
+    """
+    specs = []
+    for name, figure in figures.items():
+        output_file, width, height = outputs[name]
+        specs.append(FigureSpec(name, figure, output_file, width, height, formats))
+    timings = export_figures(specs, workers=workers)
+
+    # Record the exported files with their checksums in the manifest of their directory.
+    if timings:
+        write_artifacts(os.path.dirname(timings[0]["path"]), {},
+                        files={timing["path"]: timing["seconds"] for timing in timings})
+    return timings
+
+@profiled
+def render_dashboard(output_file, combined_a, countries_a, title_a, combined_b, countries_b, title_b, df_combined,
+                     max_points=None):
+    """
+    Renders the figures as one interactive, self-contained HTML dashboard with WebGL traces
+    built in one grouped pass per panel and dense lines downsampled (see dashboard.py), as an
+    alternative to the static exports of render_figures().
+
+    Parameters:
+        output_file (str): Path of the HTML file.
+        combined_a, combined_b (DataFrame): The merged per-country data of the two compared groups.
+        countries_a, countries_b (list): The countries of the two groups.
+        title_a, title_b (str): The titles of the two groups.
+        df_combined (DataFrame): The yearly summaries of the compared groups.
+        max_points (int): Maximum number of points per line (default: dashboard.DEFAULT_MAX_POINTS).
+
+    Returns:
+        DataFrame: The construction time, point counts and output size of every panel.
+    """
+    from dashboard import DEFAULT_MAX_POINTS, build_country_panel, build_dashboard, build_scatter_panel, build_trendline_panel
+
+    max_points = DEFAULT_MAX_POINTS if max_points is None else max_points
+    groups = (combined_a, countries_a, title_a, combined_b, countries_b, title_b)
+    report = build_dashboard([
+        ("emissions_by_country", "CO2 Emissions by Country",
+         lambda: build_country_panel(*groups, "emissions_total", "CO2 Emissions in", "CO2 Emissions (Million Tons)",
+                                     max_points)),
+        ("temperature_by_region", "Temperature Trends by Country",
+         lambda: build_country_panel(*groups, "Temperature", "Temperatures in", "Temperature (°C)", max_points)),
+        ("temperature_vs_emissions", "Temperature vs. CO2 Emissions",
+         lambda: build_scatter_panel(df_combined, fit_best_line(df_combined))),
+        ("temperature_trendlines", "Temperature Changes with Trendlines",
+         lambda: build_trendline_panel(df_combined, fit_trendlines(df_combined), max_points)),
+    ], output_file)
+    write_artifacts(os.path.dirname(output_file) or ".", {},
+                    files={output_file: sum(entry["build_seconds"] for entry in report)})
+    return pd.DataFrame(report)
+
+@profiled
+def entity_correlations(combined_a, combined_b):
+    """
+    Computes the correlation matrix of the yearly temperatures of the countries of both compared
+    regions (see crosscorr.correlation_matrix()).
+
+    Returns:
+        DataFrame: The matrix with the countries as rows ("Entity" column) and columns.
+    """
+    from crosscorr import correlation_matrix
+    countries = pd.concat([combined_a, combined_b], ignore_index=True).drop_duplicates(["Entity", "Year"])
+    return correlation_matrix(countries, "Temperature").reset_index()
+
+def save_datasets(save_directory, output_format="csv", compression=None, workers=None, **datasets):
+    """
+    Saves datasets as files named "<name>.csv" (or "<name>.csv.gz", "<name>.csv.zst",
+    "<name>.parquet") in the given directory, written concurrently and atomically and recorded
+    with their checksums in the directory's manifest (see output_writer.py).
+
+    Parameters:
+        save_directory (str): The output directory.
+        output_format (str): "csv" or "parquet".
+        compression (str): None, "gzip" or "zstd".
+        workers (int): Number of writer threads (default: one per dataset, at most 8).
+        datasets (DataFrame): The datasets to save, keyed by name.
+
+    Returns:
+        list: The manifest records of the written files.
+    """
+    return write_artifacts(save_directory, datasets, output_format, compression, workers=workers)
+
+def build_stage_graph(save_directory, from_snapshot=False, formats=DEFAULT_FORMATS, render_workers=None,
+                      streaming=False, chunksize=DEFAULT_CHUNKSIZE, regions_file=None, region_workers=None,
+                      backend="pandas", dashboard=False, output_format="csv", compression=None, output_workers=None,
+                      resampling_workers=0):
+    """
+    Declares the stages of the pipeline and how their datasets flow between them.
+
+    Parameters:
+        save_directory (str): Directory for the figures and CSV results.
+        from_snapshot (bool): Reuse the fetched sources of a previous run instead of fetching them again.
+        formats (list): Formats in which every figure is exported (e.g., ["pdf", "png", "svg", "html"]).
+        render_workers (int): Number of renderer processes used to export the figures.
+        streaming (bool): Read the sources in chunks, keeping only the rows of the analysed regions.
+        chunksize (int): Number of CSV rows parsed per chunk in streaming mode.
+        regions_file (str): Region definition file (JSON or YAML, default: project/regions.json).
+        region_workers (int): Fan the region groups out across this many processes instead of
+                              aggregating them in a single grouped reduction (default: single reduction).
+        backend (str): "pandas" runs the transform chain eagerly on DataFrames; "lazy" runs it as
+                       Arrow query plans with the region filters pushed down into the CSV scans
+                       (see lazy_backend.py; streaming and region_workers do not apply).
+        dashboard (bool): Render one interactive HTML dashboard (WebGL, downsampled lines) instead
+                          of exporting the figures in the given formats.
+        output_format (str): Format of the saved datasets ("csv" or "parquet").
+        compression (str): Compression of the saved datasets (None, "gzip" or "zstd").
+        output_workers (int): Number of threads writing the datasets (default: one per dataset, at most 8).
+        resampling_workers (int): Number of processes running the resampling tests (default: 0,
+                                  serially; None: one per region, at most one per CPU).
+
+    Returns:
+        StageGraph: The graph of pipeline stages.
+    """
+    graph = StageGraph()
+
+    # The region groups (countries, labels and output files) come from the region definitions.
+    config = load_region_groups(regions_file)
+    groups = config["groups"]
+    first, second = (groups[key] for key in config["comparison"])
+
+    # Fetching always runs (the download cache keeps it cheap) unless the snapshots should be reused.
+    if backend == "lazy":
+        # Only download the sources: the lazy chain scans the files itself, reading just the rows
+        # and columns of the region groups, and yields the summaries and the compared groups' data
+        # (pyarrow's query engine is only imported in this mode).
+        from lazy_backend import LazyTransformChain, lazy_region_frames
+        graph.add(Stage("fetch", fetch_source_files, outputs=["source_files"],
+                        uses=[DownloadCache, fetch_sources], volatile=not from_snapshot))
+        graph.add(Stage("lazy_regions", lazy_region_frames, inputs=["source_files"],
+                        outputs=["region_summaries"] + [f"combined_{key}" for key in config["comparison"]],
+                        params={"groups": groups, "comparison": config["comparison"]},
+                        uses=[LazyTransformChain]))
+    elif streaming:
+        # Stream the sources in chunks and keep only the countries of the region groups (already cleaned).
+        graph.add(Stage("fetch", fetch_data_streaming, outputs=["emissions_raw", "temperature_raw"],
+                        params={"regions": member_countries(groups), "chunksize": chunksize},
+                        uses=[DownloadCache, fetch_sources, stream_csv, read_csv_chunks], volatile=not from_snapshot))
+    else:
+        graph.add(Stage("fetch", fetch_data, outputs=["emissions_raw", "temperature_raw"],
+                        uses=[DownloadCache, fetch_sources, source_parser, read_csv], volatile=not from_snapshot))
+
+    if backend != "lazy":
+        # Average the monthly temperatures per entity and year straight from the wide layout.
+        graph.add(Stage("yearly_temperature", transform_temperature_yearly,
+                        inputs={"temperature_data": "temperature_raw"}, outputs=["yearly_temperature"],
+                        params={"clean": not streaming}, uses=[clean_dataset]))
+
+        # Merge the datasets of all member countries once and aggregate every region group per year
+        # in a single grouped reduction (a country may belong to several groups).
+        graph.add(Stage("index", index_datasets,
+                        inputs={"yearly_temperature": "yearly_temperature", "emissions_data": "emissions_raw"},
+                        outputs=["temperature_index", "emissions_index"], uses=[EntityYearIndex]))
+        if region_workers is None:
+            graph.add(Stage("combine_groups", combine_region_indexed,
+                            inputs=["temperature_index", "emissions_index"], outputs=["combined_groups"],
+                            params={"countries": member_countries(groups)}, uses=[merge_indexed]))
+            graph.add(Stage("region_aggregates", aggregate_region_groups,
+                            inputs={"combined_data": "combined_groups"}, outputs=["region_summaries"],
+                            params={"groups": groups}))
+        else:
+            # Many groups: filter, merge and aggregate every group in its own worker process.
+            from fanout import fan_out
+            graph.add(Stage("region_aggregates", aggregate_region_groups_parallel,
+                            inputs={"yearly_temperature": "yearly_temperature", "emissions_data": "emissions_raw"},
+                            outputs=["region_summaries"], params={"groups": groups, "workers": region_workers},
+                            uses=[summarize_region_group, fan_out]))
+
+    # Select the groups that have their own output file and the per-country data of the compared groups.
+    summary_names = {}
+    for key, group in groups.items():
+        if "output" in group:
+            summary_names[key] = group["output"]
+            graph.add(Stage(f"summarize_{key}", select_region,
+                            inputs={"summaries": "region_summaries"}, outputs=[group["output"]],
+                            params={"label": group["label"]}))
+    for key in config["comparison"]:
+        if backend != "lazy":
+            graph.add(Stage(f"combine_{key}", combine_region_indexed,
+                            inputs=["temperature_index", "emissions_index"],
+                            outputs=[f"combined_{key}"], params={"countries": groups[key]["countries"]},
+                            uses=[merge_indexed]))
+        if key not in summary_names:
+            summary_names[key] = f"yearly_summary_{key}"
+            graph.add(Stage(f"summarize_{key}", select_region,
+                            inputs={"summaries": "region_summaries"}, outputs=[summary_names[key]],
+                            params={"label": groups[key]["label"]}))
+    graph.add(Stage("combine_regions", combine_region_summaries,
+                    inputs=[summary_names[key] for key in config["comparison"]], outputs=["df_combined"]))
+
+    # Calculate p-values for statistical significance testing.
+    graph.add(Stage("p_values", calculate_p_values, inputs=["df_combined"], outputs=["p_values"]))
+
+    # Bootstrap confidence intervals and permutation p-values of the emissions trend and the
+    # temperature-emissions relationship per region (seeded, so reruns give the same results).
+    from resampling import region_resampling_tests, resampling_tests
+    graph.add(Stage("resampling_tests", region_resampling_tests, inputs=["df_combined"],
+                    outputs=["resampling_tests"], params={"seed": 0, "workers": resampling_workers},
+                    uses=[resampling_tests]))
+
+    # Moving averages, rolling slopes and the rolling emissions/temperature correlation per region.
+    graph.add(Stage("rolling_trends", rolling_trends, inputs={"data": "df_combined"}, outputs=["rolling_trends"],
+                    params={"window": DEFAULT_WINDOW, "group": "Region"}))
+
+    # Lagged emissions/temperature correlations per country and region, and the correlations of
+    # the countries' temperature series with each other.
+    from crosscorr import DEFAULT_MAX_LAG, correlation_matrix, cross_correlations, lagged_crosscorr
+    first_combined, second_combined = (f"combined_{key}" for key in config["comparison"])
+    graph.add(Stage("cross_correlations", cross_correlations,
+                    inputs={"combined_a": first_combined, "combined_b": second_combined, "df_combined": "df_combined"},
+                    outputs=["cross_correlations"], params={"max_lag": DEFAULT_MAX_LAG}, uses=[lagged_crosscorr]))
+    graph.add(Stage("entity_correlations", entity_correlations,
+                    inputs={"combined_a": first_combined, "combined_b": second_combined},
+                    outputs=["entity_correlations"], uses=[correlation_matrix]))
+
+    if dashboard:
+        # Render all figures into one interactive HTML page (plotly is only imported in this mode).
+        from dashboard import build_country_panel, build_dashboard, build_scatter_panel, build_trendline_panel, lttb
+        dashboard_file = os.path.join(save_directory, "dashboard.html")
+        graph.add(Stage("render_dashboard", render_dashboard,
+                        inputs={"combined_a": first_combined, "combined_b": second_combined, "df_combined": "df_combined"},
+                        outputs=["dashboard_report"],
+                        params={"output_file": dashboard_file, "countries_a": first["countries"], "title_a": first["title"],
+                                "countries_b": second["countries"], "title_b": second["title"]},
+                        uses=[build_dashboard, build_country_panel, build_scatter_panel, build_trendline_panel, lttb,
+                              fit_best_line, fit_trendlines],
+                        files=[dashboard_file]))
+    else:
+        # Build the figures (their traces and layouts) and export them together.
+        graph.add(Stage("figure_temperature_by_region", build_temperature_by_region_figure,
+                        inputs={"temp_data_na": first_combined, "temp_data_sa": second_combined},
+                        outputs=["temperature_large_graph"],
+                        params={"countries_na": first["countries"], "region_na": first["title"],
+                                "countries_sa": second["countries"], "region_sa": second["title"]}))
+        graph.add(Stage("figure_emissions_by_country", build_emissions_by_country_figure,
+                        inputs={"emissions_data_na": first_combined, "emissions_data_sa": second_combined},
+                        outputs=["co2_emissions_large_graph"],
+                        params={"countries_na": first["countries"], "region_na": first["title"],
+                                "countries_sa": second["countries"], "region_sa": second["title"]}))
+        graph.add(Stage("figure_temperature_vs_emissions", build_temperature_vs_emissions_figure,
+                        inputs=["df_combined"], outputs=["temperature_vs_emissions"]))
+        graph.add(Stage("figure_temperature_trendlines", build_temperature_with_trendlines_figure,
+                        inputs={"df_combined": "df_combined", "p_values_df": "p_values"},
+                        outputs=["temperature_trendlines"]))
+
+        # Export all figures concurrently through the pool of renderer processes.
+        figures = {
+            "temperature_large_graph": (None, None),
+            "co2_emissions_large_graph": (None, None),
+            "temperature_vs_emissions": (1000, 600),
+            "temperature_trendlines": (1600, 800),
+        }
+        outputs = {
+            name: (os.path.join(save_directory, f"{name}.pdf"), width, height)
+            for name, (width, height) in figures.items()
+        }
+        graph.add(Stage("render_figures", render_figures, inputs=list(figures),
+                        params={"outputs": outputs, "formats": list(formats), "workers": render_workers},
+                        uses=[FigureSpec, export_figures],
+                        files=[os.path.join(save_directory, f"{name}.{fmt}") for name in figures for fmt in formats]))
+
+    # Save datasets in the relative directory.
+    names = ["df_combined", "region_summaries", "rolling_trends", "resampling_tests", "cross_correlations",
+             "entity_correlations"] + [group["output"] for group in groups.values() if "output" in group]
+    graph.add(Stage("save_datasets", save_datasets, inputs=names,
+                    params={"save_directory": save_directory, "output_format": output_format,
+                            "compression": compression, "workers": output_workers},
+                    uses=[write_artifacts],
+                    files=[os.path.join(save_directory, output_file(name, output_format, compression)) for name in names]))
+
+    return graph
+
+def update_incremental(regions_file=None, directory=None, output_format="csv", compression=None):
+    """
+    Updates the results incrementally: only the years with new, changed or removed
+    (Entity, Year) keys since the previous update are aggregated again, the regressions are
+    updated from maintained sufficient statistics, and new years are appended to the outputs;
+    every write is atomic and recorded in the manifest (see incremental.py). The figures are
+    not rendered in this mode.
+
+    Parameters:
+        regions_file (str): Region definition file (JSON or YAML, default: project/regions.json).
+        directory (str): Directory of the incremental state (default: project/data/incremental).
+        output_format (str): Format of the saved datasets ("csv" or "parquet").
+        compression (str): Compression of the saved datasets (None, "gzip" or "zstd").
+
+    Returns:
+        dict: The update (see incremental.IncrementalUpdater.update()).
+    """
+    save_directory = os.path.join(os.path.dirname(__file__), "data")
+    os.makedirs(save_directory, exist_ok=True)
+    config = load_region_groups(regions_file)
+    groups = config["groups"]
+
+    # Fetch and merge the data of all member countries (the download cache keeps this cheap).
+    emissions_data, temperature_data = fetch_data()
+    temperature_index, emissions_index = index_datasets(transform_temperature_yearly(temperature_data), emissions_data)
+    combined = combine_region_indexed(temperature_index, emissions_index, member_countries(groups))
+
+    update = IncrementalUpdater(directory).update(combined, groups)
+    files = write_outputs(save_directory, update, groups, config["comparison"], output_format, compression)
+
+    changes = update["changes"]["change"].value_counts()
+    print(("Rebuilt" if update["full"] else "Updated") + " the region summaries: "
+          + ", ".join(f"{changes.get(kind, 0)} {kind}" for kind in ("added", "changed", "removed"))
+          + f" (Entity, Year) keys, {update['added']['Year'].nunique()} year(s) aggregated.")
+    for name, result in files.items():
+        print(f"  {output_file(name, output_format, compression)}: {result}")
+
+    # Display the regression results of the compared groups.
+    labels = [groups[key]["label"] for key in config["comparison"]]
     print("\nP-values and regression results:")
-    print(p_values_df)
+    print(update["p_values"][update["p_values"]["Region"].isin(labels)].reset_index(drop=True))
+    return update
 
-    plot_temperature_with_trendlines(
-        df_combined, p_values_df,
-        os.path.join(save_directory, "temperature_trendlines.pdf")
-    )
+def run_partitioned(regions_file=None, by="entity", partitions=None, memory_budget=None,
+                    workers=None, directory=None):
+    """
+    Computes the monthly temperature and emissions summaries of all region groups out of core
+    (see partitioned.py): the monthly temperatures and the emissions are split into partitions
+    on disk, and every partition is filtered and merged (filter_data(), merge_datasets()) and
+    reduced on its own, in parallel within the memory budget. The result is saved as
+    monthly_region_summaries.csv; the figures are not rendered in this mode.
+
+    Parameters:
+        regions_file (str): Region definition file (JSON or YAML, default: project/regions.json).
+        by (str): "entity" (hash partitions) or "year" (year-range partitions).
+        partitions (int): Number of partitions (default: planned from the memory budget).
+        memory_budget (int): Memory budget in bytes, shared by the workers
+                             (default: partitioned.DEFAULT_MEMORY_BUDGET).
+        workers (int): Number of worker processes (default: one per CPU; 0 runs serially).
+        directory (str): Directory for the partition files (default: a temporary directory).
+
+    Returns:
+        DataFrame: The monthly summaries of the region groups.
+    """
+    from partitioned import DEFAULT_MEMORY_BUDGET, partitioned_monthly_summaries
+    if memory_budget is None:
+        memory_budget = DEFAULT_MEMORY_BUDGET
+    save_directory = os.path.join(os.path.dirname(__file__), "data")
+    os.makedirs(save_directory, exist_ok=True)
+    groups = load_region_groups(regions_file)["groups"]
+
+    files = fetch_source_files()
+    summaries, report = partitioned_monthly_summaries(
+        files["temperature"]["path"], files["emissions"]["path"], groups, by=by, partitions=partitions,
+        memory_budget=memory_budget, workers=workers, directory=directory)
+    write_artifacts(save_directory, {"monthly_region_summaries": summaries})
+
+    print(f"Processed {report['partitions']} {by} partition(s): {report['temperature_rows']} monthly temperature "
+          f"and {report['emissions_rows']} emissions rows, {report['merged_rows']} merged rows.")
+    print(f"Largest partition in memory: {report['max_partition_bytes'] / 1024 / 1024:.1f} MB "
+          f"(budget per worker: {report['worker_budget_bytes'] / 1024 / 1024:.1f} MB).")
+    print(f"Saved monthly_region_summaries.csv ({len(summaries)} rows) to '{save_directory}'.")
+    return summaries
+
+def main(targets=None, force=(), from_snapshot=False, formats=DEFAULT_FORMATS, render_workers=None,
+         streaming=False, chunksize=DEFAULT_CHUNKSIZE, regions_file=None, profile=None, region_workers=None,
+         backend="pandas", dashboard=False, output_format="csv", compression=None, output_workers=None,
+         resampling_workers=0):
+    """
+    Runs the pipeline as a graph of stages, skipping every stage whose code, parameters
+    and inputs are unchanged since the previous run.
+
+    Parameters:
+        targets (list): Names of the stages to run together with their dependencies (default: all stages).
+        force (list): Names of stages to re-run even if they are up to date.
+        from_snapshot (bool): Reuse the datasets stored in the snapshot store by a previous run
+                              instead of downloading and re-parsing the CSV sources.
+        formats (list): Formats in which every figure is exported.
+        render_workers (int): Number of renderer processes used to export the figures.
+        streaming (bool): Read the sources in chunks, keeping only the rows of the analysed regions.
+        chunksize (int): Number of CSV rows parsed per chunk in streaming mode.
+        regions_file (str): Region definition file (JSON or YAML, default: project/regions.json).
+        profile (str): Directory for a profiling report and a Chrome trace of this run (default: no profiling).
+        region_workers (int): Number of processes the region groups are fanned out to (default: single reduction).
+        backend (str): "pandas" (eager DataFrames) or "lazy" (Arrow query plans, see lazy_backend.py).
+        dashboard (bool): Render one interactive HTML dashboard instead of the static figure exports.
+        output_format (str): Format of the saved datasets ("csv" or "parquet").
+        compression (str): Compression of the saved datasets (None, "gzip" or "zstd").
+        output_workers (int): Number of threads writing the datasets.
+        resampling_workers (int): Number of processes running the resampling tests (default: serially).
+
+    Returns:
+        dict: The names of the executed and the skipped stages.
+    """
+    save_directory = os.path.join(os.path.dirname(__file__), "data")
+
+    # Sicherstellen, dass das Speicherverzeichnis existiert
+    os.makedirs(save_directory, exist_ok=True)
 
-    # Save datasets in the relative directory
-    df_combined.to_csv(os.path.join(save_directory, 'df_combined.csv'), index=False)
-    yearly_summarysouth.to_csv(os.path.join(save_directory, 'yearly_summarysouth.csv'), index=False)
-    yearly_summarynorden.to_csv(os.path.join(save_directory, 'yearly_summarynorden.csv'), index=False)
+    graph = build_stage_graph(save_directory, from_snapshot=from_snapshot,
+                              formats=formats, render_workers=render_workers,
+                              streaming=streaming, chunksize=chunksize, regions_file=regions_file,
+                              region_workers=region_workers, backend=backend, dashboard=dashboard,
+                              output_format=output_format, compression=compression, output_workers=output_workers,
+                              resampling_workers=resampling_workers)
+
+    if profile is None:
+        result = graph.run(targets, force=force)
+    else:
+        # Measure every stage and every instrumented function, then write the report and the trace.
+        with Profiler() as profiler:
+            graph.profiler = profiler
+            result = graph.run(targets, force=force)
+        profiler.print_summary()
+        report_path, trace_path = profile_paths(profile)
+        profiler.write_report(report_path)
+        profiler.write_trace(trace_path)
+        print(f"\nProfile written to '{report_path}' (trace: '{trace_path}').")
+
+    if "p_values" in result["executed"] + result["skipped"]:
+        # Display the resulting p-values and regression results
+        print("\nP-values and regression results:")
+        print(graph.load("p_values"))
+
+    # Report how many results and rendered files were reused from the memo cache.
+    stats = default_cache().stats()
+    print(f"\nMemo cache: {stats['hits']} hits, {stats['misses']} misses "
+          f"({stats['entries']} entries, {stats['bytes'] / 1024 / 1024:.1f} MB).")
+
+    return result
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    from partitioned import DEFAULT_MEMORY_BUDGET
+    parser = argparse.ArgumentParser(description="CO2 emissions and temperature pipeline for the Americas.")
+    parser.add_argument("--stage", action="append", dest="stages", metavar="NAME",
+                        help="run only this stage and its dependencies (repeatable)")
+    parser.add_argument("--invalidate", action="append", default=[], metavar="NAME",
+                        help="force this stage to run even if it is up to date (repeatable)")
+    parser.add_argument("--formats", default=",".join(DEFAULT_FORMATS),
+                        help="comma-separated figure formats, e.g. pdf,png,svg,html (default: %(default)s)")
+    parser.add_argument("--render-workers", type=int, default=None, metavar="N",
+                        help="number of renderer processes for the figure export (0 renders serially)")
+    parser.add_argument("--streaming", action="store_true",
+                        help="read the sources in chunks and keep only the analysed countries (bounded memory)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, metavar="ROWS",
+                        help="number of CSV rows per chunk in streaming mode (default: %(default)s)")
+    parser.add_argument("--regions", default=None, metavar="FILE",
+                        help="region definition file (JSON or YAML, default: regions.json next to this script)")
+    parser.add_argument("--region-workers", type=int, default=None, metavar="N",
+                        help="fan the region groups out across N processes (0 runs them serially per group)")
+    parser.add_argument("--resampling-workers", type=int, default=0, metavar="N",
+                        help="run the resampling tests across N processes (default: serially)")
+    parser.add_argument("--backend", choices=["pandas", "lazy"], default="pandas",
+                        help="run the transform chain eagerly with pandas or as lazy, multi-threaded Arrow "
+                             "query plans with the filters pushed down into the CSV scans (default: %(default)s)")
+    parser.add_argument("--dashboard", action="store_true",
+                        help="render one interactive HTML dashboard (WebGL, downsampled lines) to data/dashboard.html "
+                             "instead of exporting the figures")
+    parser.add_argument("--output-format", choices=["csv", "parquet"], default="csv",
+                        help="format of the saved datasets (default: %(default)s)")
+    parser.add_argument("--compression", choices=["none", "gzip", "zstd"], default="none",
+                        help="compression of the saved datasets (default: %(default)s)")
+    parser.add_argument("--output-workers", type=int, default=None, metavar="N",
+                        help="number of threads writing the datasets (default: one per dataset, at most 8)")
+    parser.add_argument("--profile", nargs="?", const=os.path.join(os.path.dirname(__file__), "data", "profiles"),
+                        default=None, metavar="DIR",
+                        help="write a profiling report and a Chrome trace of the run (default DIR: data/profiles)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only aggregate the years that changed since the previous incremental run "
+                             "and append them to the results atomically (no figures)")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="join the monthly temperatures with the emissions out of core, in partitions on disk, "
+                             "and save the monthly region summaries (no figures)")
+    parser.add_argument("--partition-by", choices=["entity", "year"], default="entity",
+                        help="split the data by entity hash or by year range in partitioned mode (default: %(default)s)")
+    parser.add_argument("--partitions", type=int, default=None, metavar="N",
+                        help="number of partitions (default: planned from the memory budget)")
+    parser.add_argument("--memory-budget", type=int, default=DEFAULT_MEMORY_BUDGET // (1024 * 1024), metavar="MB",
+                        help="memory budget of the partitioned mode, shared by the workers (default: %(default)s)")
+    parser.add_argument("--list", action="store_true", help="list the stages in execution order and exit")
+    parser.add_argument("--from-snapshot", action="store_true",
+                        help="reuse the snapshot store of a previous run instead of fetching the sources")
+    args = parser.parse_args()
+
+    if args.list:
+        save_directory = os.path.join(os.path.dirname(__file__), "data")
+        for name in build_stage_graph(save_directory, regions_file=args.regions,
+                                      backend=args.backend, dashboard=args.dashboard).dependencies():
+            print(name)
+    elif args.incremental:
+        update_incremental(regions_file=args.regions, output_format=args.output_format,
+                           compression=None if args.compression == "none" else args.compression)
+    elif args.partitioned:
+        run_partitioned(regions_file=args.regions, by=args.partition_by, partitions=args.partitions,
+                        memory_budget=args.memory_budget * 1024 * 1024, workers=args.region_workers)
+    else:
+        main(targets=args.stages, force=args.invalidate, from_snapshot=args.from_snapshot,
+             formats=args.formats.split(","), render_workers=args.render_workers,
+             streaming=args.streaming, chunksize=args.chunksize, regions_file=args.regions,
+             profile=args.profile, region_workers=args.region_workers, backend=args.backend,
+             dashboard=args.dashboard, output_format=args.output_format,
+             compression=None if args.compression == "none" else args.compression, output_workers=args.output_workers,
+             resampling_workers=args.resampling_workers)
@@ -0,0 +1,252 @@
+import functools
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+# The profiler that pipeline functions decorated with @profiled currently report to (None: profiling is off).
+_ACTIVE = None
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the process in MB (None if it cannot be determined).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def count_rows(value):
+    """
+    Counts the rows of the DataFrames/Series in a value (also inside tuples, lists and dicts).
+
+    Returns:
+        int: The total number of rows, or None if the value holds no tabular data.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (tuple, list)):
+        counts = [count for count in map(count_rows, value) if count is not None]
+        return sum(counts) if counts else None
+    return None
+
+
+class Profiler:
+    """
+    Records the wall time, CPU time, peak RSS, tracemalloc allocations and rows in/out of the
+    pipeline stages and of the functions decorated with @profiled.
+
+    Spans may nest (a stage calling decorated functions); every span reports its own values,
+    so the report and the trace show where inside a stage the time and memory go.
+
+    Parameters:
+        trace_memory (bool): Track Python allocations with tracemalloc (slows down allocation-heavy code).
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.spans = []
+        self.open_spans = []
+        self.started_at = None
+        self.origin = None
+        self.lock = threading.Lock()
+        self._started_tracemalloc = False
+
+    def start(self):
+        """
+        Starts profiling and makes this profiler the target of the @profiled functions.
+        """
+        global _ACTIVE
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.origin = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        _ACTIVE = self
+        return self
+
+    def stop(self):
+        """
+        Stops profiling (the recorded spans are kept).
+        """
+        global _ACTIVE
+        if _ACTIVE is self:
+            _ACTIVE = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _fold_peak(self):
+        # Carry the tracemalloc peak over into every open span before it is reset.
+        peak = tracemalloc.get_traced_memory()[1]
+        for span in self.open_spans:
+            span["_peak"] = max(span["_peak"], peak)
+
+    @contextmanager
+    def measure(self, name, kind="stage", inputs=None):
+        """
+        Measures a block of code as one span.
+
+        Parameters:
+            name (str): Name of the stage or function.
+            kind (str): "stage" or "function".
+            inputs: The inputs of the block (their rows are counted as rows_in).
+
+        Yields:
+            dict: The span; set span["rows_out"] (e.g., with count_rows()) inside the block.
+        """
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        span = {
+            "name": name,
+            "kind": kind,
+            "depth": len(self.open_spans),
+            "thread": threading.get_ident(),
+            "start": time.perf_counter() - (self.origin or time.perf_counter()),
+            "rows_in": count_rows(inputs) if inputs is not None else None,
+            "rows_out": None,
+        }
+        if tracing:
+            self._fold_peak()
+            span["_start_memory"] = tracemalloc.get_traced_memory()[0]
+            span["_peak"] = span["_start_memory"]
+            tracemalloc.reset_peak()
+
+        self.open_spans.append(span)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield span
+        finally:
+            span["wall_seconds"] = time.perf_counter() - wall_start
+            span["cpu_seconds"] = time.process_time() - cpu_start
+            span["peak_rss_mb"] = peak_rss_mb()
+            if tracing and tracemalloc.is_tracing():
+                self._fold_peak()
+                megabyte = 1024 * 1024
+                span["alloc_delta_mb"] = (tracemalloc.get_traced_memory()[0] - span["_start_memory"]) / megabyte
+                span["alloc_peak_mb"] = (span["_peak"] - span["_start_memory"]) / megabyte
+            for key in ("_start_memory", "_peak"):
+                span.pop(key, None)
+            self.open_spans.remove(span)
+            with self.lock:
+                self.spans.append(span)
+
+    def skip(self, name):
+        """
+        Records a stage that was skipped because it was up to date.
+        """
+        with self.lock:
+            self.spans.append({"name": name, "kind": "stage", "skipped": True})
+
+    def report(self):
+        """
+        Returns the machine-readable run report.
+
+        Returns:
+            dict: Run metadata and the spans in the order they finished (skipped stages included).
+        """
+        return {
+            "started_at": self.started_at,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "total_seconds": time.perf_counter() - self.origin if self.origin is not None else None,
+            "peak_rss_mb": peak_rss_mb(),
+            "spans": self.spans,
+        }
+
+    def write_report(self, path):
+        """
+        Writes the run report (see report()) as a JSON file.
+        """
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump(self.report(), handle, indent=2)
+
+    def write_trace(self, path):
+        """
+        Writes the spans in the Chrome trace event format (open it in chrome://tracing,
+        ui.perfetto.dev or speedscope).
+        """
+        events = []
+        for span in self.spans:
+            if span.get("skipped"):
+                continue
+            args = {key: value for key, value in span.items()
+                    if key not in ("name", "kind", "thread", "start", "wall_seconds", "depth")}
+            events.append({
+                "name": span["name"],
+                "cat": span["kind"],
+                "ph": "X",  # A complete event with a start time and a duration.
+                "ts": span["start"] * 1e6,
+                "dur": span["wall_seconds"] * 1e6,
+                "pid": os.getpid(),
+                "tid": span["thread"],
+                "args": args,
+            })
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, handle)
+
+    def print_summary(self):
+        """
+        Prints the wall time, CPU time, allocation peak and rows of every stage.
+        """
+        print(f"\n{'stage':<34} {'wall s':>8} {'cpu s':>8} {'alloc MB':>9} {'rows in':>9} {'rows out':>9}")
+        for span in self.spans:
+            if span["kind"] != "stage" or span.get("skipped"):
+                continue
+            alloc = span.get("alloc_peak_mb")
+            print(f"{span['name']:<34} {span['wall_seconds']:8.3f} {span['cpu_seconds']:8.3f} "
+                  f"{'' if alloc is None else f'{alloc:9.1f}':>9} "
+                  f"{'' if span['rows_in'] is None else span['rows_in']:>9} "
+                  f"{'' if span['rows_out'] is None else span['rows_out']:>9}")
+
+
+def profiled(func):
+    """
+    Decorator that records every call of a pipeline function as a span of the active profiler.
+    Without an active profiler the function is called directly.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = _ACTIVE
+        if profiler is None:
+            return func(*args, **kwargs)
+        with profiler.measure(func.__name__, kind="function", inputs=list(args) + list(kwargs.values())) as span:
+            result = func(*args, **kwargs)
+            span["rows_out"] = count_rows(result)
+        return result
+    return wrapper
+
+
+def profile_paths(directory):
+    """
+    Returns the report and trace paths of a new profiled run (named by the current time,
+    so the reports of successive runs can be compared).
+    """
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return (os.path.join(directory, f"profile-{stamp}.json"),
+            os.path.join(directory, f"profile-{stamp}.trace.json"))
@@ -0,0 +1,117 @@
+import json
+import os
+
+import pandas as pd
+
+# Default region definition file (next to the pipeline script).
+DEFAULT_REGIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "regions.json")
+
+
+def load_region_groups(path=None):
+    """
+    Loads the region definitions from a JSON (or, if PyYAML is installed, YAML) file.
+
+    The file holds a "groups" mapping from group key to its definition (a "label" stored in the
+    "Region" column, a list of "countries", and optionally a figure "title" and the name of an
+    "output" CSV file) and a "comparison" list naming the two groups compared in the figures.
+    A country may belong to any number of groups.
+
+    Parameters:
+        path (str): Path of the region definition file (default: project/regions.json).
+
+    Returns:
+        dict: The region definitions with the keys "groups" and "comparison".
+    """
+    path = path or DEFAULT_REGIONS_FILE
+    with open(path, "r", encoding="utf-8") as handle:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError as error:
+                raise ImportError("Reading YAML region definitions requires PyYAML (pip install pyyaml).") from error
+            config = yaml.safe_load(handle)
+        else:
+            config = json.load(handle)
+
+    groups = config.get("groups", {})
+    for key, group in groups.items():
+        if not group.get("countries"):
+            raise ValueError(f"Region group '{key}' has no countries.")
+        group.setdefault("label", key)
+        group.setdefault("title", group["label"])
+
+    comparison = config.get("comparison", list(groups)[:2])
+    for key in comparison:
+        if key not in groups:
+            raise ValueError(f"The comparison refers to the unknown region group '{key}'.")
+
+    return {"groups": groups, "comparison": comparison}
+
+
+def member_countries(groups):
+    """
+    Returns all countries that belong to at least one group, in order of first appearance.
+    """
+    countries = []
+    for group in groups.values():
+        countries.extend(country for country in group["countries"] if country not in countries)
+    return countries
+
+
+def membership_table(groups):
+    """
+    Maps every country to the groups it belongs to (one row per membership).
+
+    Parameters:
+        groups (dict): The region groups (see load_region_groups()).
+
+    Returns:
+        DataFrame: The columns "Entity", "Group" (the position of the group in the definitions)
+                   and "Region" (the group label).
+    """
+    rows = [
+        (country, position, group["label"])
+        for position, group in enumerate(groups.values())
+        for country in dict.fromkeys(group["countries"])
+    ]
+    return pd.DataFrame(rows, columns=["Entity", "Group", "Region"])
+
+
+def aggregate_region_groups(combined_data, groups):
+    """
+    Computes the yearly mean temperature and the yearly total emissions of every region group
+    in a single grouped reduction.
+
+    The merged country data is joined once with the membership table (so a country in several
+    groups contributes to each of them) and reduced by (group, year), instead of running one
+    filter + merge + groupby pipeline per group.
+
+    Parameters:
+        combined_data (DataFrame): Merged temperature and emissions data per country and year
+                                   (columns "Entity", "Year", "Temperature", "emissions_total").
+        groups (dict): The region groups (see load_region_groups()).
+
+    Returns:
+        DataFrame: The columns "Year", "Temperature", "emissions_total" and "Region", ordered
+                   by the group order of the definitions and by year.
+    """
+    membership = membership_table(groups)
+    data = combined_data[["Entity", "Year", "Temperature", "emissions_total"]].copy()
+    data["Entity"] = data["Entity"].astype(str)
+    expanded = data.merge(membership, on="Entity", how="inner")
+
+    summaries = expanded.groupby(["Group", "Year"]).agg({
+        "Temperature": "mean",  # Average temperature of the group's countries within each year.
+        "emissions_total": "sum",  # Total emissions of the group's countries within each year.
+    }).reset_index()
+
+    labels = [group["label"] for group in groups.values()]
+    summaries["Region"] = [labels[position] for position in summaries["Group"]]
+    return summaries.drop(columns=["Group"])
+
+
+def select_region(summaries, label):
+    """
+    Returns the yearly summary of one group from the output of aggregate_region_groups().
+    """
+    return summaries[summaries["Region"] == label].reset_index(drop=True)
@@ -0,0 +1,209 @@
+from math import comb
+
+import numpy as np
+import pandas as pd
+
+# Small constant scipy.stats.linregress adds to avoid dividing by zero for perfect fits.
+TINY = 1.0e-20
+
+
+def factorize_groups(groups):
+    """
+    Maps group labels to integer codes in order of first appearance.
+
+    Parameters:
+        groups (array-like): The group label of every row.
+
+    Returns:
+        tuple: (codes, labels) where codes[i] is the position of row i's label in labels.
+    """
+    codes, labels = pd.factorize(np.asarray(groups), sort=False)
+    if (codes < 0).any():
+        raise ValueError("Group labels must not be missing.")
+    return codes, labels
+
+
+def _segment_sum(codes, values, size):
+    """
+    Sums values per group code (a segment sum over unsorted codes).
+    """
+    return np.bincount(codes, weights=values, minlength=size)
+
+
+def grouped_linregress(groups, x, y):
+    """
+    Computes an ordinary least-squares regression of y on x for every group in a single pass.
+
+    The per-group sums are accumulated with segment sums over the group codes, so the cost is
+    linear in the number of rows regardless of the number of groups. The results follow
+    scipy.stats.linregress (two-sided p-value of the slope under the t-distribution).
+
+    Parameters:
+        groups (array-like): The group label of every row (e.g., df["Region"] or df["Entity"]).
+        x (array-like): The independent variable.
+        y (array-like): The dependent variable.
+
+    Returns:
+        DataFrame: One row per group (indexed by the group label, in order of first appearance)
+                   with the columns "n", "slope", "intercept", "rvalue", "r_squared", "pvalue",
+                   "stderr" and "intercept_stderr". Groups with fewer than three points or
+                   constant x get NaN for the undefined statistics.
+    """
+    codes, labels = factorize_groups(groups)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    size = len(labels)
+
+    # First pass: group sizes and means.
+    n = np.bincount(codes, minlength=size).astype(np.float64)
+    x_mean = _segment_sum(codes, x, size) / n
+    y_mean = _segment_sum(codes, y, size) / n
+
+    # Second pass: centred sums of squares and cross products (numerically stable).
+    dx = x - x_mean[codes]
+    dy = y - y_mean[codes]
+    sxx = _segment_sum(codes, dx * dx, size)
+    syy = _segment_sum(codes, dy * dy, size)
+    sxy = _segment_sum(codes, dx * dy, size)
+
+    return _regression_statistics(n, x_mean, y_mean, sxx, syy, sxy, pd.Index(labels, name="group"))
+
+
+def linregress_from_sums(n, sum_x, sum_y, sum_xy, sum_xx, sum_yy, index=None):
+    """
+    Computes the regressions of grouped_linregress() from maintained sufficient statistics
+    instead of the rows, so they can be updated when rows are added or replaced.
+
+    The arguments are arrays with one value per group: the number of points and the sums of x,
+    y, x*y, x^2 and y^2. To keep the centred sums accurate, x should be shifted close to its
+    mean (e.g., years relative to a fixed origin year); the intercept is then relative to it.
+
+    Parameters:
+        n, sum_x, sum_y, sum_xy, sum_xx, sum_yy (array-like): The sums of every group.
+        index (Index): Labels of the groups (default: a range index).
+
+    Returns:
+        DataFrame: The same columns as grouped_linregress().
+    """
+    n, sum_x, sum_y, sum_xy, sum_xx, sum_yy = (
+        np.asarray(values, dtype=np.float64) for values in (n, sum_x, sum_y, sum_xy, sum_xx, sum_yy)
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_mean = sum_x / n
+        y_mean = sum_y / n
+    # Centred sums of squares and cross products (clipped at 0 against rounding).
+    sxx = np.maximum(sum_xx - n * x_mean * x_mean, 0.0)
+    syy = np.maximum(sum_yy - n * y_mean * y_mean, 0.0)
+    sxy = sum_xy - n * x_mean * y_mean
+    return _regression_statistics(n, x_mean, y_mean, sxx, syy, sxy, index)
+
+
+def _regression_statistics(n, x_mean, y_mean, sxx, syy, sxy, index):
+    """
+    Derives the regression statistics from the means and the centred sums of every group.
+    """
+    # scipy.stats is imported on first use: it dominates the start-up time of the CLI (see cli.py).
+    from scipy.stats import t as t_distribution
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = sxy / sxx
+        intercept = y_mean - slope * x_mean
+
+        r = sxy / np.sqrt(sxx * syy)
+        r = np.where(syy == 0, 0.0, np.clip(r, -1.0, 1.0))
+
+        df = n - 2
+        t_stat = r * np.sqrt(df / ((1.0 - r + TINY) * (1.0 + r + TINY)))
+        p_value = 2 * t_distribution.sf(np.abs(t_stat), df)
+
+        stderr = np.sqrt((1 - r ** 2) * syy / sxx / df)
+        intercept_stderr = stderr * np.sqrt(sxx / n + x_mean ** 2)
+
+    undefined = (df <= 0) | (sxx == 0)
+    for values in (p_value, stderr, intercept_stderr):
+        values[undefined] = np.nan
+
+    return pd.DataFrame({
+        "n": n.astype(np.int64),
+        "slope": slope,
+        "intercept": intercept,
+        "rvalue": r,
+        "r_squared": r ** 2,
+        "pvalue": p_value,
+        "stderr": stderr,
+        "intercept_stderr": intercept_stderr,
+    }, index=index)
+
+
+def grouped_polyfit(groups, x, y, deg):
+    """
+    Fits a least-squares polynomial of degree deg to every group in a single pass.
+
+    x is centred and scaled per group before the fit, so the normal equations stay well
+    conditioned even for large x such as years. The power sums of every group are accumulated
+    with segment sums and the (deg + 1) x (deg + 1) systems of all groups are solved at once.
+
+    Parameters:
+        groups (array-like): The group label of every row.
+        x (array-like): The independent variable.
+        y (array-like): The dependent variable.
+        deg (int): Degree of the polynomial.
+
+    Returns:
+        tuple: A tuple containing:
+            - coefficients: DataFrame indexed by group with the polynomial coefficients in raw x,
+                            highest power first (like np.polyfit), in the columns "c<deg>".."c0".
+            - fitted: ndarray with the value of the group's polynomial at every row.
+            Groups with fewer than deg + 1 points get NaN coefficients and fitted values.
+    """
+    codes, labels = factorize_groups(groups)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    size = len(labels)
+
+    # Centre and scale x per group to [-1, 1].
+    n = np.bincount(codes, minlength=size).astype(np.float64)
+    centre = _segment_sum(codes, x, size) / n
+    dx = x - centre[codes]
+    scale = np.zeros(size)
+    np.maximum.at(scale, codes, np.abs(dx))
+    scale[scale == 0] = 1.0
+    xs = dx / scale[codes]
+
+    # Power sums sum(xs^p) for p = 0..2*deg and moments sum(xs^p * y) for p = 0..deg.
+    powers = [np.ones_like(xs)]
+    for _ in range(2 * deg):
+        powers.append(powers[-1] * xs)
+    power_sums = np.stack([_segment_sum(codes, power, size) for power in powers], axis=1)
+    moments = np.stack([_segment_sum(codes, powers[p] * y, size) for p in range(deg + 1)], axis=1)
+
+    # Normal equations A c = b per group, A[j, k] = sum(xs^(j+k)) (a Hankel matrix).
+    index = np.add.outer(np.arange(deg + 1), np.arange(deg + 1))
+    normal_matrices = power_sums[:, index]
+    solvable = n > deg
+    scaled = np.full((size, deg + 1), np.nan)
+    if solvable.any():
+        try:
+            scaled[solvable] = np.linalg.solve(normal_matrices[solvable], moments[solvable][..., None])[..., 0]
+        except np.linalg.LinAlgError:
+            # Some group has too few distinct x values: fall back to the least-squares solution.
+            scaled[solvable] = (np.linalg.pinv(normal_matrices[solvable]) @ moments[solvable][..., None])[..., 0]
+
+    # Evaluate the fitted values in the scaled coordinates (Horner's scheme).
+    fitted = np.zeros_like(xs)
+    for p in range(deg, -1, -1):
+        fitted = fitted * xs + scaled[codes, p]
+
+    # Convert the coefficients to raw x: ((x - m) / s)^j = sum_k C(j, k) x^k (-m)^(j-k) / s^j.
+    raw = np.zeros((size, deg + 1))
+    for j in range(deg + 1):
+        factor = scaled[:, j] / scale ** j
+        for k in range(j + 1):
+            raw[:, k] += factor * comb(j, k) * (-centre) ** (j - k)
+
+    coefficients = pd.DataFrame(
+        raw[:, ::-1],
+        columns=[f"c{p}" for p in range(deg, -1, -1)],
+        index=pd.Index(labels, name="group"),
+    )
+    return coefficients, fitted
@@ -0,0 +1,238 @@
+import atexit
+import copy
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from importlib import metadata
+
+from memo import default_cache, fingerprint
+
+# Formats written by default and formats that need an image renderer (Kaleido).
+DEFAULT_FORMATS = ("pdf",)
+IMAGE_FORMATS = ("pdf", "png", "svg", "jpeg", "webp")
+
+# Reusable pool of renderer processes (created on first use, see get_pool()).
+_POOL = None
+_POOL_WORKERS = None
+
+
+class FigureSpec:
+    """
+    A figure ready for export: the serialized Plotly figure plus where and how to write it.
+
+    Building the figure (the Plotly traces and layout) is separated from exporting it, so
+    all figures of a run can be built first and then exported together by export_figures().
+
+    Parameters:
+        name (str): Name of the figure (used in the timing report).
+        figure (Figure or str): The Plotly figure or its JSON representation.
+        output_file (str): Output path. The extension is replaced by the format when several
+                           formats are written.
+        width (int): Width of exported images in pixels (default: the figure's layout).
+        height (int): Height of exported images in pixels (default: the figure's layout).
+        formats (list): Formats to write, e.g. ["pdf", "png", "svg", "html"]
+                        (default: the extension of output_file).
+    """
+
+    def __init__(self, name, figure, output_file, width=None, height=None, formats=None):
+        self.name = name
+        self.figure_json = figure if isinstance(figure, str) else figure.to_json()
+        self.output_file = output_file
+        self.width = width
+        self.height = height
+        self.formats = list(formats) if formats else [os.path.splitext(output_file)[1].lstrip(".") or "pdf"]
+
+    def output_path(self, fmt):
+        """
+        Returns the output path of the figure for a format.
+        """
+        return os.path.splitext(self.output_file)[0] + "." + fmt
+
+    def output_paths(self):
+        """
+        Returns the output paths of all formats of the figure.
+        """
+        return [self.output_path(fmt) for fmt in self.formats]
+
+    def cache_key(self, fmt):
+        """
+        Returns the memo cache key of the exported file: the figure content, the format, the
+        image size and the renderer versions. The figure JSON is hashed with sorted keys, since
+        the key order of a figure's layout changes when the figure is pickled and loaded again.
+        """
+        canonical = json.dumps(json.loads(self.figure_json), sort_keys=True)
+        return fingerprint("figure", canonical, fmt, self.width, self.height, _renderer_versions())
+
+
+def _renderer_versions():
+    """
+    Returns the installed Plotly and Kaleido versions (a renderer update invalidates cached files).
+    """
+    versions = []
+    for package in ("plotly", "kaleido"):
+        try:
+            versions.append(metadata.version(package))
+        except metadata.PackageNotFoundError:
+            versions.append(None)
+    return tuple(versions)
+
+
+def _init_worker():
+    """
+    Starts a persistent Kaleido renderer in a worker process, so every export in the process
+    reuses the same browser instead of launching a new one (Kaleido v1; Kaleido 0.x keeps its
+    renderer alive per process on its own).
+    """
+    try:
+        import kaleido
+    except ImportError:
+        return
+    start_sync_server = getattr(kaleido, "start_sync_server", None)
+    if start_sync_server is not None:
+        try:
+            start_sync_server(silence_warnings=True)
+        except Exception:
+            # Without a persistent renderer every export starts its own (and reports its own errors).
+            pass
+
+
+def _export_spec(spec):
+    """
+    Exports one figure in all its formats and returns the timing of each export.
+    """
+    import plotly.io as pio
+
+    figure = pio.from_json(spec.figure_json, skip_invalid=True)
+    timings = []
+    for fmt in spec.formats:
+        path = spec.output_path(fmt)
+        # Written next to the target and renamed once complete, so no reader sees a partial figure.
+        tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{os.getpid()}.tmp")
+        start = time.perf_counter()
+        try:
+            if fmt == "html":
+                figure.write_html(tmp_path, include_plotlyjs="cdn")
+            elif fmt in IMAGE_FORMATS:
+                figure.write_image(tmp_path, format=fmt, width=spec.width, height=spec.height)
+            else:
+                raise ValueError(f"Unsupported figure format '{fmt}'.")
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        timings.append({
+            "figure": spec.name,
+            "format": fmt,
+            "path": path,
+            "seconds": time.perf_counter() - start,
+            "pid": os.getpid(),
+        })
+    return timings
+
+
+def get_pool(workers):
+    """
+    Returns the shared pool of renderer processes, (re)creating it if the worker count changed.
+
+    Parameters:
+        workers (int): Number of renderer processes.
+
+    Returns:
+        ProcessPoolExecutor: The renderer pool.
+    """
+    global _POOL, _POOL_WORKERS
+    if _POOL is None or _POOL_WORKERS != workers:
+        shutdown_pool()
+        _POOL = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        _POOL_WORKERS = workers
+    return _POOL
+
+
+def shutdown_pool():
+    """
+    Shuts down the shared pool of renderer processes (if it was started).
+    """
+    global _POOL, _POOL_WORKERS
+    if _POOL is not None:
+        _POOL.shutdown()
+    _POOL = None
+    _POOL_WORKERS = None
+
+
+atexit.register(shutdown_pool)
+
+
+def export_figures(specs, workers=None, formats=None, cache=None):
+    """
+    Exports figures concurrently through the pool of renderer processes.
+
+    Files whose figure, format and size are unchanged since an earlier export are copied from
+    the memo cache (see memo.py) instead of being rendered again.
+
+    Parameters:
+        specs (list): The FigureSpec objects to export.
+        workers (int): Number of renderer processes (default: one per figure to render, at most
+                       one per CPU). 0 exports all figures serially in the current process.
+        formats (list): Formats to write for every figure, overriding the formats of the specs.
+        cache (MemoCache): The cache of rendered files (default: memo.default_cache()).
+
+    Returns:
+        list: One timing record per written file with the keys "figure", "format", "path",
+              "seconds", "pid" and "cached", in the order of the specs.
+    """
+    specs = list(specs)
+    if formats:
+        for spec in specs:
+            spec.formats = list(formats)
+    if not specs:
+        return []
+    memo = cache or default_cache()
+
+    start = time.perf_counter()
+    # Restore the unchanged files from the cache and collect the formats that must be rendered.
+    timings = {}
+    pending = []
+    for index, spec in enumerate(specs):
+        missing = []
+        for fmt in spec.formats:
+            restore_start = time.perf_counter()
+            if memo.restore_file(spec.cache_key(fmt), spec.output_path(fmt)):
+                timings[index, fmt] = {
+                    "figure": spec.name,
+                    "format": fmt,
+                    "path": spec.output_path(fmt),
+                    "seconds": time.perf_counter() - restore_start,
+                    "pid": os.getpid(),
+                    "cached": True,
+                }
+            else:
+                missing.append(fmt)
+        if missing:
+            render_spec = copy.copy(spec)
+            render_spec.formats = missing
+            pending.append((index, render_spec))
+
+    if workers is None:
+        workers = min(len(pending), os.cpu_count() or 1)
+
+    render_specs = [spec for _, spec in pending]
+    if workers == 0 or not pending:
+        results = [_export_spec(spec) for spec in render_specs]
+    else:
+        results = list(get_pool(workers).map(_export_spec, render_specs))
+    for (index, spec), result in zip(pending, results):
+        for timing in result:
+            memo.store_file(spec.cache_key(timing["format"]), timing["path"])
+            timings[index, timing["format"]] = dict(timing, cached=False)
+    timings = [timings[index, fmt] for index, spec in enumerate(specs) for fmt in spec.formats]
+
+    # Report the render time of every figure and the total wall-clock time.
+    for timing in timings:
+        if timing["cached"]:
+            print(f"Reused '{timing['figure']}' as {timing['format']} from the memo cache -> '{timing['path']}'.")
+        else:
+            print(f"Rendered '{timing['figure']}' as {timing['format']} in {timing['seconds']:.2f}s -> '{timing['path']}'.")
+    print(f"Exported {len(timings)} files ({len(timings) - sum(len(spec.formats) for spec in render_specs)} from the "
+          f"memo cache) in {time.perf_counter() - start:.2f}s with {workers or 1} renderer(s).")
+    return timings
@@ -0,0 +1,188 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from fanout import fan_out
+from regression import factorize_groups
+
+# Default number of bootstrap resamples and permutations per group.
+DEFAULT_RESAMPLES = 2000
+
+# Maximum number of values in one resample matrix (resamples x points), about 16 MB per float array.
+DEFAULT_CHUNK_ELEMENTS = 2_000_000
+
+
+def _chunks(resamples, points, chunk_elements):
+    """
+    Yields the sizes of the resample chunks, so no index matrix exceeds chunk_elements values.
+    """
+    size = max(1, chunk_elements // max(points, 1))
+    for start in range(0, resamples, size):
+        yield min(size, resamples - start)
+
+
+def _bootstrap_statistics(index, dx, dy):
+    """
+    Computes the least-squares slope and the correlation of every bootstrap resample.
+
+    The (resamples x points) index matrix is turned into a matrix of draw counts per point, so
+    the sums of every resample are a single matrix product with the centred x, y, x^2, y^2 and
+    x*y columns instead of gathering the resampled values.
+    """
+    resamples, n = index.shape
+    counts = np.bincount((index + np.arange(resamples)[:, None] * n).ravel(), minlength=resamples * n)
+    sums = counts.reshape(resamples, n).astype(np.float64) @ np.column_stack([dx, dy, dx * dx, dy * dy, dx * dy])
+    mean_x, mean_y = sums[:, 0] / n, sums[:, 1] / n
+    sxx = np.maximum(sums[:, 2] - n * mean_x * mean_x, 0.0)
+    syy = np.maximum(sums[:, 3] - n * mean_y * mean_y, 0.0)
+    sxy = sums[:, 4] - n * mean_x * mean_y
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slopes = np.where(sxx > 0, sxy / sxx, np.nan)
+        return slopes, np.where((sxx > 0) & (syy > 0), sxy / np.sqrt(sxx * syy), np.nan)
+
+
+def resample_group(x, y, seed, resamples=DEFAULT_RESAMPLES, confidence=0.95, chunk_elements=DEFAULT_CHUNK_ELEMENTS):
+    """
+    Bootstraps and permutation-tests the regression of y on x of one group.
+
+    The bootstrap resamples the (x, y) pairs with replacement; the permutation test shuffles y
+    against x. Both draw whole index matrices per chunk of resamples and reduce them with
+    matrix products. Shuffling y leaves the sums of squares unchanged, so the slope and the correlation have the
+    same permutation p-value.
+
+    Parameters:
+        x (ndarray): The independent variable (without missing values).
+        y (ndarray): The dependent variable (without missing values).
+        seed (SeedSequence): Seed of the group's random generator.
+        resamples (int): Number of bootstrap resamples and of permutations.
+        confidence (float): Level of the percentile confidence intervals.
+        chunk_elements (int): Maximum number of values in one index matrix.
+
+    Returns:
+        dict: "n", "slope", "slope_ci_low", "slope_ci_high", "r", "r_ci_low", "r_ci_high" and
+              "p_value" (two-sided permutation p-value); NaN for fewer than three points or constant x.
+    """
+    n = len(x)
+    result = dict.fromkeys(["slope", "slope_ci_low", "slope_ci_high", "r", "r_ci_low", "r_ci_high", "p_value"], np.nan)
+    result["n"] = n
+    if n < 3 or np.ptp(x) == 0:
+        return result
+
+    # Centre x and y once: the slope and correlation do not change, and the sums stay small.
+    dx = x - x.mean()
+    dy = y - y.mean()
+    sxx, syy, sxy = dx @ dx, dy @ dy, dx @ dy
+    result["slope"] = sxy / sxx
+    result["r"] = sxy / np.sqrt(sxx * syy) if syy > 0 else np.nan
+    rng = np.random.default_rng(seed)
+
+    # Bootstrap: resample the pairs with replacement.
+    boot_slopes, boot_r = [], []
+    for size in _chunks(resamples, n, chunk_elements):
+        index = rng.integers(0, n, size=(size, n))
+        slopes, correlations = _bootstrap_statistics(index, dx, dy)
+        boot_slopes.append(slopes)
+        boot_r.append(correlations)
+    tail = (1 - confidence) / 2 * 100
+    # Resamples that drew a single x value have no slope and are left out of the percentiles.
+    result["slope_ci_low"], result["slope_ci_high"] = np.nanpercentile(np.concatenate(boot_slopes), [tail, 100 - tail])
+    result["r_ci_low"], result["r_ci_high"] = np.nanpercentile(np.concatenate(boot_r), [tail, 100 - tail])
+
+    # Permutation test: with x fixed, the permuted covariances are one matrix-vector product per chunk.
+    observed = abs(sxy)
+    exceeding = 0
+    for size in _chunks(resamples, n, chunk_elements):
+        permutations = rng.permuted(np.tile(np.arange(n), (size, 1)), axis=1)
+        # A small relative tolerance keeps ties with the observed statistic from being lost to rounding.
+        exceeding += int((np.abs(dy[permutations] @ dx) >= observed * (1 - 1e-12)).sum())
+    result["p_value"] = (exceeding + 1) / (resamples + 1)
+    return result
+
+
+def _resample_batch(frames, task):
+    """
+    Resamples a batch of groups (a fan-out task, see fanout.py).
+    """
+    return [
+        dict(resample_group(x, y, seed, task["resamples"], task["confidence"], task["chunk_elements"]), group=label)
+        for label, x, y, seed in task["groups"]
+    ]
+
+
+def resampling_tests(groups, x, y, resamples=DEFAULT_RESAMPLES, seed=0, confidence=0.95, workers=None,
+                     chunk_elements=DEFAULT_CHUNK_ELEMENTS):
+    """
+    Computes bootstrap confidence intervals and permutation p-values of the slope and the Pearson
+    correlation of y on x for every group, with the groups spread across worker processes.
+
+    Every group gets its own random generator spawned from seed, so the results are reproducible
+    and independent of the number of workers and the chunk size.
+
+    Parameters:
+        groups (array-like): The group label of every row (e.g., df["Region"]).
+        x (array-like): The independent variable.
+        y (array-like): The dependent variable (rows where x or y is missing are skipped).
+        resamples (int): Number of bootstrap resamples and of permutations per group.
+        seed (int): Seed of the random generators.
+        confidence (float): Level of the percentile confidence intervals.
+        workers (int): Number of worker processes (default: one per group, at most one per CPU;
+                       0 runs serially).
+        chunk_elements (int): Maximum number of values in one resample matrix.
+
+    Returns:
+        DataFrame: One row per group (indexed by the group label, in order of first appearance)
+                   with the columns of resample_group().
+    """
+    codes, labels = factorize_groups(groups)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    seeds = np.random.SeedSequence(seed).spawn(len(labels))
+
+    # Sort the rows by group once and slice every group's points.
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+    items = []
+    for code, label in enumerate(labels):
+        rows = order[bounds[code]:bounds[code + 1]]
+        rows = rows[valid[rows]]
+        items.append((label, x[rows], y[rows], seeds[code]))
+
+    # One batch of groups per worker (the groups are small, so they are passed with the tasks).
+    if workers is None:
+        workers = min(len(items), os.cpu_count() or 1)
+    batches = [batch for batch in np.array_split(np.arange(len(items)), max(workers, 1)) if len(batch)]
+    tasks = [
+        {"groups": [items[index] for index in batch], "resamples": resamples, "confidence": confidence,
+         "chunk_elements": chunk_elements}
+        for batch in batches
+    ]
+    results = [row for batch in fan_out(_resample_batch, tasks, {}, workers) for row in batch]
+
+    columns = ["n", "slope", "slope_ci_low", "slope_ci_high", "r", "r_ci_low", "r_ci_high", "p_value"]
+    return pd.DataFrame(results, columns=["group"] + columns).set_index("group")
+
+
+def region_resampling_tests(df_combined, resamples=DEFAULT_RESAMPLES, seed=0, workers=None):
+    """
+    Tests the emissions trend (emissions_total on Year, like calculate_p_values()) and the
+    temperature-emissions relationship (Temperature on emissions_total) of every region.
+
+    Parameters:
+        df_combined (DataFrame): The yearly summaries of the regions.
+        resamples (int): Number of bootstrap resamples and of permutations per region.
+        seed (int): Seed of the random generators.
+        workers (int): Number of worker processes (see resampling_tests(); 0 runs serially).
+
+    Returns:
+        DataFrame: The columns "Region", "Relation" and the columns of resample_group().
+    """
+    relations = [("Year", "emissions_total"), ("emissions_total", "Temperature")]
+    results = []
+    for x, y in relations:
+        tests = resampling_tests(df_combined["Region"], df_combined[x], df_combined[y], resamples, seed,
+                                 workers=workers)
+        tests.insert(0, "Relation", f"{y} ~ {x}")
+        results.append(tests.rename_axis("Region").reset_index())
+    return pd.concat(results, ignore_index=True)
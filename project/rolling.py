@@ -0,0 +1,220 @@
+import numpy as np
+import pandas as pd
+
+from regression import TINY, factorize_groups
+
+# Default length of the rolling windows in years.
+DEFAULT_WINDOW = 10
+
+
+def _sorted_windows(groups, x, window):
+    """
+    Orders the rows by group and x and finds the first row of every row's window.
+
+    The window of a row holds the rows of the same group with x in (x - window, x], so a gap
+    in the years shortens the window instead of reaching further back. The window starts are
+    found with one binary search over a composite (group, x) key that increases over the
+    sorted rows.
+
+    Returns:
+        tuple: (order, codes, x, starts) with the sort order of the rows, their group codes and
+               x values in that order, and the position of the first row of every window.
+    """
+    codes, _ = factorize_groups(groups)
+    x = np.asarray(x, dtype=np.float64)
+    if np.isnan(x).any():
+        raise ValueError("x must not be missing.")
+    order = np.lexsort((x, codes))
+    codes, x = codes[order], x[order]
+
+    # Each group's x values are moved to a band of their own, beyond any window of the previous group.
+    span = (x.max() - x.min() + window + 1) if len(x) else 1.0
+    key = codes * span + (x - (x.min() if len(x) else 0.0))
+    starts = np.searchsorted(key, key - window, side="right")
+    return order, codes, x, starts
+
+
+def _window_sums(starts, *values):
+    """
+    Sums every value array over the windows (prefix sums: each window costs two lookups).
+    """
+    sums = []
+    for value in values:
+        prefix = np.concatenate(([0.0], np.cumsum(value)))
+        sums.append(prefix[1:] - prefix[starts])
+    return sums
+
+
+def _centred(codes, values, valid):
+    """
+    Subtracts the mean of every group from values (over the valid rows, missing values become 0),
+    which keeps the prefix sums and the differences of them small.
+    """
+    size = codes.max() + 1 if len(codes) else 0
+    counts = np.bincount(codes, weights=valid, minlength=size)
+    totals = np.bincount(codes, weights=np.where(valid, values, 0.0), minlength=size)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = np.where(counts > 0, totals / counts, 0.0)
+    return np.where(valid, values - means[codes], 0.0), means
+
+
+def _restore(order, columns):
+    """
+    Puts the columns computed over the sorted rows back into the original row order.
+    """
+    restored = {}
+    for name, values in columns.items():
+        result = np.empty_like(values)
+        result[order] = values
+        restored[name] = result
+    return restored
+
+
+def rolling_mean(groups, x, values, window=DEFAULT_WINDOW, min_periods=None):
+    """
+    Computes the moving average of values over the last window years of every group, for all
+    groups at once in O(n) (prefix sums instead of re-summing every window).
+
+    Parameters:
+        groups (array-like): The group label of every row (e.g., df["Entity"]).
+        x (array-like): The year of every row (the rows need not be sorted).
+        values (array-like): The values to average (missing values are skipped).
+        window (int): Length of the windows in years.
+        min_periods (int): Minimum number of values in a window (default: window); windows
+                           with fewer values get NaN.
+
+    Returns:
+        ndarray: The moving average of every row, in the original row order.
+    """
+    min_periods = window if min_periods is None else min_periods
+    order, codes, _, starts = _sorted_windows(groups, x, window)
+    values = np.asarray(values, dtype=np.float64)[order]
+    valid = ~np.isnan(values)
+    centred, means = _centred(codes, values, valid)
+
+    count, total = _window_sums(starts, valid.astype(np.float64), centred)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(count >= min_periods, total / count + means[codes], np.nan)
+    return _restore(order, {"mean": mean})["mean"]
+
+
+def _pair_sums(groups, x, a, b, window):
+    """
+    Computes the window counts and the centred window sums of two series a and b (over the rows
+    where both are present), in the sorted row order.
+
+    Returns:
+        tuple: (order, n, mean_a, mean_b, saa, sbb, sab) with the sort order, the window counts
+               and means, and the centred window sums of squares and cross products.
+    """
+    order, codes, _, starts = _sorted_windows(groups, x, window)
+    a = np.asarray(a, dtype=np.float64)[order]
+    b = np.asarray(b, dtype=np.float64)[order]
+    valid = ~(np.isnan(a) | np.isnan(b))
+    a, a_means = _centred(codes, a, valid)
+    b, b_means = _centred(codes, b, valid)
+
+    n, sum_a, sum_b, sum_aa, sum_bb, sum_ab = _window_sums(
+        starts, valid.astype(np.float64), a, b, a * a, b * b, a * b)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_a = sum_a / n
+        mean_b = sum_b / n
+    # Centred sums of squares and cross products of every window (clipped at 0 against rounding).
+    saa = np.maximum(sum_aa - n * mean_a * mean_a, 0.0)
+    sbb = np.maximum(sum_bb - n * mean_b * mean_b, 0.0)
+    sab = sum_ab - n * mean_a * mean_b
+    return order, n, mean_a + a_means[codes], mean_b + b_means[codes], saa, sbb, sab
+
+
+def rolling_linregress(groups, x, y, window=DEFAULT_WINDOW, min_periods=None):
+    """
+    Computes the least-squares trend of y over the last window years of every group (the rolling
+    slope), for all groups at once in O(n).
+
+    The window sums of x, y, x*y, x^2 and y^2 are differences of prefix sums over the rows
+    sorted by group and year; x and y are centred per group first, so the differences stay accurate.
+
+    Parameters:
+        groups (array-like): The group label of every row.
+        x (array-like): The year of every row (the regressor; the rows need not be sorted).
+        y (array-like): The dependent variable (rows with missing y are skipped).
+        window (int): Length of the windows in years.
+        min_periods (int): Minimum number of points in a window (default: window, at least 2).
+
+    Returns:
+        DataFrame: In the original row order, the columns "n", "slope", "intercept" (at x = 0),
+                   "rvalue" and "pvalue" (like scipy.stats.linregress over the window's points).
+    """
+    from scipy.stats import t as t_distribution
+
+    min_periods = max(window if min_periods is None else min_periods, 2)
+    order, n, mean_x, mean_y, sxx, syy, sxy = _pair_sums(groups, x, x, y, window)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = sxy / sxx
+        intercept = mean_y - slope * mean_x
+        r = np.where(syy == 0, 0.0, np.clip(sxy / np.sqrt(sxx * syy), -1.0, 1.0))
+        df = n - 2
+        t_stat = r * np.sqrt(df / ((1.0 - r + TINY) * (1.0 + r + TINY)))
+        p_value = 2 * t_distribution.sf(np.abs(t_stat), df)
+
+    undefined = (n < min_periods) | (sxx == 0)
+    for values in (slope, intercept, r):
+        values[undefined] = np.nan
+    p_value[undefined | (df <= 0)] = np.nan
+
+    columns = _restore(order, {"n": n, "slope": slope, "intercept": intercept, "rvalue": r, "pvalue": p_value})
+    columns["n"] = columns["n"].astype(np.int64)
+    return pd.DataFrame(columns)
+
+
+def rolling_corr(groups, x, a, b, window=DEFAULT_WINDOW, min_periods=None):
+    """
+    Computes the Pearson correlation of two series over the last window years of every group,
+    for all groups at once in O(n).
+
+    Parameters:
+        groups (array-like): The group label of every row.
+        x (array-like): The year of every row (the rows need not be sorted).
+        a, b (array-like): The two series (rows where either is missing are skipped).
+        window (int): Length of the windows in years.
+        min_periods (int): Minimum number of points in a window (default: window, at least 2).
+
+    Returns:
+        ndarray: The correlation of every row's window, in the original row order (NaN where
+                 a series is constant within the window).
+    """
+    min_periods = max(window if min_periods is None else min_periods, 2)
+    order, n, _, _, saa, sbb, sab = _pair_sums(groups, x, a, b, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = np.clip(sab / np.sqrt(saa * sbb), -1.0, 1.0)
+    r[(n < min_periods) | (saa == 0) | (sbb == 0)] = np.nan
+    return _restore(order, {"r": r})["r"]
+
+
+def rolling_trends(data, window=DEFAULT_WINDOW, group="Entity", min_periods=None):
+    """
+    Computes the rolling statistics of the temperatures and emissions of every group: moving
+    averages, rolling slopes (change per year) and the rolling correlation of emissions and
+    temperature over the last window years.
+
+    Parameters:
+        data (DataFrame): Yearly data with the columns group, "Year", "Temperature" and "emissions_total".
+        window (int): Length of the windows in years.
+        group (str): The column identifying the series (e.g., "Entity" or "Region").
+        min_periods (int): Minimum number of points in a window (default: window).
+
+    Returns:
+        DataFrame: The columns group, "Year", "Temperature_mean", "Temperature_slope",
+                   "emissions_total_mean", "emissions_total_slope" and "correlation", sorted by
+                   group and year.
+    """
+    data = data.sort_values([group, "Year"], kind="stable").reset_index(drop=True)
+    groups, years = data[group], data["Year"]
+
+    result = pd.DataFrame({group: groups, "Year": years})
+    for column in ("Temperature", "emissions_total"):
+        result[f"{column}_mean"] = rolling_mean(groups, years, data[column], window, min_periods)
+        result[f"{column}_slope"] = rolling_linregress(groups, years, data[column], window, min_periods)["slope"].values
+    result["correlation"] = rolling_corr(groups, years, data["emissions_total"], data["Temperature"], window, min_periods)
+    return result
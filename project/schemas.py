@@ -0,0 +1,191 @@
+import csv
+import re
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+# Arrow types of the dtypes used in the schemas ("category" becomes a pandas categorical).
+ARROW_TYPES = {
+    "category": pa.dictionary(pa.int32(), pa.string()),
+    "string": pa.string(),
+    "int8": pa.int8(),
+    "int16": pa.int16(),
+    "int32": pa.int32(),
+    "int64": pa.int64(),
+    "float32": pa.float32(),
+    "float64": pa.float64(),
+}
+
+# Declared layout of every source fetched by the pipeline.
+#   columns:  named columns and their dtypes (columns not declared here are not parsed)
+#   required: columns that must be present and must not contain missing values
+#   wide:     columns matched by a name pattern (the year columns of a wide dataset), their
+#             dtype and the minimum number of them
+SCHEMAS = {
+    "emissions": {
+        "columns": {"Entity": "category", "Code": "category", "Year": "int16", "emissions_total": "float64"},
+        "required": ["Entity", "Year"],
+    },
+    "temperature": {
+        # "Year" holds the month of the monthly averages; the years are the wide columns.
+        "columns": {"Entity": "category", "Code": "category", "Year": "int64"},
+        "required": ["Entity", "Year"],
+        "wide": {"pattern": r"\d{4}", "dtype": "float64", "min_columns": 1},
+    },
+}
+
+
+class SchemaError(ValueError):
+    """
+    Raised when a source does not match its schema (missing or mistyped columns).
+    """
+
+
+def read_header(path):
+    """
+    Returns the column names of a CSV file (its first line only).
+    """
+    with open(path, "r", encoding="utf-8", newline="") as handle:
+        try:
+            return next(csv.reader(handle))
+        except StopIteration:
+            raise SchemaError(f"'{path}' is empty.") from None
+
+
+def resolve_columns(schema, header, name="source"):
+    """
+    Matches the header of a file against a schema before anything is parsed.
+
+    Parameters:
+        schema (dict): The schema of the source (see SCHEMAS).
+        header (list): The column names of the file.
+        name (str): Name of the source (for messages).
+
+    Returns:
+        tuple: (columns, ignored): the dtypes of the columns to parse, in file order, and the
+               columns that are not part of the schema.
+
+    Raises:
+        SchemaError: If required columns or the wide columns are missing, or names repeat.
+    """
+    duplicates = sorted({column for column in header if header.count(column) > 1})
+    if duplicates:
+        raise SchemaError(f"The {name} data has repeated columns: {duplicates}.")
+    missing = [column for column in schema.get("required", []) if column not in header]
+    if missing:
+        raise SchemaError(f"The {name} data lacks the required columns {missing} (found: {header[:10]}...).")
+
+    wide = schema.get("wide")
+    columns, ignored = {}, []
+    for column in header:
+        if column in schema["columns"]:
+            columns[column] = schema["columns"][column]
+        elif wide is not None and re.fullmatch(wide["pattern"], column):
+            columns[column] = wide["dtype"]
+        else:
+            ignored.append(column)
+
+    if wide is not None:
+        count = sum(1 for column in header if column not in schema["columns"] and column in columns)
+        if count < wide.get("min_columns", 0):
+            raise SchemaError(f"The {name} data has {count} columns matching '{wide['pattern']}', "
+                              f"expected at least {wide['min_columns']}.")
+    return columns, ignored
+
+
+def read_csv(path, schema, name="source", use_threads=True):
+    """
+    Parses a CSV file with the multi-threaded pyarrow engine, reading only the columns of the
+    schema with their declared types (no type inference).
+
+    The header is checked first, so a renamed or dropped column fails immediately instead of
+    surfacing later as NaNs; values that do not fit the declared type (e.g., text in a numeric
+    column) and missing values in required columns fail the parse.
+
+    Parameters:
+        path (str): Path of the CSV file.
+        schema (dict): The schema of the source (see SCHEMAS).
+        name (str): Name of the source (for messages).
+        use_threads (bool): Parse the blocks of the file in parallel.
+
+    Returns:
+        DataFrame: The parsed columns with the schema's dtypes.
+
+    Raises:
+        SchemaError: If the file does not match the schema.
+    """
+    columns, ignored = resolve_columns(schema, read_header(path), name)
+    if ignored:
+        print(f"Schema of '{name}': ignoring {len(ignored)} undeclared column(s): {ignored[:5]}")
+
+    try:
+        table = pacsv.read_csv(
+            path,
+            read_options=pacsv.ReadOptions(use_threads=use_threads),
+            convert_options=pacsv.ConvertOptions(
+                column_types={column: ARROW_TYPES[dtype] for column, dtype in columns.items()},
+                include_columns=list(columns),
+                # Empty strings are missing values, like in pd.read_csv.
+                strings_can_be_null=True,
+            ),
+        )
+    except pa.ArrowInvalid as error:
+        raise SchemaError(f"The {name} data does not match its schema: {error}") from None
+
+    incomplete = [column for column in schema.get("required", []) if table.column(column).null_count > 0]
+    if incomplete:
+        raise SchemaError(f"The {name} data has missing values in the required columns {incomplete}.")
+    return table.to_pandas()
+
+
+def read_csv_chunks(path, schema, name, chunk_rows, columns=None):
+    """
+    Reads a CSV file in chunks with the dtypes of its schema (for the chunked readers: the
+    streaming and partitioned modes), checking the header before the first chunk and the
+    values of every chunk like read_csv().
+
+    Parameters:
+        path (str): Path of the CSV file.
+        schema (dict): The schema of the source (see SCHEMAS).
+        name (str): Name of the source (for messages).
+        chunk_rows (int): Number of CSV rows per chunk.
+        columns (list): The columns to read (default: all columns of the schema in the file).
+
+    Returns:
+        tuple: (dtypes, chunks): the dtypes of the columns read, in file order, and an iterator
+               over the chunks.
+
+    Raises:
+        SchemaError: If the header or a chunk does not match the schema.
+    """
+    dtypes, _ = resolve_columns(schema, read_header(path), name)
+    if columns is not None:
+        missing = [column for column in columns if column not in dtypes]
+        if missing:
+            raise SchemaError(f"The {name} data lacks the columns {missing}.")
+        dtypes = {column: dtype for column, dtype in dtypes.items() if column in columns}
+    # Categories would differ from chunk to chunk, so categorical columns are read as strings.
+    parse_dtypes = {column: "str" if dtype == "category" else dtype for column, dtype in dtypes.items()}
+
+    def chunks():
+        try:
+            for chunk in pd.read_csv(path, usecols=list(dtypes), dtype=parse_dtypes, chunksize=chunk_rows):
+                incomplete = [column for column in schema.get("required", [])
+                              if column in chunk and chunk[column].isnull().any()]
+                if incomplete:
+                    raise SchemaError(f"The {name} data has missing values in the required columns {incomplete}.")
+                yield chunk
+        except (ValueError, TypeError) as error:
+            if isinstance(error, SchemaError):
+                raise
+            raise SchemaError(f"The {name} data does not match its schema: {error}") from None
+    return dtypes, chunks()
+
+
+def source_parser(name, schemas=None):
+    """
+    Returns a parse function for fetcher.fetch_sources() that reads a source with its schema.
+    """
+    schema = (schemas or SCHEMAS)[name]
+    return lambda path: read_csv(path, schema, name)
@@ -0,0 +1,368 @@
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from entity_index import merge_indexed
+from pipeline import (
+    build_emissions_by_country_figure, build_temperature_by_region_figure, build_temperature_vs_emissions_figure,
+    build_temperature_with_trendlines_figure, calculate_p_values, fetch_data, index_datasets, summarize_region,
+    transform_temperature_yearly,
+)
+from region_groups import load_region_groups
+
+# Default number of query results kept in the LRU cache.
+DEFAULT_CACHE_SIZE = 256
+
+
+class QueryError(ValueError):
+    """
+    Raised for invalid queries (answered with "400 Bad Request").
+    """
+
+
+class NotFoundError(LookupError):
+    """
+    Raised for unknown endpoints and figures (answered with "404 Not Found").
+    """
+
+
+class NotLoadedError(RuntimeError):
+    """
+    Raised while the datasets are not loaded yet (answered with "503 Service Unavailable").
+    """
+
+
+def load_datasets():
+    """
+    Fetches the sources and computes the yearly temperatures (the default loader of the service).
+
+    Returns:
+        tuple: The yearly temperatures per entity and the emissions dataset.
+    """
+    emissions_data, temperature_data = fetch_data()
+    return transform_temperature_yearly(temperature_data), emissions_data
+
+
+class DatasetState:
+    """
+    An immutable, indexed snapshot of the datasets the service answers queries from.
+
+    Parameters:
+        yearly_temperature (DataFrame): Yearly temperatures per entity.
+        emissions_data (DataFrame): The emissions dataset.
+        version (int): Number of the snapshot (part of every cache key).
+    """
+
+    def __init__(self, yearly_temperature, emissions_data, version):
+        self.temperature_index, self.emissions_index = index_datasets(yearly_temperature, emissions_data)
+        self.version = version
+        self.loaded_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class LRUCache:
+    """
+    A thread-safe least-recently-used cache with hit/miss counters.
+
+    Parameters:
+        size (int): Maximum number of cached results.
+    """
+
+    def __init__(self, size=DEFAULT_CACHE_SIZE):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return self.items[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.items), "capacity": self.size, "hits": self.hits, "misses": self.misses}
+
+
+class AnalysisService:
+    """
+    Keeps the transformed and indexed datasets in memory and answers summary, regression and
+    figure queries for arbitrary country lists.
+
+    Results are cached per dataset version. refresh() loads new data in the background and
+    swaps it in atomically: queries running meanwhile keep using the previous snapshot.
+
+    Parameters:
+        loader (callable): Returns (yearly_temperature, emissions_data) (default: load_datasets()).
+        cache_size (int): Maximum number of cached query results.
+        regions_file (str): Region definition file providing the named groups (see region_groups.py).
+    """
+
+    def __init__(self, loader=load_datasets, cache_size=DEFAULT_CACHE_SIZE, regions_file=None):
+        self.loader = loader
+        self.cache = LRUCache(cache_size)
+        self.regions = load_region_groups(regions_file)
+        self.state = None
+        self.refresh_lock = threading.Lock()
+        self.last_error = None
+
+    def refresh(self):
+        """
+        Loads and indexes the datasets and swaps them in (skipped if a refresh is already running).
+
+        Returns:
+            bool: True if new data was swapped in.
+        """
+        if not self.refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            version = self.state.version + 1 if self.state is not None else 1
+            state = DatasetState(*self.loader(), version=version)
+            # A single reference assignment: every request sees either the old or the new snapshot.
+            self.state = state
+            self.cache.clear()
+            self.last_error = None
+            print(f"Loaded dataset version {version}.")
+            return True
+        except Exception as error:
+            self.last_error = repr(error)
+            print(f"Refreshing the datasets failed: {error!r}")
+            return False
+        finally:
+            self.refresh_lock.release()
+
+    def refresh_in_background(self):
+        """
+        Starts refresh() in a daemon thread and returns the thread.
+        """
+        thread = threading.Thread(target=self.refresh, daemon=True)
+        thread.start()
+        return thread
+
+    def refresh_periodically(self, interval, stop_event):
+        """
+        Refreshes the datasets every interval seconds until stop_event is set.
+        """
+        while not stop_event.wait(interval):
+            self.refresh()
+
+    def resolve_groups(self, query):
+        """
+        Turns the query parameters into a list of (label, title, countries) groups.
+
+        Groups are given as named groups of the region definitions ("group=north_america",
+        repeatable) and/or as ad-hoc country lists ("countries=Chile,Peru&label=Andes",
+        repeatable, labels matched by position). Without any, the compared groups are used.
+        """
+        groups = []
+        for key in query.get("group", []):
+            if key not in self.regions["groups"]:
+                raise QueryError(f"Unknown region group '{key}'.")
+            group = self.regions["groups"][key]
+            groups.append((group["label"], group["title"], list(group["countries"])))
+
+        labels = query.get("label", [])
+        for position, countries in enumerate(query.get("countries", [])):
+            names = [name.strip() for name in countries.split(",") if name.strip()]
+            if not names:
+                raise QueryError("An empty country list was given.")
+            label = labels[position] if position < len(labels) else f"Group {len(groups) + 1}"
+            groups.append((label, label, names))
+
+        if not groups:
+            for key in self.regions["comparison"]:
+                group = self.regions["groups"][key]
+                groups.append((group["label"], group["title"], list(group["countries"])))
+        return groups
+
+    def combined(self, state, groups):
+        """
+        Returns the merged country data of every group and their combined yearly summaries.
+        """
+        combined = [merge_indexed(state.temperature_index, state.emissions_index, countries)
+                    for _, _, countries in groups]
+        summaries = pd.concat([summarize_region(data, label) for data, (label, _, _) in zip(combined, groups)],
+                              ignore_index=True)
+        return combined, summaries
+
+    def answer(self, state, path, query):
+        """
+        Computes the JSON body of a query (without caching).
+
+        Parameters:
+            state (DatasetState): The dataset snapshot to answer from.
+            path (str): "/summary", "/regression" or "/figure/<name>".
+            query (dict): The parsed query parameters (lists of values).
+
+        Returns:
+            str: The JSON response body.
+        """
+        if path not in ("/summary", "/regression") and not path.startswith("/figure/"):
+            raise NotFoundError(f"Unknown endpoint '{path}'.")
+        groups = self.resolve_groups(query)
+        combined, summaries = self.combined(state, groups)
+        for data, (label, _, _) in zip(combined, groups):
+            if data.empty:
+                raise QueryError(f"The countries of '{label}' match no data.")
+
+        if path == "/summary":
+            data = json.loads(summaries.to_json(orient="records"))
+        elif path == "/regression":
+            data = json.loads(calculate_p_values(summaries).to_json(orient="records"))
+        elif path.startswith("/figure/"):
+            name = path[len("/figure/"):]
+            if name == "temperature_vs_emissions":
+                figure = build_temperature_vs_emissions_figure(summaries)
+            elif name == "temperature_trendlines":
+                figure = build_temperature_with_trendlines_figure(summaries, calculate_p_values(summaries))
+            elif name in ("temperature_by_region", "emissions_by_country"):
+                if len(groups) != 2:
+                    raise QueryError(f"The figure '{name}' compares exactly two groups.")
+                build = build_temperature_by_region_figure if name == "temperature_by_region" \
+                    else build_emissions_by_country_figure
+                (_, title_a, countries_a), (_, title_b, countries_b) = groups
+                figure = build(combined[0], countries_a, title_a, combined[1], countries_b, title_b)
+            else:
+                raise NotFoundError(f"Unknown figure '{name}'.")
+            data = json.loads(figure.to_json())
+
+        return json.dumps({"version": state.version, "data": data})
+
+    def query(self, path, query):
+        """
+        Answers a query from the cache or computes and caches it.
+
+        Returns:
+            tuple: (JSON body, cached flag).
+        """
+        state = self.state
+        if state is None:
+            raise NotLoadedError("The datasets are not loaded yet.")
+        key = (state.version, path, tuple(sorted((name, tuple(values)) for name, values in query.items())))
+        body = self.cache.get(key)
+        if body is not None:
+            return body, True
+        body = self.answer(state, path, query)
+        self.cache.put(key, body)
+        return body, False
+
+    def status(self):
+        """
+        Returns the dataset version, load time and cache statistics.
+        """
+        state = self.state
+        return {
+            "version": state.version if state else None,
+            "loaded_at": state.loaded_at if state else None,
+            "refreshing": self.refresh_lock.locked(),
+            "last_error": self.last_error,
+            "cache": self.cache.stats(),
+            "groups": list(self.regions["groups"]),
+        }
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    HTTP front end of an AnalysisService (set as the class attribute "service").
+    """
+    service = None
+
+    def send_json(self, status, body, extra_headers=()):
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in extra_headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/status":
+            self.send_json(200, json.dumps(self.service.status()))
+            return
+
+        start = time.perf_counter()
+        try:
+            body, cached = self.service.query(url.path, parse_qs(url.query))
+        except QueryError as error:
+            self.send_json(400, json.dumps({"error": str(error)}))
+        except NotFoundError as error:
+            self.send_json(404, json.dumps({"error": str(error)}))
+        except NotLoadedError as error:
+            self.send_json(503, json.dumps({"error": str(error)}))
+        except Exception as error:
+            # Anything else is a bug in the service: answer it instead of dropping the connection.
+            self.send_json(500, json.dumps({"error": f"Internal error: {type(error).__name__}: {error}"}))
+        else:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.send_json(200, body, [("X-Cache", "hit" if cached else "miss"), ("X-Elapsed-Ms", f"{elapsed:.2f}")])
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/refresh":
+            self.send_json(404, json.dumps({"error": f"Unknown endpoint '{self.path}'."}))
+            return
+        self.service.refresh_in_background()
+        self.send_json(202, json.dumps({"refreshing": True}))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(service, host="127.0.0.1", port=8050):
+    """
+    Creates the HTTP server of a service (call serve_forever() on it).
+    """
+    handler = type("BoundServiceHandler", (ServiceHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local JSON service answering queries from warm, indexed datasets.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8050, help="port to listen on (default: %(default)s)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE, help="number of cached query results")
+    parser.add_argument("--refresh-interval", type=float, default=None, metavar="SECONDS",
+                        help="reload the sources in the background at this interval")
+    parser.add_argument("--regions", default=None, metavar="FILE", help="region definition file")
+    args = parser.parse_args()
+
+    service = AnalysisService(cache_size=args.cache_size, regions_file=args.regions)
+    service.refresh()
+    stop = threading.Event()
+    if args.refresh_interval:
+        threading.Thread(target=service.refresh_periodically, args=(args.refresh_interval, stop), daemon=True).start()
+
+    server = make_server(service, args.host, args.port)
+    print(f"Serving on http://{args.host}:{server.server_address[1]} "
+          "(GET /summary, /regression, /figure/<name>, /status; POST /refresh).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
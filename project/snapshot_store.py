@@ -0,0 +1,141 @@
+import json
+import os
+import tempfile
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Default location of the snapshot store (next to the pipeline outputs).
+DEFAULT_SNAPSHOT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "snapshots")
+
+# Number of rows per Parquet row group. Smaller groups allow finer row-group pruning when
+# a stage only needs a few entities or years; larger groups compress better.
+DEFAULT_ROW_GROUP_SIZE = 50_000
+
+
+class SnapshotStore:
+    """
+    Typed columnar snapshot store for the raw and intermediate datasets of the pipeline.
+
+    Every snapshot is a Parquet file "<name>.parquet" with its dtypes preserved, plus an
+    entry in "manifest.json" recording its row count, columns and creation time. Snapshots
+    are read back through memory-mapped files and only the requested columns and the row
+    groups matching the filters are decoded, so reloading yesterday's data avoids parsing CSV.
+
+    Parameters:
+        directory (str): Directory of the store (default: project/data/snapshots).
+        row_group_size (int): Number of rows per Parquet row group.
+    """
+
+    def __init__(self, directory=None, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+        self.directory = directory or DEFAULT_SNAPSHOT_DIRECTORY
+        self.row_group_size = row_group_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, name):
+        """
+        Returns the file path of a snapshot.
+
+        Parameters:
+            name (str): Name of the snapshot (e.g., "emissions_raw").
+
+        Returns:
+            str: Path of the Parquet file.
+        """
+        return os.path.join(self.directory, f"{name}.parquet")
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, "manifest.json")
+
+    def manifest(self):
+        """
+        Returns the manifest of the store: a dictionary mapping snapshot names to their metadata.
+        """
+        try:
+            with open(self._manifest_path(), "r", encoding="utf-8") as handle:
+                return json.load(handle)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def exists(self, *names):
+        """
+        Returns True if all given snapshots exist in the store.
+        """
+        return all(os.path.exists(self.path(name)) for name in names)
+
+    def save(self, name, df, sort_by=None):
+        """
+        Saves a DataFrame as a snapshot, replacing any previous snapshot with the same name.
+
+        Parameters:
+            name (str): Name of the snapshot.
+            df (DataFrame): The dataset to store. The index is not stored.
+            sort_by (list): Optional columns to sort by before writing. Sorting by the columns
+                            that later stages filter on (e.g., "Entity", "Year") makes the row
+                            group statistics selective, so filtered loads skip most row groups.
+
+        Returns:
+            str: Path of the written Parquet file.
+        """
+        if sort_by is not None:
+            df = df.sort_values(by=sort_by, kind="stable")
+
+        # Parquet requires string column names (the wide temperature data uses years as names).
+        table = pa.Table.from_pandas(df.rename(columns=str), preserve_index=False)
+
+        # Write to a temporary file first and rename it, so readers never see a partial snapshot.
+        path = self.path(name)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            pq.write_table(table, tmp_path, row_group_size=self.row_group_size)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        manifest = self.manifest()
+        manifest[name] = {
+            "rows": table.num_rows,
+            "columns": table.column_names,
+            "sorted_by": sort_by,
+            "created_at": time.time(),
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump(manifest, handle, indent=2)
+        os.replace(tmp_path, self._manifest_path())
+
+        return path
+
+    def load_table(self, name, columns=None, filters=None):
+        """
+        Loads a snapshot as an Arrow table from a memory-mapped file.
+
+        Parameters:
+            name (str): Name of the snapshot.
+            columns (list): Columns to read (default: all columns).
+            filters (list): Optional row filters in pyarrow's DNF format, e.g.
+                            [("Entity", "in", ["Chile", "Peru"]), ("Year", ">=", 1950)].
+                            Row groups whose statistics cannot match are skipped entirely.
+
+        Returns:
+            pyarrow.Table: The requested part of the snapshot.
+        """
+        return pq.read_table(self.path(name), columns=columns, filters=filters, memory_map=True)
+
+    def load(self, name, columns=None, filters=None):
+        """
+        Loads a snapshot as a DataFrame, reading only the requested columns and row groups.
+
+        Parameters:
+            name (str): Name of the snapshot.
+            columns (list): Columns to read (default: all columns).
+            filters (list): Optional row filters, see load_table().
+
+        Returns:
+            DataFrame: The requested part of the snapshot with its stored dtypes.
+        """
+        return self.load_table(name, columns=columns, filters=filters).to_pandas()
@@ -0,0 +1,309 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import tempfile
+
+import pandas as pd
+
+from profiling import count_rows
+from snapshot_store import SnapshotStore
+
+# Default location of the stage state (fingerprints and non-tabular stage outputs).
+DEFAULT_STATE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "stages")
+
+
+def fingerprint_value(value):
+    """
+    Computes a content fingerprint of a stage output.
+
+    DataFrames are hashed row by row with pandas' vectorized hashing (together with their
+    column names and dtypes); any other value is hashed through its pickled representation.
+
+    Parameters:
+        value: The stage output to fingerprint.
+
+    Returns:
+        str: The hex SHA-256 fingerprint.
+    """
+    digest = hashlib.sha256()
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr([(str(name), str(dtype)) for name, dtype in value.dtypes.items()]).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    else:
+        digest.update(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    return digest.hexdigest()
+
+
+class Stage:
+    """
+    A declared step of the pipeline.
+
+    Parameters:
+        name (str): Unique name of the stage.
+        func (callable): Function computing the stage. It is called with the input datasets
+                         as keyword arguments (named like the inputs) plus the params.
+        inputs (list or dict): Names of the outputs of other stages this stage consumes. A list
+                               passes each input under its own name; a dict maps func's
+                               argument names to output names.
+        outputs (list): Names of the datasets the stage produces (default: no outputs). If more
+                        than one output is declared, func must return a tuple in the same order.
+        params (dict): Additional keyword arguments for func (e.g., plot dimensions).
+                       They are part of the stage fingerprint.
+        files (list): Files written by the stage; the stage is re-run if one of them is missing.
+        uses (list): Further functions whose source code is part of the stage's code version.
+        volatile (bool): Always re-run the stage (e.g., fetching data from the network).
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), params=None, files=(), uses=(), volatile=False):
+        self.name = name
+        self.func = func
+        self.inputs = dict(inputs) if isinstance(inputs, dict) else {name: name for name in inputs}
+        self.outputs = list(outputs)
+        self.params = dict(params or {})
+        self.files = list(files)
+        self.uses = list(uses)
+        self.volatile = volatile
+
+    def code_version(self):
+        """
+        Returns a fingerprint of the source code of the stage function and the functions it uses.
+        """
+        digest = hashlib.sha256()
+        for func in [self.func] + self.uses:
+            try:
+                digest.update(inspect.getsource(func).encode("utf-8"))
+            except (OSError, TypeError):
+                digest.update(repr(func).encode("utf-8"))
+        return digest.hexdigest()
+
+    def fingerprint(self, input_fingerprints):
+        """
+        Computes the fingerprint of a stage run from its code version, params and input fingerprints.
+
+        Parameters:
+            input_fingerprints (dict): Fingerprints of the input datasets, keyed by input name.
+
+        Returns:
+            str: The hex SHA-256 fingerprint.
+        """
+        payload = {
+            "name": self.name,
+            "code": self.code_version(),
+            "params": repr(sorted(self.params.items())),
+            "inputs": [input_fingerprints[name] for name in self.inputs.values()],
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class StageGraph:
+    """
+    A graph of pipeline stages with fingerprint-based incremental execution.
+
+    Each stage run is fingerprinted by its code version, its params and the fingerprints of
+    its inputs. If the fingerprint matches the one recorded by the previous run (and the
+    stage's outputs and files still exist), the stage is skipped and its persisted outputs
+    are reused. DataFrame outputs are persisted in the snapshot store, other outputs are
+    pickled next to the recorded state.
+
+    Parameters:
+        store (SnapshotStore): Snapshot store for DataFrame outputs.
+        state_directory (str): Directory of the recorded fingerprints and pickled outputs.
+        profiler (Profiler): Optional profiler that measures every executed stage (see profiling.py).
+    """
+
+    def __init__(self, store=None, state_directory=None, profiler=None):
+        self.store = store or SnapshotStore()
+        self.profiler = profiler
+        self.state_directory = state_directory or DEFAULT_STATE_DIRECTORY
+        os.makedirs(self.state_directory, exist_ok=True)
+        self.stages = {}
+        self.producers = {}
+
+    def add(self, stage):
+        """
+        Adds a stage to the graph.
+
+        Parameters:
+            stage (Stage): The stage to add. Its name and outputs must be unique.
+        """
+        if stage.name in self.stages:
+            raise ValueError(f"Stage '{stage.name}' is declared twice.")
+        for output in stage.outputs:
+            if output in self.producers:
+                raise ValueError(f"Output '{output}' is produced by both '{self.producers[output]}' and '{stage.name}'.")
+            self.producers[output] = stage.name
+        self.stages[stage.name] = stage
+        return stage
+
+    def _state_path(self):
+        return os.path.join(self.state_directory, "state.json")
+
+    def _load_state(self):
+        try:
+            with open(self._state_path(), "r", encoding="utf-8") as handle:
+                return json.load(handle)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_state(self, state):
+        fd, tmp_path = tempfile.mkstemp(dir=self.state_directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump(state, handle, indent=2)
+        os.replace(tmp_path, self._state_path())
+
+    def _pickle_path(self, output):
+        return os.path.join(self.state_directory, f"{output}.pkl")
+
+    def _output_exists(self, output, kind):
+        if kind == "frame":
+            return self.store.exists(output)
+        return os.path.exists(self._pickle_path(output))
+
+    def _persist(self, output, value):
+        """
+        Persists a stage output and returns its kind ("frame" or "pickle").
+        """
+        if isinstance(value, pd.DataFrame):
+            self.store.save(output, value)
+            return "frame"
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.state_directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as handle:
+            pickle.dump(value, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._pickle_path(output))
+        return "pickle"
+
+    def load(self, output):
+        """
+        Loads a persisted stage output.
+
+        Parameters:
+            output (str): Name of the output.
+
+        Returns:
+            The output value as produced by the last run of its stage.
+        """
+        kind = self._load_state().get(self.producers[output], {}).get("kinds", {}).get(output, "frame")
+        if kind == "frame":
+            return self.store.load(output)
+        with open(self._pickle_path(output), "rb") as handle:
+            return pickle.load(handle)
+
+    def dependencies(self, targets=None):
+        """
+        Returns the stages needed to compute the targets, in execution (topological) order.
+
+        Parameters:
+            targets (list): Names of the target stages (default: all stages).
+
+        Returns:
+            list: Stage names in an order where every stage comes after its dependencies.
+        """
+        targets = list(self.stages) if targets is None else list(targets)
+        ordered = []
+        visiting = set()
+
+        def visit(name):
+            if name in ordered:
+                return
+            if name not in self.stages:
+                raise KeyError(f"Unknown stage '{name}'.")
+            if name in visiting:
+                raise ValueError(f"Stage '{name}' is part of a dependency cycle.")
+            visiting.add(name)
+            for input_name in self.stages[name].inputs.values():
+                if input_name not in self.producers:
+                    raise KeyError(f"No stage produces the input '{input_name}' of stage '{name}'.")
+                visit(self.producers[input_name])
+            visiting.discard(name)
+            ordered.append(name)
+
+        for target in targets:
+            visit(target)
+        return ordered
+
+    def invalidate(self, *names):
+        """
+        Forgets the recorded fingerprints of stages, so they are re-run by the next run.
+
+        Parameters:
+            names (str): Names of the stages to invalidate.
+        """
+        state = self._load_state()
+        for name in names:
+            if name not in self.stages:
+                raise KeyError(f"Unknown stage '{name}'.")
+            state.pop(name, None)
+        self._save_state(state)
+
+    def run(self, targets=None, force=()):
+        """
+        Runs the targets and their dependencies, skipping stages whose fingerprint is unchanged.
+
+        Parameters:
+            targets (list): Names of the target stages (default: all stages).
+            force (list): Names of stages to re-run even if they are up to date.
+
+        Returns:
+            dict: {"executed": [...], "skipped": [...]} with the stage names in execution order.
+        """
+        state = self._load_state()
+        fingerprints = {}
+        values = {}
+        executed = []
+        skipped = []
+
+        for name in self.dependencies(targets):
+            stage = self.stages[name]
+            key = stage.fingerprint(fingerprints)
+            record = state.get(name)
+
+            up_to_date = (
+                record is not None
+                and record["key"] == key
+                and not stage.volatile
+                and name not in force
+                and all(self._output_exists(output, kind) for output, kind in record["kinds"].items())
+                and all(os.path.exists(path) for path in stage.files)
+            )
+            if up_to_date:
+                print(f"Skipping stage '{name}' (up to date).")
+                if self.profiler is not None:
+                    self.profiler.skip(name)
+                fingerprints.update(record["outputs"])
+                skipped.append(name)
+                continue
+
+            print(f"Running stage '{name}'.")
+            # Only now load the inputs produced by skipped stages from their persisted copies.
+            kwargs = dict(stage.params)
+            for argument, input_name in stage.inputs.items():
+                if input_name not in values:
+                    values[input_name] = self.load(input_name)
+                kwargs[argument] = values[input_name]
+
+            if self.profiler is None:
+                result = stage.func(**kwargs)
+            else:
+                with self.profiler.measure(name, inputs=kwargs) as span:
+                    result = stage.func(**kwargs)
+                    span["rows_out"] = count_rows(result)
+            if len(stage.outputs) == 1:
+                result = (result,)
+            elif not stage.outputs:
+                result = ()
+
+            record = {"key": key, "outputs": {}, "kinds": {}}
+            for output, value in zip(stage.outputs, result):
+                values[output] = value
+                record["outputs"][output] = fingerprint_value(value)
+                record["kinds"][output] = self._persist(output, value)
+            fingerprints.update(record["outputs"])
+
+            state[name] = record
+            self._save_state(state)
+            executed.append(name)
+
+        return {"executed": executed, "skipped": skipped}
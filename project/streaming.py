@@ -0,0 +1,168 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from schemas import read_csv_chunks
+
+# Default number of CSV rows parsed per chunk.
+DEFAULT_CHUNKSIZE = 100_000
+
+
+class RunningMeans:
+    """
+    Incrementally maintained means of the numeric columns of a dataset (running sums and counts).
+    """
+
+    def __init__(self):
+        self.sums = {}
+        self.counts = {}
+
+    def update(self, chunk):
+        """
+        Adds the non-missing values of the numeric columns of a chunk.
+        """
+        numeric = chunk.select_dtypes(include="number")
+        for column, total in numeric.sum().items():
+            self.sums[column] = self.sums.get(column, 0.0) + total
+        for column, count in numeric.count().items():
+            self.counts[column] = self.counts.get(column, 0) + count
+
+    def means(self):
+        """
+        Returns the means of all numeric columns seen so far as a Series.
+        """
+        return pd.Series({
+            column: self.sums[column] / self.counts[column]
+            for column in self.sums
+            if self.counts[column] > 0
+        }, dtype="float64")
+
+
+class RunningDeduplicator:
+    """
+    Drops rows that were already seen in previous chunks (or earlier in the same chunk),
+    keeping only the 64-bit hash of every distinct row instead of the rows themselves.
+    """
+
+    def __init__(self):
+        self.seen = set()
+
+    def filter(self, chunk):
+        """
+        Returns the rows of a chunk that have not been seen before, in their original order.
+        """
+        hashes = pd.util.hash_pandas_object(chunk, index=False).values
+        _, first = np.unique(hashes, return_index=True)
+        keep = np.zeros(len(chunk), dtype=bool)
+        keep[first] = True
+        if self.seen:
+            seen = self.seen
+            keep &= ~np.fromiter((value in seen for value in hashes.tolist()), dtype=bool, count=len(hashes))
+        self.seen.update(hashes[keep].tolist())
+        return chunk[keep]
+
+
+def year_columns_in_range(columns, year_range):
+    """
+    Selects the columns of a wide dataset whose names are years within a range.
+
+    Parameters:
+        columns (list): Column names of the wide dataset.
+        year_range (tuple): (first year, last year), both inclusive. None bounds are open.
+
+    Returns:
+        list: The column names of the years within the range (in their original order).
+    """
+    first, last = year_range
+    selected = []
+    for column in columns:
+        if re.fullmatch(r"\d+", str(column)):
+            year = int(column)
+            if (first is None or year >= first) and (last is None or year <= last):
+                selected.append(column)
+    return selected
+
+
+def stream_csv(source, entities=None, year_range=None, columns=None, wide=False, clean=False,
+               chunksize=DEFAULT_CHUNKSIZE, schema=None, name="source"):
+    """
+    Reads a CSV source in chunks, pushing the entity/year filters and the column selection down
+    into the read, so only the rows and columns needed later are ever held in memory at once.
+
+    With clean=True the result matches clean_dataset() applied to the whole source and then
+    filtered: duplicate rows are detected across chunks through running row hashes, and missing
+    numeric values are filled with the mean over the whole (de-duplicated) source, maintained as
+    running sums and counts.
+
+    With a schema (see schemas.SCHEMAS) the header is checked before the first chunk and every
+    chunk is parsed with the declared dtypes (see schemas.read_csv_chunks()), so the same row
+    always hashes the same in every chunk and a malformed file raises a SchemaError.
+
+    Parameters:
+        source (str): Path or URL of the CSV file.
+        entities (list): Keep only rows whose "Entity" is in this list (default: all rows).
+        year_range (tuple): (first year, last year) to keep. For long data the "Year" column is
+                            filtered; for wide data (wide=True) the year columns are selected.
+        columns (list): Columns to keep (default: all columns, or the identifier columns plus
+                        the selected year columns for wide data).
+        wide (bool): The source has one column per year (like the temperature dataset).
+        clean (bool): De-duplicate, impute missing values, sort by "Year" and drop "ID"
+                      like clean_dataset().
+        chunksize (int): Number of CSV rows parsed per chunk.
+        schema (dict): The schema of the source (default: the dtypes are inferred per chunk).
+        name (str): Name of the source (for the schema errors).
+
+    Returns:
+        DataFrame: The filtered (and cleaned) dataset.
+    """
+    deduplicator = RunningDeduplicator()
+    means = RunningMeans()
+    kept = []
+    selected = None
+
+    if schema is not None:
+        # Without cleaning, only the kept columns have to be parsed.
+        usecols = columns if columns is not None and not clean and not wide else None
+        _, chunks = read_csv_chunks(source, schema, name, chunksize, columns=usecols)
+    else:
+        chunks = pd.read_csv(source, chunksize=chunksize)
+
+    for chunk in chunks:
+        if selected is None:
+            if wide and year_range is not None:
+                identifiers = columns or [column for column in chunk.columns if not re.fullmatch(r"\d+", column)]
+                selected = list(identifiers) + year_columns_in_range(chunk.columns, year_range)
+            else:
+                selected = list(columns or chunk.columns)
+
+        if clean:
+            # Duplicates and means are evaluated on the complete rows, as clean_dataset() does.
+            chunk = deduplicator.filter(chunk)
+            means.update(chunk)
+
+        mask = np.ones(len(chunk), dtype=bool)
+        if entities is not None:
+            mask &= chunk["Entity"].isin(entities).values
+        if year_range is not None and not wide:
+            first, last = year_range
+            if first is not None:
+                mask &= (chunk["Year"] >= first).values
+            if last is not None:
+                mask &= (chunk["Year"] <= last).values
+        kept.append(chunk.loc[mask, selected])
+
+    if not kept:
+        return pd.DataFrame(columns=selected)
+    result = pd.concat(kept, ignore_index=True)
+
+    if clean:
+        # Fill missing numeric values with the means over the whole source.
+        if result.isnull().any().any():
+            result = result.fillna(means.means().reindex(result.columns).dropna())
+        if "Year" in result.columns:
+            result = result.sort_values(by="Year", kind="stable")
+        if "ID" in result.columns:
+            result = result.drop(columns=["ID"])
+
+    return result
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+from region_groups import load_region_groups, member_countries
+
+# Size of the real OWID datasets at scale 1: about 200 entities, temperatures for 1940-2024
+# (wide, one row per entity and month) and emissions for 1750-2023 (long).
+BASE_ENTITIES = 200
+TEMPERATURE_YEARS = (1940, 2024)
+EMISSIONS_YEARS = (1750, 2023)
+
+
+def entity_names(count):
+    """
+    Returns count entity names: the countries of the region definitions first (so the region
+    filters of the pipeline select data), then generic names.
+    """
+    countries = member_countries(load_region_groups()["groups"])[:count]
+    return countries + [f"Entity {index}" for index in range(count - len(countries))]
+
+
+def entity_codes(names):
+    """
+    Returns a unique three-letter-ish code for every entity name.
+    """
+    return [f"{name[:2].upper()}{index:03d}" for index, name in enumerate(names)]
+
+
+def make_temperature_dataset(scale=1, years=None, seed=0, missing=0.01, duplicates=0.005):
+    """
+    Creates a temperature dataset with the schema of the OWID "monthly average surface
+    temperatures by year" CSV: "Entity", "Code", "Year" (holding the month, 1-12) and one
+    column per year with the monthly mean temperatures.
+
+    The data is deterministic for a given seed. Every entity has its own mean temperature,
+    seasonal amplitude and warming trend, and a fraction of the values is missing and a
+    fraction of the rows is duplicated, so clean_dataset() has work to do.
+
+    Parameters:
+        scale (int): Multiplier of the number of entities (1 is about the size of the real file).
+        years (int): Number of year columns (default: 1940-2024 like the real file).
+        seed (int): Seed of the random generator.
+        missing (float): Fraction of missing temperature values.
+        duplicates (float): Fraction of duplicated rows.
+
+    Returns:
+        DataFrame: The wide temperature dataset.
+    """
+    rng = np.random.default_rng(seed)
+    first = TEMPERATURE_YEARS[0]
+    years = years or TEMPERATURE_YEARS[1] - first + 1
+    names = entity_names(BASE_ENTITIES * scale)
+    count = len(names)
+
+    month = np.tile(np.arange(1, 13), count)
+    mean = np.repeat(rng.uniform(-5, 28, count), 12)
+    amplitude = np.repeat(rng.uniform(1, 15, count), 12)
+    trend = np.repeat(rng.normal(0.02, 0.005, count), 12)
+    season = amplitude * np.cos(2 * np.pi * (month - 7) / 12)
+    elapsed = np.arange(years)
+    values = (mean + season)[:, None] + trend[:, None] * elapsed[None, :] + rng.normal(0, 0.8, (len(month), years))
+    values[rng.random(values.shape) < missing] = np.nan
+
+    df = pd.DataFrame({
+        "Entity": np.repeat(names, 12),
+        "Code": np.repeat(entity_codes(names), 12),
+        "Year": month,
+    })
+    df = pd.concat([df, pd.DataFrame(values, columns=[str(first + year) for year in elapsed])], axis=1)
+    return pd.concat([df, df.sample(frac=duplicates, random_state=seed)], ignore_index=True)
+
+
+def make_emissions_dataset(scale=1, years=None, seed=0):
+    """
+    Creates an emissions dataset with the schema of the OWID "annual CO2 emissions by region"
+    CSV: "Entity", "Code", "Year" and "emissions_total" (one row per entity and year).
+
+    Emissions grow exponentially from a small, entity-specific level with yearly noise.
+
+    Parameters:
+        scale (int): Multiplier of the number of entities (1 is about the size of the real file).
+        years (int): Number of years (default: 1750-2023 like the real file).
+        seed (int): Seed of the random generator.
+
+    Returns:
+        DataFrame: The long emissions dataset, sorted by entity and year.
+    """
+    rng = np.random.default_rng(seed + 1)
+    first = EMISSIONS_YEARS[0]
+    years = years or EMISSIONS_YEARS[1] - first + 1
+    names = entity_names(BASE_ENTITIES * scale)
+    count = len(names)
+
+    level = np.repeat(rng.lognormal(8, 2, count), years)
+    growth = np.repeat(rng.uniform(0.01, 0.04, count), years)
+    elapsed = np.tile(np.arange(years), count)
+    emissions = level * np.exp(growth * (elapsed - years + 1)) * rng.lognormal(0, 0.1, len(elapsed))
+
+    return pd.DataFrame({
+        "Entity": np.repeat(names, years),
+        "Code": np.repeat(entity_codes(names), years),
+        "Year": first + elapsed,
+        "emissions_total": emissions,
+    })
+
+
+def make_wide_temperature(entities=250, years=75, seed=0):
+    """
+    Creates a temperature dataset in the wide OWID layout: one row per entity and month
+    ("Entity", "Code", "Year" holding the month) and one column per year.
+
+    Parameters:
+        entities (int): Number of entities (the OWID file has about 200).
+        years (int): Number of year columns, starting at 1950.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        DataFrame: The wide temperature dataset.
+    """
+    rng = np.random.default_rng(seed)
+    names = [f"Entity {index}" for index in range(entities)]
+    df = pd.DataFrame({
+        "Entity": np.repeat(names, 12),
+        "Code": np.repeat([f"E{index:03d}" for index in range(entities)], 12),
+        "Year": np.tile(np.arange(1, 13), entities),
+    })
+    values = rng.normal(15, 8, size=(len(df), years))
+    return pd.concat([df, pd.DataFrame(values, columns=[str(1950 + year) for year in range(years)])], axis=1)
+
+
+def make_grouped_series(groups=250, years=75, seed=0):
+    """
+    Creates a long dataset with one yearly series per entity (shaped like the merged OWID data).
+
+    Parameters:
+        groups (int): Number of entities.
+        years (int): Number of years per entity.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        DataFrame: A dataset with the columns "Entity", "Year", "Temperature" and "emissions_total".
+    """
+    rng = np.random.default_rng(seed)
+    entity = np.repeat([f"Entity {index}" for index in range(groups)], years)
+    year = np.tile(np.arange(1950, 1950 + years), groups)
+    temperature = 15 + 0.02 * (year - 1950) + rng.normal(0, 0.5, len(year))
+    emissions = rng.lognormal(10, 1, len(year)) * (1 + 0.03 * (year - 1950))
+    return pd.DataFrame({"Entity": entity, "Year": year, "Temperature": temperature, "emissions_total": emissions})
@@ -1,7 +1,43 @@
+import gzip
+import json
 import os
+import shutil
+import tempfile
+import threading
+import time
 import unittest
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
 import pandas as pd
-from pipeline import main
+import plotly.graph_objects as go
+from pipeline import (main, clean_dataset, combine_region, summarize_region, aggregate_region_groups_parallel, calculate_p_values, filter_data, merge_datasets, summarize_yearly_temperature,
+                      transform_temperature_data, transform_temperature_yearly)
+from download_cache import DownloadCache, OfflineCacheMiss, make_session
+from fetcher import fetch_sources
+from fanout import open_shared_frame, write_shared_frames
+from service import AnalysisService, make_server
+from memo import MemoCache, default_cache, disabled, memoized
+from lazy_backend import LazyTransformChain
+from crosscorr import correlation_matrix, lagged_crosscorr
+from dashboard import build_dashboard, line_traces, lttb
+from resampling import resampling_tests
+from schemas import SCHEMAS, SchemaError, read_csv
+from rolling import rolling_corr, rolling_linregress, rolling_mean, rolling_trends
+from incremental import IncrementalUpdater, changed_keys, write_outputs
+from snapshot_store import SnapshotStore
+from stages import Stage, StageGraph
+from rendering import FigureSpec, export_figures
+from regression import grouped_linregress, grouped_polyfit
+from synthetic import make_emissions_dataset, make_grouped_series, make_temperature_dataset, make_wide_temperature
+from benchmarks import find_regressions
+from streaming import stream_csv
+from entity_index import EntityYearIndex, filter_indexed, merge_indexed
+from output_writer import load_manifest, verify_manifest, write_artifacts
+from partitioned import partitioned_monthly_summaries, plan_partitions
+from profiling import Profiler, profiled
+from region_groups import aggregate_region_groups, load_region_groups, select_region
 
 class TestOutputFiles(unittest.TestCase):
     @classmethod
@@ -59,5 +95,1431 @@ class TestOutputFiles(unittest.TestCase):
                 self.assertFalse(df.empty, f"CSV file {file_path} is empty.")
                 self.assertGreater(len(df), 0, f"CSV file {file_path} has no data rows.")
 
+    def test_manifest_matches_output_files(self):
+        """
+        Test that every output file is complete: listed in the manifest with its row count and
+        size, matching its checksum, and no temporary file of an unfinished write is left.
+        """
+        self.assertEqual(verify_manifest(self.base_directory), [])
+        artifacts = load_manifest(self.base_directory)["artifacts"]
+        for file in ["temperature_large_graph.pdf", "co2_emissions_large_graph.pdf", "temperature_vs_emissions.pdf",
+                     "temperature_trendlines.pdf", "df_combined.csv", "yearly_summarysouth.csv",
+                     "yearly_summarynorden.csv"]:
+            with self.subTest(file=file):
+                self.assertIn(file, artifacts)
+                file_path = os.path.join(self.base_directory, file)
+                self.assertEqual(artifacts[file]["bytes"], os.path.getsize(file_path))
+                if file.endswith(".csv"):
+                    self.assertEqual(artifacts[file]["rows"], len(pd.read_csv(file_path)))
+        self.assertEqual([file for file in os.listdir(self.base_directory) if file.endswith(".tmp")], [])
+
+class StandInSourceHandler(BaseHTTPRequestHandler):
+    """
+    Minimal stand-in for the Our World In Data server: serves the bodies registered in
+    `files`, supports ETag revalidation and counts the full downloads per path. Responses can
+    be delayed, gzip-compressed on request, and the first requests of a path can fail with 503.
+    """
+    files = {}
+    downloads = {}
+    failures = {}
+    delay = 0
+    compress = False
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        body = self.files.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        if self.failures.get(self.path):
+            self.failures[self.path] -= 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        etag = '"%d"' % hash(body)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        self.downloads[self.path] = self.downloads.get(self.path, 0) + 1
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        if self.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestDownloadCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Start the stand-in HTTP server on a free local port.
+        """
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInSourceHandler)
+        cls.base_url = "http://127.0.0.1:%d" % cls.server.server_address[1]
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        """
+        Use a fresh cache directory and a fresh set of served files for every test.
+        """
+        self.directory = tempfile.mkdtemp()
+        StandInSourceHandler.files = {"/emissions.csv": b"Entity,Year,emissions_total\nChile,2000,1.5\n"}
+        StandInSourceHandler.downloads = {}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_revalidation_reuses_cached_body(self):
+        """
+        Test that an unchanged file is downloaded once and then revalidated with a 304.
+        """
+        cache = DownloadCache(self.directory, offline=False)
+        url = self.base_url + "/emissions.csv"
+
+        first = cache.fetch(url)
+        second = cache.fetch(url)
+
+        self.assertEqual(first, second)
+        self.assertEqual(StandInSourceHandler.downloads["/emissions.csv"], 1)
+        self.assertEqual(pd.read_csv(second)["emissions_total"].iloc[0], 1.5)
+
+    def test_changed_file_is_downloaded_again(self):
+        """
+        Test that a changed file replaces the cached body and the old object is dropped.
+        """
+        cache = DownloadCache(self.directory, offline=False)
+        url = self.base_url + "/emissions.csv"
+
+        first = cache.fetch(url)
+        StandInSourceHandler.files["/emissions.csv"] = b"Entity,Year,emissions_total\nChile,2000,2.5\n"
+        second = cache.fetch(url)
+
+        self.assertNotEqual(first, second)
+        self.assertFalse(os.path.exists(first))
+        self.assertEqual(StandInSourceHandler.downloads["/emissions.csv"], 2)
+
+    def test_offline_mode_serves_only_from_cache(self):
+        """
+        Test that offline mode serves cached files without requests and fails on a cache miss.
+        """
+        url = self.base_url + "/emissions.csv"
+        DownloadCache(self.directory, offline=False).fetch(url)
+
+        offline_cache = DownloadCache(self.directory, offline=True)
+        StandInSourceHandler.files = {}
+        self.assertTrue(os.path.exists(offline_cache.fetch(url)))
+        with self.assertRaises(OfflineCacheMiss):
+            offline_cache.fetch(self.base_url + "/temperature.csv")
+
+    def test_size_eviction_drops_least_recently_used(self):
+        """
+        Test that the size budget evicts the least recently used entry.
+        """
+        StandInSourceHandler.files["/temperature.csv"] = b"Entity,Code,Year,1950\nChile,CHL,1,10.0\n"
+        first_size = len(StandInSourceHandler.files["/emissions.csv"])
+        cache = DownloadCache(self.directory, max_bytes=first_size + 1, offline=False)
+
+        cache.fetch(self.base_url + "/emissions.csv")
+        cache.fetch(self.base_url + "/temperature.csv")
+
+        urls = [entry["url"] for entry in cache.entries()]
+        self.assertEqual(urls, [self.base_url + "/temperature.csv"])
+
+
+class TestSnapshotStore(unittest.TestCase):
+    def setUp(self):
+        """
+        Create a snapshot store in a temporary directory with small row groups.
+        """
+        self.directory = tempfile.mkdtemp()
+        self.store = SnapshotStore(self.directory, row_group_size=10)
+        self.df = pd.DataFrame({
+            "Entity": ["Chile"] * 30 + ["Peru"] * 30,
+            "Code": ["CHL"] * 30 + ["PER"] * 30,
+            "Year": list(range(1990, 2020)) * 2,
+            "emissions_total": [float(value) for value in range(60)],
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_round_trip_preserves_dtypes(self):
+        """
+        Test that a saved snapshot loads back identical, including dtypes.
+        """
+        self.store.save("emissions_raw", self.df)
+        pd.testing.assert_frame_equal(self.store.load("emissions_raw"), self.df)
+        self.assertEqual(self.store.manifest()["emissions_raw"]["rows"], 60)
+
+    def test_load_reads_only_requested_columns_and_rows(self):
+        """
+        Test that column projection and row filters are applied when loading.
+        """
+        self.store.save("emissions_raw", self.df, sort_by=["Entity", "Year"])
+        loaded = self.store.load(
+            "emissions_raw",
+            columns=["Entity", "Year", "emissions_total"],
+            filters=[("Entity", "==", "Peru"), ("Year", ">=", 2010)],
+        )
+        self.assertEqual(list(loaded.columns), ["Entity", "Year", "emissions_total"])
+        self.assertEqual(len(loaded), 10)
+        self.assertTrue((loaded["Entity"] == "Peru").all())
+
+
+class TestStageGraph(unittest.TestCase):
+    def setUp(self):
+        """
+        Build a small two-stage graph whose stage functions count their calls.
+        """
+        self.directory = tempfile.mkdtemp()
+        self.calls = {"load": 0, "scale": 0}
+
+        def load():
+            self.calls["load"] += 1
+            return pd.DataFrame({"Year": [2000, 2001], "Temperature": [1.0, 2.0]})
+
+        def scale(frame, factor):
+            self.calls["scale"] += 1
+            return frame.assign(Temperature=frame["Temperature"] * factor)
+
+        self.load, self.scale = load, scale
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def build_graph(self, factor):
+        graph = StageGraph(SnapshotStore(os.path.join(self.directory, "snapshots")),
+                           os.path.join(self.directory, "state"))
+        graph.add(Stage("load", self.load, outputs=["raw"]))
+        graph.add(Stage("scale", self.scale, inputs={"frame": "raw"}, outputs=["scaled"],
+                        params={"factor": factor}))
+        return graph
+
+    def test_unchanged_stages_are_skipped(self):
+        """
+        Test that a second run skips all stages and a param change re-runs only the affected stage.
+        """
+        self.build_graph(2.0).run()
+        self.assertEqual(self.build_graph(2.0).run()["skipped"], ["load", "scale"])
+
+        graph = self.build_graph(3.0)
+        self.assertEqual(graph.run(), {"executed": ["scale"], "skipped": ["load"]})
+        self.assertEqual(self.calls, {"load": 1, "scale": 2})
+        self.assertEqual(graph.load("scaled")["Temperature"].tolist(), [3.0, 6.0])
+
+    def test_invalidate_forces_a_stage(self):
+        """
+        Test that invalidating a stage re-runs it, while unchanged outputs keep dependents skipped.
+        """
+        self.build_graph(2.0).run()
+        graph = self.build_graph(2.0)
+        graph.invalidate("load")
+        self.assertEqual(graph.run(), {"executed": ["load"], "skipped": ["scale"]})
+
+
+class TestFigureExport(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_figures_are_exported_through_the_pool(self):
+        """
+        Test that figure specs are exported by the renderer pool with one timing per file.
+        """
+        import plotly.graph_objects as go
+
+        specs = [
+            FigureSpec(f"figure_{index}", go.Figure(go.Scatter(x=[1, 2], y=[index, index + 1])),
+                       os.path.join(self.directory, f"figure_{index}.pdf"), formats=["html"])
+            for index in range(3)
+        ]
+        timings = export_figures(specs, workers=2)
+
+        self.assertEqual([timing["figure"] for timing in timings], ["figure_0", "figure_1", "figure_2"])
+        for timing in timings:
+            self.assertTrue(os.path.exists(timing["path"]))
+            self.assertTrue(timing["path"].endswith(".html"))
+
+
+class TestGroupedRegression(unittest.TestCase):
+    def setUp(self):
+        self.df = make_grouped_series(groups=20, years=40, seed=1)
+
+    def test_linregress_matches_scipy(self):
+        """
+        Test that the batched regression matches scipy.stats.linregress for every group.
+        """
+        from scipy.stats import linregress
+
+        results = grouped_linregress(self.df["Entity"], self.df["Year"], self.df["emissions_total"])
+        for entity, entity_data in self.df.groupby("Entity", sort=False):
+            expected = linregress(entity_data["Year"], entity_data["emissions_total"])
+            with self.subTest(entity=entity):
+                row = results.loc[entity]
+                np.testing.assert_allclose(
+                    [row["slope"], row["intercept"], row["rvalue"], row["pvalue"], row["stderr"], row["intercept_stderr"]],
+                    [expected.slope, expected.intercept, expected.rvalue, expected.pvalue,
+                     expected.stderr, expected.intercept_stderr],
+                    rtol=1e-9,
+                )
+
+    def test_polyfit_matches_numpy(self):
+        """
+        Test that the batched polynomial fit matches np.polyfit for every group.
+        """
+        coefficients, fitted = grouped_polyfit(self.df["Entity"], self.df["Year"], self.df["Temperature"], deg=4)
+        for entity, rows in self.df.groupby("Entity", sort=False).indices.items():
+            x = self.df["Year"].values[rows]
+            expected = np.polyfit(x, self.df["Temperature"].values[rows], deg=4)
+            with self.subTest(entity=entity):
+                np.testing.assert_allclose(fitted[rows], np.polyval(expected, x), rtol=1e-6)
+                # Raw-basis coefficients of a degree-4 fit over years are ill-conditioned, so they are
+                # compared through the polynomial they describe.
+                np.testing.assert_allclose(np.polyval(coefficients.loc[entity].values, x),
+                                           np.polyval(expected, x), rtol=1e-6)
+
+
+class TestStreamingIngestion(unittest.TestCase):
+    def setUp(self):
+        """
+        Write a small wide temperature file with duplicate rows and missing values.
+        """
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "temperature.csv")
+        rows = []
+        for entity in ["Chile", "Peru", "France"]:
+            for month in range(1, 13):
+                rows.append([entity, entity[:3].upper(), month, 10.0 + month, None if month == 3 else 20.0 + month])
+        rows += rows[:5]  # duplicates that end up in later chunks
+        pd.DataFrame(rows, columns=["Entity", "Code", "Year", "1990", "1991"]).to_csv(self.path, index=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_streamed_cleaning_matches_clean_dataset(self):
+        """
+        Test that cleaning in chunks with pushed-down filters equals cleaning the full file and filtering.
+        """
+        expected = clean_dataset(pd.read_csv(self.path))
+        expected = expected[expected["Entity"].isin(["Chile", "Peru"])][["Entity", "Code", "Year", "1991"]]
+
+        streamed = stream_csv(self.path, entities=["Chile", "Peru"], year_range=(1991, None),
+                              wide=True, clean=True, chunksize=7)
+
+        key = ["Entity", "Year"]
+        pd.testing.assert_frame_equal(
+            streamed.sort_values(key).reset_index(drop=True),
+            expected.sort_values(key).reset_index(drop=True),
+        )
+
+    def test_schema_is_applied_to_every_chunk(self):
+        """
+        Test that streaming with a schema parses every chunk with the declared dtypes and fails
+        with a SchemaError on a malformed file.
+        """
+        streamed = stream_csv(self.path, wide=True, clean=True, chunksize=7, schema=SCHEMAS["temperature"],
+                              name="temperature")
+        self.assertEqual(len(streamed), 36)
+        self.assertEqual(streamed["Year"].dtype, np.int64)
+
+        with open(self.path, "a") as handle:
+            handle.write("Chile,CHI,1,unknown,20.0\n")
+        with self.assertRaises(SchemaError):
+            stream_csv(self.path, wide=True, clean=True, chunksize=7, schema=SCHEMAS["temperature"],
+                       name="temperature")
+
+
+class TestYearlyTemperatureTransform(unittest.TestCase):
+    def test_direct_transform_matches_melt_and_groupby(self):
+        """
+        Test that the reshape-free yearly transform equals melt + groupby, with compact dtypes.
+        """
+        df = make_wide_temperature(entities=15, years=20, seed=2)
+        df.iloc[4, 6] = np.nan
+        df.iloc[30, 10] = np.nan
+
+        expected = summarize_yearly_temperature(transform_temperature_data(df.copy()))
+        result = transform_temperature_yearly(df.copy())
+
+        self.assertEqual(result["Entity"].dtype, "category")
+        self.assertEqual(result["Year"].dtype, np.int16)
+        pd.testing.assert_frame_equal(result, expected)
+
+    def test_empty_input_gives_an_empty_result(self):
+        """
+        Test that a dataset without rows gives an empty result with the usual columns, like melt + groupby.
+        """
+        df = make_wide_temperature(entities=3, years=5, seed=2).head(0)
+        expected = summarize_yearly_temperature(transform_temperature_data(df.copy()))
+        result = transform_temperature_yearly(df.copy())
+        self.assertTrue(result.empty)
+        self.assertEqual(list(result.columns), list(expected.columns))
+        self.assertEqual(result["Year"].dtype, np.int16)
+
+
+class TestEntityYearIndex(unittest.TestCase):
+    def setUp(self):
+        """
+        Build shuffled temperature and emissions data with partially overlapping years.
+        """
+        series = make_grouped_series(groups=12, years=30, seed=3).sample(frac=1, random_state=0)
+        self.temperature = series[["Entity", "Year", "Temperature"]]
+        emissions = series[series["Year"] >= 1960][["Entity", "Year", "emissions_total"]]
+        self.emissions = emissions.assign(Code="X")
+        self.regions = ["Entity 1", "Entity 4", "Entity 7", "Missing"]
+
+    @staticmethod
+    def sorted_frame(df):
+        return df.sort_values(["Entity", "Year"]).reset_index(drop=True)
+
+    def test_filter_matches_filter_data(self):
+        """
+        Test that the indexed filter selects the same rows as filter_data().
+        """
+        expected = filter_data(self.temperature, self.emissions, self.regions)
+        result = filter_indexed(EntityYearIndex(self.temperature), EntityYearIndex(self.emissions), self.regions)
+        for expected_frame, result_frame in zip(expected, result):
+            pd.testing.assert_frame_equal(self.sorted_frame(result_frame), self.sorted_frame(expected_frame))
+
+    def test_merge_matches_merge_datasets(self):
+        """
+        Test that the sorted merge join equals filter_data() followed by merge_datasets().
+        """
+        expected = merge_datasets(*filter_data(self.temperature, self.emissions, self.regions))
+        result = merge_indexed(EntityYearIndex(self.temperature), EntityYearIndex(self.emissions), self.regions)
+        pd.testing.assert_frame_equal(result, self.sorted_frame(expected))
+
+    def test_merge_pairs_repeated_keys_like_pd_merge(self):
+        """
+        Test that repeated (Entity, Year) keys on either side give every pair, like pd.merge().
+        """
+        repeated = self.emissions[self.emissions["Entity"] == "Entity 4"].head(3)
+        emissions = pd.concat([self.emissions, repeated.assign(emissions_total=-1.0)], ignore_index=True)
+        temperature = pd.concat([self.temperature, self.temperature.head(2)], ignore_index=True)
+        expected = merge_datasets(*filter_data(temperature, emissions, self.regions))
+        result = merge_indexed(EntityYearIndex(temperature), EntityYearIndex(emissions), self.regions)
+        self.assertEqual(len(result), len(expected))
+        pd.testing.assert_frame_equal(self.sorted_frame(result).sort_values(["Entity", "Year", "emissions_total"],
+                                                                            ignore_index=True),
+                                      self.sorted_frame(expected).sort_values(["Entity", "Year", "emissions_total"],
+                                                                              ignore_index=True))
+        self.assertTrue(merge_indexed(EntityYearIndex(temperature), EntityYearIndex(emissions.head(0)), self.regions).empty)
+
+    def test_missing_entities_are_not_joined(self):
+        """
+        Test that rows without an entity are not indexed and never match the entity "nan".
+        """
+        temperature = pd.concat([self.temperature, pd.DataFrame({"Entity": [None, None], "Year": [1990, 1991],
+                                                                 "Temperature": [1.0, 2.0]})], ignore_index=True)
+        emissions = pd.concat([self.emissions, pd.DataFrame({"Entity": ["nan", None], "Year": [1990, 1991],
+                                                             "emissions_total": [3.0, 4.0], "Code": "X"})],
+                              ignore_index=True)
+        temperature_index = EntityYearIndex(temperature)
+        self.assertEqual(len(temperature_index), len(self.temperature))
+        expected = pd.merge(temperature.dropna(subset=["Entity"]), emissions.dropna(subset=["Entity"]),
+                            on=["Entity", "Year"])
+        result = merge_indexed(temperature_index, EntityYearIndex(emissions))
+        pd.testing.assert_frame_equal(result, self.sorted_frame(expected))
+        self.assertNotIn("nan", set(result["Entity"]))
+
+class TestRegionGroups(unittest.TestCase):
+    def setUp(self):
+        """
+        Build merged country data and overlapping region groups.
+        """
+        self.combined = make_grouped_series(groups=10, years=20, seed=4).sample(frac=1, random_state=1)
+        self.groups = {
+            "a": {"label": "Group A", "countries": ["Entity 0", "Entity 1", "Entity 2", "Entity 3"]},
+            "b": {"label": "Group B", "countries": ["Entity 3", "Entity 4", "Missing"]},
+            "c": {"label": "Group C", "countries": ["Entity 1", "Entity 5", "Entity 9"]},
+        }
+
+    def test_matches_per_region_summaries(self):
+        """
+        Test that the single grouped reduction equals one filter + summarize pass per group,
+        including countries that belong to several groups.
+        """
+        summaries = aggregate_region_groups(self.combined, self.groups)
+        self.assertEqual(list(summaries["Region"].unique()), ["Group A", "Group B", "Group C"])
+        for group in self.groups.values():
+            members = self.combined[self.combined["Entity"].isin(group["countries"])]
+            expected = summarize_region(members, group["label"])
+            pd.testing.assert_frame_equal(select_region(summaries, group["label"]), expected)
+
+    def test_default_definitions(self):
+        """
+        Test that the shipped region definitions name two compared groups with output files.
+        """
+        config = load_region_groups()
+        self.assertEqual(len(config["comparison"]), 2)
+        for key in config["comparison"]:
+            self.assertIn("output", config["groups"][key])
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_stage_and_function_spans(self):
+        """
+        Test that a profiled graph run records stages, nested decorated functions and skipped stages,
+        and that the report and trace files are valid JSON.
+        """
+        @profiled
+        def double(frame):
+            return pd.concat([frame, frame], ignore_index=True)
+
+        def build():
+            graph = StageGraph(SnapshotStore(os.path.join(self.directory, "snapshots")),
+                               os.path.join(self.directory, "state"))
+            graph.add(Stage("load", lambda: pd.DataFrame({"Year": [2000, 2001, 2002]}), outputs=["raw"]))
+            graph.add(Stage("double", double, inputs={"frame": "raw"}, outputs=["doubled"]))
+            return graph
+
+        with Profiler() as profiler:
+            graph = build()
+            graph.profiler = profiler
+            graph.run()
+        spans = {(span["name"], span["kind"]): span for span in profiler.spans}
+        self.assertEqual(spans[("double", "stage")]["rows_in"], 3)
+        self.assertEqual(spans[("double", "function")]["rows_out"], 6)
+        self.assertEqual(spans[("double", "function")]["depth"], 1)
+        for key in ("wall_seconds", "cpu_seconds", "alloc_peak_mb", "alloc_delta_mb"):
+            self.assertIn(key, spans[("double", "stage")])
+
+        with Profiler() as profiler:
+            graph = build()
+            graph.profiler = profiler
+            graph.run()
+        self.assertTrue(all(span.get("skipped") for span in profiler.spans))
+
+        report_path = os.path.join(self.directory, "report.json")
+        trace_path = os.path.join(self.directory, "trace.json")
+        profiler.write_report(report_path)
+        profiler.write_trace(trace_path)
+        with open(report_path, encoding="utf-8") as handle:
+            self.assertEqual(len(json.load(handle)["spans"]), 2)
+        with open(trace_path, encoding="utf-8") as handle:
+            self.assertEqual(json.load(handle)["traceEvents"], [])
+
+    def test_decorator_is_transparent_without_profiler(self):
+        """
+        Test that a decorated function runs normally when profiling is off.
+        """
+        self.assertEqual(profiled(lambda value: value + 1)(1), 2)
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def test_synthetic_datasets_have_the_owid_schema(self):
+        """
+        Test that the synthetic generators are deterministic, follow the OWID schemas and scale.
+        """
+        temperature = make_temperature_dataset(scale=1, years=10, seed=5)
+        emissions = make_emissions_dataset(scale=2, years=30, seed=5)
+        pd.testing.assert_frame_equal(temperature, make_temperature_dataset(scale=1, years=10, seed=5))
+        self.assertEqual(list(temperature.columns[:3]), ["Entity", "Code", "Year"])
+        self.assertEqual(list(temperature.columns[3:]), [str(year) for year in range(1940, 1950)])
+        self.assertEqual(list(emissions.columns), ["Entity", "Code", "Year", "emissions_total"])
+        self.assertEqual(emissions["Entity"].nunique(), 2 * temperature["Entity"].nunique())
+        self.assertTrue(temperature.duplicated().any())
+        self.assertIn("United States", set(emissions["Entity"]))
+
+    def test_regressions_are_detected_against_the_history(self):
+        """
+        Test that slower timings and larger allocations are reported and noise is ignored.
+        """
+        history = [
+            {"benchmark": "pipeline", "scale": 1, "machine": "m", "results": {"a_seconds": 1.0, "a_peak_mb": 10.0}},
+            {"benchmark": "pipeline", "scale": 1, "machine": "m", "results": {"a_seconds": 1.2, "a_peak_mb": 10.0}},
+            {"benchmark": "pipeline", "scale": 10, "machine": "m", "results": {"a_seconds": 0.1, "a_peak_mb": 1.0}},
+        ]
+        self.assertEqual(find_regressions(history, "pipeline", 1, {"a_seconds": 1.2, "a_peak_mb": 10.2}, machine="m"), [])
+        regressions = find_regressions(history, "pipeline", 1, {"a_seconds": 1.5, "a_peak_mb": 12.0}, machine="m")
+        self.assertEqual(len(regressions), 2)
+        self.assertEqual(find_regressions([], "pipeline", 1, {"a_seconds": 9.0}, machine="m"), [])
+
+class TestConcurrentFetcher(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Start the stand-in HTTP server on a free local port.
+        """
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInSourceHandler)
+        cls.base_url = "http://127.0.0.1:%d" % cls.server.server_address[1]
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        """
+        Serve three small CSV sources from a fresh cache directory.
+        """
+        self.directory = tempfile.mkdtemp()
+        StandInSourceHandler.files = {
+            f"/source{index}.csv": f"Entity,Year,value\nChile,2000,{index}\n".encode() for index in range(3)
+        }
+        StandInSourceHandler.downloads = {}
+        self.sources = {f"source{index}": f"{self.base_url}/source{index}.csv" for index in range(3)}
+
+    def tearDown(self):
+        StandInSourceHandler.failures = {}
+        StandInSourceHandler.delay = 0
+        StandInSourceHandler.compress = False
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_sources_are_fetched_concurrently(self):
+        """
+        Test that slow sources are downloaded in parallel, parsed in source order and timed.
+        """
+        StandInSourceHandler.delay = 0.3
+        start = time.perf_counter()
+        values, timings = fetch_sources(self.sources, DownloadCache(self.directory, offline=False), report=False)
+
+        self.assertLess(time.perf_counter() - start, 0.8)
+        self.assertEqual(list(values), list(self.sources))
+        self.assertEqual([df["value"].iloc[0] for df in values.values()], [0, 1, 2])
+        self.assertEqual({timing["status"] for timing in timings}, {"downloaded"})
+        self.assertTrue(all(timing["seconds"] >= 0.3 for timing in timings))
+
+    def test_transient_errors_are_retried(self):
+        """
+        Test that 503 responses are retried with backoff until the download succeeds.
+        """
+        StandInSourceHandler.failures = {"/source1.csv": 2}
+        cache = DownloadCache(self.directory, offline=False, session=make_session(retries=3, backoff=0.01))
+        values, _ = fetch_sources(self.sources, cache, report=False)
+        self.assertEqual(values["source1"]["value"].iloc[0], 1)
+        self.assertEqual(StandInSourceHandler.failures["/source1.csv"], 0)
+
+    def test_compressed_transfer_is_decoded(self):
+        """
+        Test that gzip-encoded responses are stored and parsed decompressed.
+        """
+        StandInSourceHandler.compress = True
+        values, _ = fetch_sources(self.sources, DownloadCache(self.directory, offline=False), report=False)
+        self.assertEqual(values["source2"]["value"].iloc[0], 2)
+
+    def test_shared_urls_stay_pinned_until_every_batch_ends(self):
+        """
+        Test that a batch finishing first does not unpin the URLs another running batch shares.
+        """
+        cache = DownloadCache(self.directory, offline=False)
+        second_done = threading.Event()
+        pinned_while_parsing = []
+
+        def slow_parse(path):
+            second_done.wait(5)
+            pinned_while_parsing.append(cache.pinned[self.sources["source0"]])
+            return path
+
+        first = threading.Thread(target=fetch_sources, args=({"source0": self.sources["source0"]}, cache),
+                                 kwargs={"parse": slow_parse, "report": False})
+        first.start()
+        fetch_sources({"source0": self.sources["source0"], "source1": self.sources["source1"]}, cache,
+                      parse=None, report=False)
+        second_done.set()
+        first.join()
+        self.assertEqual(pinned_while_parsing, [1])
+        self.assertEqual(+cache.pinned, {})
+
+class TestRegionFanOut(unittest.TestCase):
+    def setUp(self):
+        """
+        Build yearly temperatures and emissions for overlapping region groups.
+        """
+        series = make_grouped_series(groups=10, years=20, seed=6)
+        self.temperature = series[["Entity", "Year", "Temperature"]].astype({"Entity": "category"})
+        self.emissions = series[series["Year"] >= 1955][["Entity", "Year", "emissions_total"]]
+        self.groups = {
+            f"group{index}": {"label": f"Group {index}", "countries": [f"Entity {entity}" for entity in members]}
+            for index, members in enumerate([(0, 1, 2), (2, 3), (4, 5, 6, 7), (1, 8, 9)])
+        }
+
+    def test_shared_frames_round_trip(self):
+        """
+        Test that frames shared through memory-mapped Arrow files are read back unchanged.
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            paths = write_shared_frames(directory, {"temperature": self.temperature})
+            pd.testing.assert_frame_equal(open_shared_frame(paths["temperature"]), self.temperature.reset_index(drop=True))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def test_parallel_matches_single_reduction(self):
+        """
+        Test that fanning the groups out across processes gathers the same summaries, in
+        definition order, as the serial run and the single grouped reduction.
+        """
+        parallel = aggregate_region_groups_parallel(self.temperature, self.emissions, self.groups, workers=2)
+        serial = aggregate_region_groups_parallel(self.temperature, self.emissions, self.groups, workers=0)
+        combined = merge_datasets(self.temperature, self.emissions)
+        pd.testing.assert_frame_equal(parallel, serial)
+        pd.testing.assert_frame_equal(parallel, aggregate_region_groups(combined, self.groups), check_dtype=False)
+        self.assertEqual(list(parallel["Region"].unique()), [f"Group {index}" for index in range(4)])
+
+class TestAnalysisService(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Start the service on a free local port, loading synthetic datasets.
+        """
+        cls.loads = 0
+
+        def loader():
+            cls.loads += 1
+            temperature = transform_temperature_yearly(make_temperature_dataset(scale=1, years=15, seed=cls.loads))
+            return temperature, make_emissions_dataset(scale=1, years=300, seed=cls.loads)
+
+        cls.service = AnalysisService(loader=loader)
+        cls.service.refresh()
+        cls.server = make_server(cls.service, port=0)
+        cls.base_url = "http://127.0.0.1:%d" % cls.server.server_address[1]
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def get(self, path):
+        with urllib.request.urlopen(self.base_url + path) as response:
+            return json.loads(response.read()), response.headers.get("X-Cache")
+
+    def test_summary_matches_pipeline_and_is_cached(self):
+        """
+        Test that an ad-hoc country list is summarized like the pipeline does and cached afterwards.
+        """
+        path = "/summary?countries=Chile,Peru,Brazil&label=Andes"
+        body, cache_status = self.get(path)
+        self.assertEqual(cache_status, "miss")
+        self.assertEqual(self.get(path)[1], "hit")
+
+        state = self.service.state
+        expected = summarize_region(
+            combine_region(state.temperature_index.frame, state.emissions_index.frame, ["Chile", "Peru", "Brazil"]),
+            "Andes",
+        )
+        result = pd.DataFrame(body["data"])
+        np.testing.assert_allclose(result["Temperature"], expected["Temperature"])
+        np.testing.assert_allclose(result["emissions_total"], expected["emissions_total"])
+
+    def test_regression_figure_and_errors(self):
+        """
+        Test the regression and figure endpoints and the error responses.
+        """
+        body, _ = self.get("/regression?group=north_america&group=south_america")
+        self.assertEqual([row["Region"] for row in body["data"]], ["North amerika", "South amerika"])
+        figure, _ = self.get("/figure/temperature_by_region")
+        self.assertIn("data", figure["data"])
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.get("/summary?group=atlantis")
+        self.assertEqual(context.exception.code, 400)
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.get("/figure/temperature_by_region?group=usmca")
+        self.assertEqual(context.exception.code, 400)
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.get("/figure/temperature_vs_emissions?countries=Atlantis")
+        self.assertEqual(context.exception.code, 400)
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.get("/figure/unknown")
+        self.assertEqual(context.exception.code, 404)
+
+    def test_unexpected_errors_are_answered(self):
+        """
+        Test that an unexpected exception is answered with "500 Internal Server Error" (not a
+        dropped connection or a 404 for an internal KeyError).
+        """
+        answer = self.service.answer
+        self.service.answer = lambda *args: {}["missing"]
+        try:
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                self.get("/summary?countries=Chile&label=Internal")
+            self.assertEqual(context.exception.code, 500)
+        finally:
+            self.service.answer = answer
+
+    def test_refresh_swaps_in_new_data(self):
+        """
+        Test that a refresh swaps in a new dataset version and invalidates the cached results.
+        """
+        before, _ = self.get("/summary?group=mercosur")
+        self.service.refresh_in_background().join()
+        after, cache_status = self.get("/summary?group=mercosur")
+        self.assertEqual(after["version"], before["version"] + 1)
+        self.assertEqual(cache_status, "miss")
+        self.assertNotEqual(after["data"], before["data"])
+
+class TestMemoCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_results_are_keyed_by_the_relevant_columns(self):
+        """
+        Test that a memoized function only recomputes when the hashed columns change.
+        """
+        cache = MemoCache(os.path.join(self.directory, "memo"))
+        calls = []
+
+        @memoized(columns={"frame": ["Year", "Temperature"]}, cache=cache)
+        def mean_temperature(frame):
+            calls.append(1)
+            return frame["Temperature"].mean()
+
+        frame = pd.DataFrame({"Year": [2000, 2001], "Temperature": [1.0, 3.0], "Note": ["a", "b"]})
+        self.assertEqual(mean_temperature(frame), 2.0)
+        self.assertEqual(mean_temperature(frame.assign(Note=["c", "d"])), 2.0)
+        self.assertEqual(mean_temperature(frame.assign(Temperature=[1.0, 5.0])), 3.0)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual((cache.stats()["hits"], cache.stats()["misses"]), (1, 2))
+
+    def test_changed_callees_invalidate_the_results(self):
+        """
+        Test that the source code of the used functions is part of the key, and that disabled()
+        bypasses the process-wide cache.
+        """
+        cache = MemoCache(os.path.join(self.directory, "memo"))
+        calls = []
+
+        def double(value):
+            return 2 * value
+
+        def triple(value):
+            return 3 * value
+
+        def scaled_with(helper):
+            @memoized(cache=cache, uses=[helper])
+            def scaled(value):
+                calls.append(1)
+                return helper(value)
+            return scaled
+
+        self.assertEqual(scaled_with(double)(2), 4)
+        self.assertEqual(scaled_with(double)(2), 4)
+        self.assertEqual(scaled_with(triple)(2), 6)
+        self.assertEqual(len(calls), 2)
+
+        previous = default_cache()
+        with disabled():
+            self.assertFalse(default_cache().enabled)
+        self.assertIs(default_cache(), previous)
+
+    def test_eviction_keeps_the_cache_within_its_budget(self):
+        """
+        Test that the least recently used entries are evicted once the budget is exceeded.
+        """
+        cache = MemoCache(os.path.join(self.directory, "memo"), max_bytes=3000)
+        for index in range(5):
+            cache.put(f"key{index}", b"x" * 1000)
+            os.utime(os.path.join(cache.directory, f"key{index}.pkl"), (index, index))
+        self.assertLessEqual(cache.stats()["bytes"], 3000)
+        self.assertFalse(cache.get("key0")[0])
+        self.assertTrue(cache.get("key4")[0])
+
+    def test_unchanged_figures_are_not_rendered_again(self):
+        """
+        Test that exporting an unchanged figure restores the file from the cache.
+        """
+        import plotly.graph_objects as go
+
+        cache = MemoCache(os.path.join(self.directory, "memo"))
+        path = os.path.join(self.directory, "figure.html")
+        spec = lambda y: FigureSpec("figure", go.Figure(go.Scatter(x=[1, 2], y=y)), path)
+
+        self.assertFalse(export_figures([spec([1, 2])], workers=0, cache=cache)[0]["cached"])
+        os.remove(path)
+        self.assertTrue(export_figures([spec([1, 2])], workers=0, cache=cache)[0]["cached"])
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(export_figures([spec([2, 1])], workers=0, cache=cache)[0]["cached"])
+
+
+class TestLazyBackend(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Write synthetic sources (with missing values and duplicate rows) as CSV files.
+        """
+        cls.directory = tempfile.mkdtemp()
+        cls.temperature_path = os.path.join(cls.directory, "temperature.csv")
+        cls.emissions_path = os.path.join(cls.directory, "emissions.csv")
+        make_temperature_dataset(scale=1, seed=8).to_csv(cls.temperature_path, index=False)
+        make_emissions_dataset(scale=1, seed=8).to_csv(cls.emissions_path, index=False)
+        cls.temperature = pd.read_csv(cls.temperature_path)
+        cls.emissions = pd.read_csv(cls.emissions_path)
+        cls.countries = sorted(cls.temperature["Entity"].unique())[:6]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def test_matches_eager_chain(self):
+        """
+        Test that the lazy plans give the same merged data and region summary as the eager
+        clean/transform/filter/merge/summarize chain.
+        """
+        yearly = summarize_yearly_temperature(transform_temperature_data(self.temperature))
+        combined = merge_datasets(*filter_data(yearly, self.emissions, self.countries))
+        combined = combined.sort_values(["Entity", "Year"]).reset_index(drop=True)
+
+        chain = LazyTransformChain(self.temperature_path, self.emissions_path)
+        lazy_combined = chain.combined(self.countries)
+        pd.testing.assert_frame_equal(lazy_combined, combined[list(lazy_combined.columns)],
+                                      check_dtype=False, check_categorical=False)
+        pd.testing.assert_frame_equal(chain.region_summary(self.countries, "Lazy"),
+                                      summarize_region(combined, "Lazy"), check_dtype=False)
+
+    def test_sources_are_checked_against_their_schemas(self):
+        """
+        Test that the scans use the declared schemas: a source lacking a required column fails.
+        """
+        path = os.path.join(self.directory, "renamed.csv")
+        self.emissions.rename(columns={"Year": "year"}).to_csv(path, index=False)
+        with self.assertRaises(SchemaError):
+            LazyTransformChain(self.temperature_path, path)
+
+    def test_fill_values_match_the_deduplicated_means(self):
+        """
+        Test that the imputation means equal the column means of the de-duplicated source, also
+        when rows share their keys but differ in a value (both are kept, like drop_duplicates()).
+        """
+        path = os.path.join(self.directory, "conflicting.csv")
+        conflicting = self.temperature.iloc[[7]].assign(**{self.temperature.columns[-1]: 99.0})
+        temperature = pd.concat([self.temperature, conflicting], ignore_index=True)
+        temperature.to_csv(path, index=False)
+        for frame, source in ((self.temperature, self.temperature_path), (temperature, path)):
+            expected = frame.drop_duplicates().mean(numeric_only=True)
+            means = LazyTransformChain(source, self.emissions_path).fill_values()
+            np.testing.assert_allclose([means[column] for column in expected.index], expected.values, rtol=1e-12)
+
+    def test_year_range_pushdown(self):
+        """
+        Test that a year range pushed down into the scans equals filtering the full result.
+        """
+        chain = LazyTransformChain(self.temperature_path, self.emissions_path)
+        summary = chain.region_summary(self.countries, "Lazy")
+        ranged = chain.region_summary(self.countries, "Lazy", year_range=(1960, 1980))
+        expected = summary[summary["Year"].between(1960, 1980)].reset_index(drop=True)
+        pd.testing.assert_frame_equal(ranged, expected)
+
+class TestIncrementalUpdates(unittest.TestCase):
+    def setUp(self):
+        """
+        Build merged country data and two region groups, with an empty state directory.
+        """
+        self.directory = tempfile.mkdtemp()
+        self.data = make_grouped_series(groups=6, years=30, seed=9)
+        self.groups = {
+            "first": {"label": "First", "countries": ["Entity 0", "Entity 1", "Entity 2"], "output": "first_summary"},
+            "second": {"label": "Second", "countries": ["Entity 2", "Entity 3", "Entity 4"]},
+        }
+        self.updater = IncrementalUpdater(os.path.join(self.directory, "state"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def assert_matches_full_rebuild(self, update, data):
+        """
+        Assert that an update equals aggregating and regressing the full data from scratch.
+        """
+        expected = aggregate_region_groups(data, self.groups)
+        pd.testing.assert_frame_equal(update["summaries"], expected, check_dtype=False)
+        pd.testing.assert_frame_equal(update["p_values"], calculate_p_values(expected), check_exact=False, rtol=1e-7)
+
+    def test_changed_keys(self):
+        """
+        Test that added, changed and removed (Entity, Year) keys are detected.
+        """
+        previous = self.data[self.data["Year"] < 1975]
+        current = self.data[self.data["Year"] > 1950].copy()
+        current.loc[current["Year"] == 1960, "Temperature"] += 1
+        changes = changed_keys(previous, current)
+        self.assertEqual(set(changes.loc[changes["change"] == "removed", "Year"]), {1950})
+        self.assertEqual(set(changes.loc[changes["change"] == "changed", "Year"]), {1960})
+        self.assertEqual(set(changes.loc[changes["change"] == "added", "Year"]), set(range(1975, 1980)))
+
+    def test_new_years_are_appended(self):
+        """
+        Test that new years only aggregate those years and are appended to the outputs.
+        """
+        history = self.data[self.data["Year"] < 1978]
+        first = self.updater.update(history, self.groups)
+        self.assertTrue(first["full"])
+        write_outputs(self.directory, first, self.groups, ["first", "second"])
+
+        update = self.updater.update(self.data, self.groups)
+        self.assertFalse(update["full"])
+        self.assertEqual(set(update["added"]["Year"]), {1978, 1979})
+        self.assert_matches_full_rebuild(update, self.data)
+
+        files = write_outputs(self.directory, update, self.groups, ["first", "second"])
+        self.assertEqual(files, {"region_summaries": "appended", "first_summary": "appended", "df_combined": "appended"})
+        written = pd.read_csv(os.path.join(self.directory, "df_combined.csv"))
+        pd.testing.assert_frame_equal(written.sort_values(["Region", "Year"]).reset_index(drop=True),
+                                      aggregate_region_groups(self.data, self.groups), check_dtype=False)
+        manifest = load_manifest(self.directory)["artifacts"]
+        self.assertEqual(manifest["df_combined.csv"]["rows"], len(written))
+        self.assertEqual(verify_manifest(self.directory), [])
+        self.assertEqual(write_outputs(self.directory, self.updater.update(self.data, self.groups), self.groups,
+                                       ["first", "second"])["df_combined"], "unchanged")
+
+    def test_revisions_update_the_sums(self):
+        """
+        Test that revised and removed years replace their aggregates and regression terms.
+        """
+        self.updater.update(self.data, self.groups)
+        revised = self.data[self.data["Year"] != 1955].copy()
+        revised.loc[(revised["Entity"] == "Entity 2") & (revised["Year"] == 1965), "emissions_total"] *= 3
+        update = self.updater.update(revised, self.groups)
+        self.assertEqual(set(update["removed"]["Year"]), {1955, 1965})
+        self.assert_matches_full_rebuild(update, revised)
+        files = write_outputs(self.directory, update, self.groups, ["first", "second"], "parquet", "zstd")
+        self.assertEqual(files["df_combined"], "rewritten")
+        self.assertIn("df_combined.parquet", load_manifest(self.directory)["artifacts"])
+        self.assertEqual(verify_manifest(self.directory), [])
+
+        # Without changes, nothing is aggregated again.
+        update = self.updater.update(revised, self.groups)
+        self.assertTrue(update["added"].empty)
+        self.assert_matches_full_rebuild(update, revised)
+
+class TestRollingStatistics(unittest.TestCase):
+    def setUp(self):
+        """
+        Build shuffled yearly series with gaps and missing temperatures.
+        """
+        data = make_grouped_series(groups=4, years=25, seed=11).drop(index=[3, 30, 31])
+        data.loc[[5, 6, 60], "Temperature"] = np.nan
+        self.data = data.sample(frac=1, random_state=2).reset_index(drop=True)
+        self.window = 6
+
+    def windows(self):
+        """
+        Yield every row position with the rows of its window (same entity, last window years).
+        """
+        for position, row in self.data.iterrows():
+            yield position, self.data[(self.data["Entity"] == row["Entity"]) & (self.data["Year"] > row["Year"] - self.window)
+                                      & (self.data["Year"] <= row["Year"])]
+
+    def test_matches_statistics_per_window(self):
+        """
+        Test that the prefix-sum statistics equal linregress, pearsonr and mean per window.
+        """
+        from scipy.stats import linregress, pearsonr
+
+        groups, years = self.data["Entity"], self.data["Year"]
+        slopes = rolling_linregress(groups, years, self.data["Temperature"], self.window, min_periods=3)
+        means = rolling_mean(groups, years, self.data["Temperature"], self.window, min_periods=3)
+        correlations = rolling_corr(groups, years, self.data["emissions_total"], self.data["Temperature"],
+                                    self.window, min_periods=3)
+        for position, window in self.windows():
+            window = window.dropna()
+            if len(window) < 3:
+                self.assertTrue(np.isnan(slopes["slope"][position]))
+                continue
+            expected = linregress(window["Year"], window["Temperature"])
+            np.testing.assert_allclose(slopes.loc[position, ["slope", "intercept", "rvalue", "pvalue"]].astype(float),
+                                       [expected.slope, expected.intercept, expected.rvalue, expected.pvalue], rtol=1e-8)
+            self.assertAlmostEqual(means[position], window["Temperature"].mean(), places=10)
+            self.assertAlmostEqual(correlations[position],
+                                   pearsonr(window["emissions_total"], window["Temperature"])[0], places=10)
+
+    def test_rolling_trends_layout(self):
+        """
+        Test that the trends are sorted by group and year and follow min_periods.
+        """
+        trends = rolling_trends(self.data, window=self.window, min_periods=self.window)
+        self.assertEqual(len(trends), len(self.data))
+        pd.testing.assert_frame_equal(trends[["Entity", "Year"]],
+                                      self.data.sort_values(["Entity", "Year"])[["Entity", "Year"]].reset_index(drop=True))
+        first_years = trends.groupby("Entity")["Year"].transform("min")
+        self.assertTrue(trends.loc[trends["Year"] < first_years + self.window - 1, "emissions_total_slope"].isna().all())
+
+class TestResampling(unittest.TestCase):
+    def setUp(self):
+        """
+        Build yearly series of several groups with a missing value.
+        """
+        self.data = make_grouped_series(groups=5, years=40, seed=12)
+        self.data.loc[7, "emissions_total"] = np.nan
+
+    def run_tests(self, **kwargs):
+        return resampling_tests(self.data["Entity"], self.data["Year"], self.data["emissions_total"],
+                                resamples=1000, seed=3, **kwargs)
+
+    def test_reproducible_across_workers_and_chunks(self):
+        """
+        Test that the seeded results do not depend on the number of workers or the chunk size.
+        """
+        serial = self.run_tests(workers=0)
+        pd.testing.assert_frame_equal(serial, self.run_tests(workers=2, chunk_elements=4000))
+        pd.testing.assert_frame_equal(serial, self.run_tests(workers=0))
+        self.assertFalse(serial.equals(resampling_tests(self.data["Entity"], self.data["Year"], self.data["emissions_total"],
+                                                        resamples=1000, seed=4, workers=0)))
+
+    def test_agrees_with_the_parametric_tests(self):
+        """
+        Test the observed statistics, the interval bounds and the permutation p-values against linregress.
+        """
+        from scipy.stats import linregress
+
+        results = self.run_tests(workers=0)
+        for entity, group in self.data.dropna().groupby("Entity"):
+            expected = linregress(group["Year"], group["emissions_total"])
+            row = results.loc[entity]
+            with self.subTest(entity=entity):
+                self.assertEqual(row["n"], len(group))
+                self.assertAlmostEqual(row["slope"], expected.slope, delta=abs(expected.slope) * 1e-9)
+                self.assertAlmostEqual(row["r"], expected.rvalue, places=10)
+                self.assertLess(row["slope_ci_low"], row["slope"])
+                self.assertGreater(row["slope_ci_high"], row["slope"])
+                self.assertLessEqual(row["r_ci_low"], row["r"])
+                self.assertAlmostEqual(row["p_value"], expected.pvalue, delta=0.05)
+
+class TestDashboard(unittest.TestCase):
+    def test_lttb_keeps_endpoints_and_peaks(self):
+        """
+        Test that LTTB keeps the requested number of points, the endpoints and a single spike.
+        """
+        x = np.arange(1000, dtype=float)
+        y = np.sin(x / 50)
+        y[437] = 25.0
+        kept = lttb(x, y, 100)
+        self.assertEqual(len(kept), 100)
+        self.assertEqual((kept[0], kept[-1]), (0, 999))
+        self.assertTrue((np.diff(kept) > 0).all())
+        self.assertIn(437, kept)
+        np.testing.assert_array_equal(lttb(x[:50], y[:50], 100), np.arange(50))
+
+    def test_grouped_traces_and_report(self):
+        """
+        Test that one WebGL trace per group is built in order and the dashboard is one HTML file.
+        """
+        data = make_grouped_series(groups=3, years=60, seed=13)
+        traces, points, drawn = line_traces(data, "Entity", "Year", "Temperature", lambda entity: f"{entity}!",
+                                            max_points=20, order=["Entity 2", "Entity 0", "Missing"])
+        self.assertEqual([trace.name for trace in traces], ["Entity 2!", "Entity 0!"])
+        self.assertEqual((points, drawn), (120, 40))
+        np.testing.assert_array_equal(traces[0].x[[0, -1]], [1950, 2009])
+
+        directory = tempfile.mkdtemp()
+        try:
+            output_file = os.path.join(directory, "dashboard.html")
+            figure = go.Figure(traces)
+            report = build_dashboard([("first", "First", lambda: (figure, points, drawn)),
+                                      ("second", "Second", lambda: (figure, points, drawn))], output_file)
+            self.assertEqual([entry["name"] for entry in report], ["first", "second"])
+            self.assertTrue(all(entry["bytes"] > 0 and entry["build_seconds"] >= 0 for entry in report))
+            with open(output_file, encoding="utf-8") as handle:
+                page = handle.read()
+            self.assertIn('id="first"', page)
+            self.assertIn('id="second"', page)
+            self.assertIn("scattergl", page)
+            # plotly.js is embedded once, so the second panel is much smaller than the first.
+            self.assertGreater(report[0]["bytes"], 10 * report[1]["bytes"])
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+class TestSourceSchemas(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, df):
+        path = os.path.join(self.directory, f"{name}.csv")
+        df.to_csv(path, index=False)
+        return path
+
+    def test_declared_types_and_values(self):
+        """
+        Test that the sources are parsed with their declared dtypes and the values of pd.read_csv.
+        """
+        for name, df in [("emissions", make_emissions_dataset(seed=3)), ("temperature", make_temperature_dataset(seed=3))]:
+            path = self.write(name, df.assign(Note="extra"))
+            parsed = read_csv(path, SCHEMAS[name], name)
+            expected = pd.read_csv(path, float_precision="round_trip").drop(columns="Note")
+            self.assertEqual(list(parsed.columns), list(expected.columns))
+            self.assertEqual(parsed["Entity"].dtype, "category")
+            self.assertEqual(parsed["Year"].dtype, SCHEMAS[name]["columns"]["Year"])
+            pd.testing.assert_frame_equal(parsed.astype({"Entity": object, "Code": object}),
+                                          expected.astype({"Entity": object, "Code": object}), check_dtype=False)
+
+    def test_drift_is_detected(self):
+        """
+        Test that missing required columns, mistyped values and gaps in required columns fail.
+        """
+        df = make_emissions_dataset(seed=3)
+        cases = [
+            df.rename(columns={"Year": "year"}),
+            df.astype({"emissions_total": object}).assign(emissions_total="unknown"),
+            df.astype({"Year": float}).assign(Year=np.nan),
+        ]
+        for case in cases:
+            with self.assertRaises(SchemaError):
+                read_csv(self.write("emissions", case), SCHEMAS["emissions"], "emissions")
+        with self.assertRaises(SchemaError):
+            read_csv(self.write("temperature", df), SCHEMAS["temperature"], "temperature")
+
+
+class TestCrossCorrelation(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(21)
+        data = make_grouped_series(groups=6, years=60, seed=21)
+        data.loc[rng.random(len(data)) < 0.1, "Temperature"] = np.nan
+        self.data = data[rng.random(len(data)) > 0.05].reset_index(drop=True)
+
+    def test_lagged_correlations_equal_pearsonr(self):
+        """
+        Test that every lagged correlation equals pearsonr over the paired years (FFT and direct).
+        """
+        from scipy.stats import pearsonr
+        result = lagged_crosscorr(self.data, max_lag=25, min_periods=5)
+        direct = lagged_crosscorr(self.data, max_lag=25, min_periods=5, method="direct")
+        pd.testing.assert_frame_equal(result, direct, atol=1e-10)
+        self.assertEqual(len(result), 6 * 51)
+        for (entity, lag), row in result.set_index(["Entity", "Lag"]).iloc[::7].iterrows():
+            series = self.data[self.data["Entity"] == entity].set_index("Year")
+            following = series["Temperature"].rename(lambda year: year - lag)
+            pairs = pd.concat([series["emissions_total"], following], axis=1).dropna()
+            self.assertEqual(row["n"], len(pairs))
+            if len(pairs) >= 5:
+                self.assertAlmostEqual(row["correlation"], pearsonr(pairs.iloc[:, 0], pairs.iloc[:, 1])[0], places=10)
+            else:
+                self.assertTrue(np.isnan(row["correlation"]))
+
+    def test_correlation_matrix_equals_pairwise_corr(self):
+        """
+        Test that the entity x entity matrix equals DataFrame.corr() of the aligned series.
+        """
+        matrix = correlation_matrix(self.data, "Temperature", min_periods=10)
+        expected = self.data.pivot(index="Year", columns="Entity", values="Temperature").corr(min_periods=10)
+        expected = expected.loc[matrix.index, matrix.columns]
+        np.testing.assert_allclose(matrix.values, expected.values, atol=1e-12)
+        np.testing.assert_allclose(np.diag(matrix.values), 1.0)
+
+
+class TestCommandLine(unittest.TestCase):
+    def run_python(self, code):
+        """
+        Runs code in a fresh interpreter in the project directory and returns its output.
+        """
+        import subprocess
+        import sys
+        directory = os.path.dirname(os.path.abspath(__file__))
+        return subprocess.run([sys.executable, "-c", code], cwd=directory, check=True,
+                              capture_output=True, text=True).stdout.strip().splitlines()[-1]
+
+    def test_stats_does_not_import_plotly(self):
+        """
+        Test that the stats subcommand loads and computes its results without plotly or Kaleido,
+        and that fetch does not load the lazy backend or pyarrow's query engine.
+        """
+        output = self.run_python(
+            "import sys, cli\n"
+            "cli.load_command('stats')\n"
+            "from synthetic import make_grouped_series\n"
+            "from pipeline import calculate_p_values\n"
+            "from crosscorr import lagged_crosscorr\n"
+            "from resampling import region_resampling_tests\n"
+            "from rolling import rolling_trends\n"
+            "df = make_grouped_series(groups=3, years=40).rename(columns={'Entity': 'Region'})\n"
+            "calculate_p_values(df); rolling_trends(df, group='Region'); lagged_crosscorr(df, group='Region')\n"
+            "region_resampling_tests(df, resamples=50, workers=0)\n"
+            "print(sorted({name.split('.')[0] for name in sys.modules} & {'plotly', 'kaleido'}))"
+        )
+        self.assertEqual(output, "[]")
+        self.assertEqual(self.run_python("import sys, cli; cli.load_command('plot'); print('plotly' in sys.modules)"), "True")
+        output = self.run_python(
+            "import os, sys, cli\n"
+            "cli.load_command('fetch')\n"
+            "from pipeline import build_stage_graph\n"
+            "build_stage_graph(os.path.join('data'))\n"
+            "print(sorted(set(sys.modules) & {'lazy_backend', 'partitioned', 'pyarrow.acero', 'pyarrow.dataset'}))"
+        )
+        self.assertEqual(output, "[]")
+
+    def test_subcommands_parse(self):
+        """
+        Test that every subcommand is accepted and plot takes the figure options.
+        """
+        import cli
+        parser = cli.build_parser()
+        for name in cli.COMMANDS:
+            self.assertEqual(parser.parse_args([name]).command, name)
+        args = parser.parse_args(["plot", "--formats", "pdf,png", "--dashboard"])
+        self.assertEqual((args.formats, args.dashboard), ("pdf,png", True))
+        with self.assertRaises(SystemExit):
+            parser.parse_args(["stats", "--dashboard"])
+
+
+class TestPartitionedExecution(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.temperature_path = os.path.join(self.directory, "temperature.csv")
+        self.emissions_path = os.path.join(self.directory, "emissions.csv")
+        make_temperature_dataset(years=20, seed=8).to_csv(self.temperature_path, index=False)
+        make_emissions_dataset(seed=8).to_csv(self.emissions_path, index=False)
+        self.groups = load_region_groups()["groups"]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_partitions_equal_the_in_memory_join(self):
+        """
+        Test that entity-hash and year-range partitions give the monthly summaries of the
+        in-memory clean, filter, merge and groupby.
+        """
+        from region_groups import member_countries, membership_table
+        temperature, emissions = filter_data(transform_temperature_data(pd.read_csv(self.temperature_path)),
+                                             pd.read_csv(self.emissions_path)[["Entity", "Year", "emissions_total"]],
+                                             member_countries(self.groups))
+        merged = merge_datasets(temperature, emissions).astype({"Entity": str})
+        expected = merged.merge(membership_table(self.groups), on="Entity").groupby(["Group", "Year", "Month"]).agg(
+            {"Temperature": "mean", "emissions_total": "sum"}).reset_index()
+
+        for by in ("entity", "year"):
+            summaries, report = partitioned_monthly_summaries(self.temperature_path, self.emissions_path, self.groups,
+                                                              by=by, partitions=4, workers=0,
+                                                              directory=os.path.join(self.directory, by))
+            self.assertEqual((report["partitions"], report["merged_rows"]), (4, len(merged)))
+            np.testing.assert_array_equal(summaries[["Year", "Month"]].values, expected[["Year", "Month"]].values)
+            np.testing.assert_allclose(summaries["Temperature"], expected["Temperature"], rtol=1e-12)
+            np.testing.assert_allclose(summaries["emissions_total"], expected["emissions_total"], rtol=1e-12)
+            self.assertEqual(len(os.listdir(os.path.join(self.directory, by))), 4)
+
+    def test_partition_count_follows_the_memory_budget(self):
+        """
+        Test that a smaller budget or more workers give more partitions (at least one per worker).
+        """
+        self.assertEqual(plan_partitions(1000, memory_budget=1024 ** 3, workers=3), 3)
+        self.assertGreater(plan_partitions(10 ** 7, memory_budget=64 * 1024 ** 2, workers=2),
+                           plan_partitions(10 ** 7, memory_budget=256 * 1024 ** 2, workers=2))
+
+    def test_schema_drift_fails_before_partitioning(self):
+        """
+        Test that the sources are checked against their schemas: a renamed emissions column or
+        text in a year column fails with a SchemaError before any partition file is written.
+        """
+        emissions = pd.read_csv(self.emissions_path).rename(columns={"emissions_total": "emissions"})
+        emissions.to_csv(self.emissions_path, index=False)
+        directory = os.path.join(self.directory, "parts")
+        with self.assertRaises(SchemaError):
+            partitioned_monthly_summaries(self.temperature_path, self.emissions_path, self.groups,
+                                          partitions=2, workers=0, directory=directory)
+        self.assertFalse(os.path.exists(directory) and os.listdir(directory))
+
+        make_emissions_dataset(seed=8).to_csv(self.emissions_path, index=False)
+        temperature = pd.read_csv(self.temperature_path)
+        temperature[temperature.columns[-1]] = temperature[temperature.columns[-1]].astype(object)
+        temperature.loc[3, temperature.columns[-1]] = "unknown"
+        temperature.to_csv(self.temperature_path, index=False)
+        with self.assertRaises(SchemaError):
+            partitioned_monthly_summaries(self.temperature_path, self.emissions_path, self.groups,
+                                          partitions=2, workers=0, directory=directory)
+
+
+class TestOutputWriter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.datasets = {
+            "emissions": make_emissions_dataset(seed=9)[["Entity", "Year", "emissions_total"]],
+            "temperature": make_temperature_dataset(years=5, seed=9),
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_formats_round_trip(self):
+        """
+        Test that CSV (plain, gzip, zstd) and Parquet outputs read back as the written datasets.
+        """
+        import pyarrow.csv
+        import pyarrow.parquet as pq
+        readers = {
+            ("csv", None): pd.read_csv,
+            ("csv", "gzip"): pd.read_csv,
+            ("csv", "zstd"): lambda path: pyarrow.csv.read_csv(path).to_pandas(),
+            ("parquet", None): lambda path: pq.read_table(path).to_pandas(),
+            ("parquet", "zstd"): lambda path: pq.read_table(path).to_pandas(),
+        }
+        expected = self.datasets["emissions"]
+        for (output_format, compression), read in readers.items():
+            with self.subTest(output_format=output_format, compression=compression):
+                (record,) = write_artifacts(self.directory, {"emissions": expected}, output_format, compression)
+                result = read(os.path.join(self.directory, record["file"]))
+                self.assertEqual(record["rows"], len(expected))
+                np.testing.assert_array_equal(result["Entity"].astype(str), expected["Entity"].astype(str))
+                np.testing.assert_allclose(result["emissions_total"], expected["emissions_total"])
+
+    def test_manifest_records_checksums_and_changes(self):
+        """
+        Test that the manifest records every artifact and flags only those whose content changed.
+        """
+        write_artifacts(self.directory, self.datasets, workers=2)
+        manifest = load_manifest(self.directory)
+        self.assertEqual(sorted(manifest["artifacts"]), ["emissions.csv", "temperature.csv"])
+        self.assertTrue(all(record["changed"] for record in manifest["artifacts"].values()))
+        self.assertEqual(verify_manifest(self.directory), [])
+
+        datasets = dict(self.datasets, temperature=self.datasets["temperature"].head(10))
+        records = {record["file"]: record for record in write_artifacts(self.directory, datasets, workers=2)}
+        self.assertFalse(records["emissions.csv"]["changed"])
+        self.assertTrue(records["temperature.csv"]["changed"])
+        self.assertEqual(records["temperature.csv"]["rows"], 10)
+
+        with open(os.path.join(self.directory, "emissions.csv"), "a") as handle:
+            handle.write("tampered\n")
+        self.assertEqual(verify_manifest(self.directory), ["'emissions.csv' does not match its checksum."])
+
+    def test_failed_write_keeps_the_previous_file(self):
+        """
+        Test that a write failing halfway leaves the previous file and manifest untouched and no
+        temporary file behind.
+        """
+        write_artifacts(self.directory, {"emissions": self.datasets["emissions"]})
+        path = os.path.join(self.directory, "emissions.csv")
+        with open(path, "rb") as handle:
+            previous = handle.read()
+
+        class BrokenFrame(pd.DataFrame):
+            def to_csv(self, handle, **kwargs):
+                handle.write(b"Entity,Year\n")
+                raise OSError("disk full")
+
+        with self.assertRaises(OSError):
+            write_artifacts(self.directory, {"emissions": BrokenFrame(self.datasets["emissions"])})
+        with open(path, "rb") as handle:
+            self.assertEqual(handle.read(), previous)
+        self.assertEqual(sorted(os.listdir(self.directory)), ["emissions.csv", "manifest.json"])
+        self.assertEqual(verify_manifest(self.directory), [])
+
+
 if __name__ == "__main__":
     unittest.main()